@@ -0,0 +1,243 @@
+import itertools
+import json
+import re
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from dynamic_sketchpad.standin import RecordedResponse, StandInRequest
+
+
+def synthetic_png(size: int = 512) -> bytes:
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    for i in range(0, size, 16):
+        draw.line((0, i, size, size - i), fill=(i % 256, 64, 255 - i % 256), width=2)
+        draw.ellipse((i // 2, i // 2, i // 2 + 24, i // 2 + 24), outline="black")
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def sample_from_schema(schema: dict, definitions: dict | None = None):
+    """Builds a minimal instance of a JSON schema for structured-output requests."""
+    definitions = definitions or schema.get("$defs", {})
+    if "$ref" in schema:
+        return sample_from_schema(
+            definitions[schema["$ref"].split("/")[-1]], definitions
+        )
+    if "anyOf" in schema:
+        return sample_from_schema(schema["anyOf"][0], definitions)
+    match schema.get("type"):
+        case "object":
+            return {
+                name: sample_from_schema(property_schema, definitions)
+                for name, property_schema in schema.get("properties", {}).items()
+            }
+        case "array":
+            return [sample_from_schema(schema.get("items", {}), definitions)]
+        case "string":
+            return "42"
+        case "integer" | "number":
+            return 42
+        case "boolean":
+            return True
+    return None
+
+
+class SyntheticOpenAI:
+    """
+    Fallback for the stand-in server that answers the endpoints this package uses
+    with synthetic but well-formed payloads: chat completions (including
+    structured outputs), assistants, threads, messages, runs and file contents.
+    Runs complete after run_polls retrievals and reply with text and one image.
+    """
+
+    def __init__(self, run_polls: int = 1, answer: str = "ANSWER: 42"):
+        self.run_polls = run_polls
+        self.answer = answer
+        self.image = synthetic_png()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._assistants: dict[str, dict] = {}
+        self._messages: dict[str, list[dict]] = {}
+        self._runs: dict[str, dict] = {}
+
+    def _id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids)}"
+
+    def __call__(self, request: StandInRequest) -> RecordedResponse | None:
+        path = request.path.split("?")[0].removeprefix("/v1")
+        with self._lock:
+            for pattern, method, handler in self._routes():
+                match = re.fullmatch(pattern, path)
+                if match and request.method == method:
+                    return handler(request, *match.groups())
+        return None
+
+    def _routes(self):
+        return [
+            (r"/chat/completions", "POST", self._chat_completion),
+            (r"/assistants", "GET", self._empty_list),
+            (r"/assistants", "POST", self._create_assistant),
+            (r"/assistants/([^/]+)", "GET", self._retrieve_assistant),
+            (r"/threads", "POST", self._create_thread),
+            (r"/threads/([^/]+)/messages", "POST", self._create_message),
+            (r"/threads/([^/]+)/messages", "GET", self._list_messages),
+            (r"/threads/([^/]+)/runs", "POST", self._create_run),
+            (r"/threads/([^/]+)/runs/([^/]+)", "GET", self._retrieve_run),
+            (r"/files/([^/]+)/content", "GET", self._file_content),
+        ]
+
+    def _chat_completion(self, request: StandInRequest) -> RecordedResponse:
+        body = request.json()
+        content = f"{body['messages'][-1]['content'][:64]}\n{self.answer}"
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            content = json.dumps(sample_from_schema(schema))
+        return RecordedResponse.json(
+            {
+                "id": self._id("chatcmpl"),
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 100,
+                    "completion_tokens": 20,
+                    "total_tokens": 120,
+                },
+            }
+        )
+
+    def _empty_list(self, request: StandInRequest) -> RecordedResponse:
+        return RecordedResponse.json({"object": "list", "data": [], "has_more": False})
+
+    def _create_assistant(self, request: StandInRequest) -> RecordedResponse:
+        assistant = {
+            "id": self._id("asst"),
+            "object": "assistant",
+            "created_at": int(time.time()),
+            "name": None,
+            "description": None,
+            "metadata": {},
+            **request.json(),
+        }
+        self._assistants[assistant["id"]] = assistant
+        return RecordedResponse.json(assistant)
+
+    def _retrieve_assistant(self, request: StandInRequest, assistant_id: str):
+        if assistant_id not in self._assistants:
+            return RecordedResponse.json(
+                {"error": {"message": f"No assistant found with id '{assistant_id}'."}},
+                status=404,
+            )
+        return RecordedResponse.json(self._assistants[assistant_id])
+
+    def _create_thread(self, request: StandInRequest) -> RecordedResponse:
+        thread_id = self._id("thread")
+        self._messages[thread_id] = []
+        return RecordedResponse.json(
+            {
+                "id": thread_id,
+                "object": "thread",
+                "created_at": int(time.time()),
+                "metadata": {},
+            }
+        )
+
+    def _message(self, thread_id: str, role: str, content: list[dict]) -> dict:
+        message = {
+            "id": self._id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": content,
+            "attachments": [],
+            "metadata": {},
+            "status": "completed",
+        }
+        self._messages[thread_id].append(message)
+        return message
+
+    def _create_message(self, request: StandInRequest, thread_id: str):
+        text = request.json()["content"]
+        return RecordedResponse.json(
+            self._message(
+                thread_id,
+                "user",
+                [{"type": "text", "text": {"value": str(text), "annotations": []}}],
+            )
+        )
+
+    def _list_messages(self, request: StandInRequest, thread_id: str):
+        data = list(reversed(self._messages[thread_id]))
+        return RecordedResponse.json(
+            {
+                "object": "list",
+                "data": data,
+                "first_id": data[0]["id"] if data else None,
+                "last_id": data[-1]["id"] if data else None,
+                "has_more": False,
+            }
+        )
+
+    def _run(self, run_id: str) -> dict:
+        run = self._runs[run_id]
+        completed = run["polls"] >= self.run_polls
+        return {
+            "id": run_id,
+            "object": "thread.run",
+            "created_at": run["created_at"],
+            "thread_id": run["thread_id"],
+            "assistant_id": run["assistant_id"],
+            "status": "completed" if completed else "in_progress",
+            "usage": (
+                {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+                if completed
+                else None
+            ),
+        }
+
+    def _create_run(self, request: StandInRequest, thread_id: str):
+        run_id = self._id("run")
+        self._runs[run_id] = {
+            "thread_id": thread_id,
+            "assistant_id": request.json()["assistant_id"],
+            "created_at": int(time.time()),
+            "polls": 0,
+        }
+        return RecordedResponse.json(self._run(run_id))
+
+    def _retrieve_run(self, request: StandInRequest, thread_id: str, run_id: str):
+        run = self._runs[run_id]
+        run["polls"] += 1
+        if run["polls"] == self.run_polls:
+            self._message(
+                thread_id,
+                "assistant",
+                [
+                    {
+                        "type": "image_file",
+                        "image_file": {"file_id": self._id("file")},
+                    },
+                    {
+                        "type": "text",
+                        "text": {"value": self.answer, "annotations": []},
+                    },
+                ],
+            )
+        return RecordedResponse.json(self._run(run_id))
+
+    def _file_content(self, request: StandInRequest, file_id: str):
+        return RecordedResponse(200, {"content-type": "image/png"}, self.image)
@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+
+from openai.types.beta.threads import Message
+
+import dynamic_sketchpad.file_cache as file_cache
+import dynamic_sketchpad.registry as registry
+from benchmarks.backend import SyntheticOpenAI
+from dynamic_sketchpad.assistant import Assistant
+from dynamic_sketchpad.clients import get_client
+from dynamic_sketchpad.lazy_image import LazyImage
+from dynamic_sketchpad.llm import LLM
+from dynamic_sketchpad.metrics import InMemoryMetrics, add_sink, remove_sink
+from dynamic_sketchpad.openai_utils import get_image_bytes_from_messages
+from dynamic_sketchpad.scheduler import configure_rate_limits, get_scheduler
+from dynamic_sketchpad.standin import Cassette, StandInServer, SyntheticLatency
+from dynamic_sketchpad.tools import Tool
+from eval.answer_extractor import extract_answer
+
+MODEL = "gpt-4o"
+EXTRACTOR_MODEL = "gpt-4o-mini"
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    if len(latencies) < 2:
+        latencies = latencies * 2
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "latency_mean": statistics.fmean(latencies),
+        "latency_p50": percentiles[49],
+        "latency_p95": percentiles[94],
+        "latency_p99": percentiles[98],
+    }
+
+
+@contextmanager
+def synthetic_backend(latency: float, run_polls: int):
+    """
+    Serves a synthetic OpenAI API and points the package at it. The assistant
+    registry and file cache are swapped for temporary ones so benchmark entries
+    never reach the real caches.
+    """
+    previous_env = {
+        name: os.environ.get(name) for name in ("OPENAI_API_KEY", "OPENAI_BASE_URL")
+    }
+    previous_registry, previous_file_cache = registry._registry, file_cache._file_cache
+    previous_limits = {
+        model: get_scheduler().budget(model).limits
+        for model in (MODEL, EXTRACTOR_MODEL)
+    }
+    with tempfile.TemporaryDirectory(prefix="sketchpad-benchmarks-") as tmp_dir:
+        registry._registry = registry.AssistantRegistry(
+            Path(tmp_dir) / "assistants.json"
+        )
+        file_cache._file_cache = file_cache.FileCache(Path(tmp_dir) / "files")
+        server = StandInServer(
+            Cassette(),
+            fallback=SyntheticOpenAI(run_polls=run_polls),
+            latency=SyntheticLatency(response=latency, jitter=0.5),
+        )
+        try:
+            for model in (MODEL, EXTRACTOR_MODEL):
+                configure_rate_limits(
+                    model,
+                    requests_per_minute=1_000_000,
+                    tokens_per_minute=1_000_000_000,
+                    max_in_flight=256,
+                )
+            with server:
+                os.environ["OPENAI_API_KEY"] = "benchmark"
+                os.environ["OPENAI_BASE_URL"] = server.base_url
+                yield Path(tmp_dir)
+        finally:
+            registry._registry, file_cache._file_cache = (
+                previous_registry,
+                previous_file_cache,
+            )
+            for name, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            for model, limits in previous_limits.items():
+                get_scheduler().configure(model, limits)
+
+
+@contextmanager
+def collect_metrics():
+    metrics = InMemoryMetrics()
+    add_sink(metrics)
+    try:
+        yield metrics
+    finally:
+        remove_sink(metrics)
+
+
+def bench_generate_responses(n: int) -> dict:
+    llm = LLM(llm_str=MODEL)
+    prompts = [f"Question {i}: what is {i} + {i}?" for i in range(n)]
+    with collect_metrics() as metrics:
+        start = time.perf_counter()
+        asyncio.run(llm.generate_responses(prompts))
+        seconds = time.perf_counter() - start
+
+    return {
+        "prompts": n,
+        "seconds": seconds,
+        "throughput": n / seconds,
+        **summarize([record.latency for record in metrics.records]),
+        "queue_wait_mean": statistics.fmean(r.queue_wait for r in metrics.records),
+    }
+
+
+def bench_assistant_invoke_all(n: int) -> dict:
+    assistant = Assistant(
+        "You are a benchmark assistant.", tools=[Tool.CODE_INTERPRETER], llm_str=MODEL
+    )
+    prompts = [f"Draw diagram {i}" for i in range(n)]
+    with collect_metrics() as metrics, redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        messages = assistant.invoke_all(*prompts)
+        seconds = time.perf_counter() - start
+
+    assert len(messages) == n
+    return {
+        "prompts": n,
+        "seconds": seconds,
+        "throughput": n / seconds,
+        **summarize([record.latency for record in metrics.records]),
+    }
+
+
+def bench_extract_answer(n: int) -> dict:
+    questions = [f"Question {i}" for i in range(n)]
+    with_answer = [f"Working for {i}.\nANSWER: {i}" for i in range(n)]
+    without_answer = [f"Working for {i}, the result is {i}." for i in range(n)]
+
+    async def extract_all(responses: list[str]):
+        return await asyncio.gather(
+            *[
+                extract_answer(question=question, response=response)
+                for question, response in zip(questions, responses)
+            ]
+        )
+
+    extractor_logger = logging.getLogger("eval.answer_extractor")
+    level = extractor_logger.level
+    extractor_logger.setLevel(logging.ERROR)
+    try:
+        results = {}
+        for path, responses in (("regex", with_answer), ("llm", without_answer)):
+            start = time.perf_counter()
+            answers = asyncio.run(extract_all(responses))
+            seconds = time.perf_counter() - start
+            results[path] = {
+                "responses": n,
+                "seconds": seconds,
+                "throughput": n / seconds,
+                "extracted": sum(answer is not None for answer in answers),
+            }
+    finally:
+        extractor_logger.setLevel(level)
+    return results
+
+
+def bench_images(n: int) -> dict:
+    client = get_client()
+    messages = [
+        Message.model_validate(
+            {
+                "id": f"msg_{i}",
+                "object": "thread.message",
+                "created_at": 0,
+                "thread_id": "thread_benchmark",
+                "role": "assistant",
+                "content": [
+                    {"type": "image_file", "image_file": {"file_id": f"file_{i}"}}
+                ],
+                "attachments": [],
+                "metadata": {},
+                "status": "completed",
+            }
+        )
+        for i in range(n)
+    ]
+
+    start = time.perf_counter()
+    all_image_bytes = get_image_bytes_from_messages(client, messages)
+    download = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_image_bytes_from_messages(client, messages)
+    cached_download = time.perf_counter() - start
+
+    images = [
+        LazyImage(data) for image_bytes in all_image_bytes for data in image_bytes
+    ]
+    start = time.perf_counter()
+    for image in images:
+        image.size
+    header = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for image in images:
+        image.open().load()
+    decode = time.perf_counter() - start
+
+    return {
+        "images": n,
+        "image_bytes": images[0].nbytes,
+        "download_seconds": download,
+        "cached_download_seconds": cached_download,
+        "header_seconds": header,
+        "decode_seconds": decode,
+    }
+
+
+def bench_predict(n: int, tmp_dir: Path) -> dict:
+    try:
+        import mlflow
+        import pandas as pd
+
+        from eval.isobench.eval_mlflow import llm_model_predict
+    except ImportError as e:
+        return {"skipped": f"missing dependency: {e.name}"}
+
+    mlflow.set_tracking_uri((tmp_dir / "mlruns").as_uri())
+    df = pd.DataFrame(
+        {"id": range(n), "prompt": [f"Question {i}: what is {i}?" for i in range(n)]}
+    )
+    predict = llm_model_predict(MODEL)
+    with mlflow.start_run(), redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        answers = predict(df)
+        seconds = time.perf_counter() - start
+
+    return {
+        "prompts": n,
+        "seconds": seconds,
+        "throughput": n / seconds,
+        "extracted": sum(answer is not None for answer in answers),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    latency: float = 0.02,
+    run_polls: int = 1,
+    llm_prompts: int = 500,
+    assistant_sizes: tuple[int, ...] = (10, 100, 1000),
+    extract_responses: int = 200,
+    images: int = 50,
+    predict_prompts: int = 100,
+) -> dict:
+    results = {}
+    with synthetic_backend(latency, run_polls) as tmp_dir:
+        results["llm.generate_responses"] = bench_generate_responses(llm_prompts)
+        for n in assistant_sizes:
+            results[f"assistant.invoke_all[{n}]"] = bench_assistant_invoke_all(n)
+        for path, result in bench_extract_answer(extract_responses).items():
+            results[f"extract_answer.{path}"] = result
+        results["openai_utils.images"] = bench_images(images)
+        results["eval_mlflow.predict"] = bench_predict(predict_prompts, tmp_dir)
+
+    return {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "latency": latency,
+            "run_polls": run_polls,
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    """Lines describing how each timing changed relative to the baseline."""
+    lines = []
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name, {})
+        for metric, value in result.items():
+            if not metric.endswith(("seconds", "throughput")) and not (
+                metric.startswith("latency")
+            ):
+                continue
+            if not isinstance(base.get(metric), (int, float)) or not base[metric]:
+                continue
+            lines.append(
+                f"{name} {metric}: {base[metric]:.4g} -> {value:.4g}"
+                f" ({value / base[metric]:.2f}x)"
+            )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark against a synthetic OpenAI backend."
+    )
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"))
+    parser.add_argument("--baseline", type=Path, help="results to compare against")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--run-polls", type=int, default=1)
+    parser.add_argument(
+        "--quick", action="store_true", help="small sizes for a smoke run"
+    )
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    sizes = {}
+    if args.quick:
+        sizes = dict(
+            llm_prompts=20,
+            assistant_sizes=(10,),
+            extract_responses=10,
+            images=5,
+            predict_prompts=5,
+        )
+    results = run_benchmarks(latency=args.latency, run_polls=args.run_polls, **sizes)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Wrote {args.output}")
+
+    if args.baseline is not None:
+        print("\n".join(compare(results, json.loads(args.baseline.read_text()))))
+
+
+if __name__ == "__main__":
+    main()
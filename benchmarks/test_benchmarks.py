@@ -0,0 +1,27 @@
+from benchmarks.run import EXTRACTOR_MODEL, MODEL, compare, run_benchmarks
+from dynamic_sketchpad.scheduler import get_scheduler
+
+
+def test_benchmarks_run_offline():
+    limits = {
+        model: get_scheduler().budget(model).limits
+        for model in (MODEL, EXTRACTOR_MODEL)
+    }
+
+    results = run_benchmarks(
+        latency=0.0,
+        llm_prompts=5,
+        assistant_sizes=(2,),
+        extract_responses=3,
+        images=2,
+        predict_prompts=2,
+    )
+
+    benchmarks = results["benchmarks"]
+    assert benchmarks["llm.generate_responses"]["prompts"] == 5
+    assert benchmarks["assistant.invoke_all[2]"]["prompts"] == 2
+    assert benchmarks["extract_answer.regex"]["extracted"] == 3
+    assert benchmarks["extract_answer.llm"]["extracted"] == 3
+    assert benchmarks["openai_utils.images"]["image_bytes"] > 0
+    assert any("1.00x" in line for line in compare(results, results))
+    assert {model: get_scheduler().budget(model).limits for model in limits} == limits
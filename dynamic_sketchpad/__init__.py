@@ -1,10 +1,68 @@
-from .assistant import Assistant
-from .dynamic_sketchpad import DynamicSketchpad
+from .assistant import Assistant, AsyncAssistant
+from .batch import BatchRunner
+from .clients import (
+    ConnectionSettings,
+    aclose_async_clients,
+    configure_connections,
+    get_async_client,
+    get_client,
+)
+from .dynamic_sketchpad import (
+    AsyncDynamicSketchpad,
+    AsyncHintValidator,
+    DynamicSketchpad,
+    HintValidator,
+    HintVerdict,
+    LLMHintValidator,
+    generate_and_validate_hint,
+    speculative_generate_and_validate_hint,
+)
+from .file_cache import FileCache, get_file_cache
+from .lazy_image import LazyImage
+from .limiter import AdaptiveConcurrencyLimiter
+from .metrics import (
+    CallRecord,
+    InMemoryMetrics,
+    PrometheusMetrics,
+    add_sink,
+    measure_call,
+    remove_sink,
+)
 from .openai_utils import (
+    async_fetch_file_contents,
+    async_get_file_content,
+    async_get_image_bytes_from_message,
+    async_get_image_bytes_from_messages,
+    async_process_message,
+    async_process_messages,
+    async_to_image,
     display_message,
+    fetch_file_contents,
+    get_file_content,
     get_image_bytes_from_message,
+    get_image_bytes_from_messages,
     get_strings_from_message,
     process_message,
+    process_messages,
     to_image,
+    to_lazy_images,
+)
+from .registry import AssistantRegistry, get_registry
+from .response_cache import ResponseCache
+from .run_tracker import AsyncRunTracker, RunTracker
+from .scheduler import (
+    RateLimits,
+    RequestScheduler,
+    configure_rate_limits,
+    get_scheduler,
+)
+from .standin import Cassette, StandInServer, SyntheticLatency
+from .streaming import CodeDelta, ImageReady, RunFinished, StreamEvent, TextDelta
+from .tokens import (
+    TruncationPolicy,
+    count_tokens,
+    estimate_request_tokens,
+    truncate_messages,
+    truncate_text,
 )
 from .tools import Tool
@@ -1,32 +1,100 @@
-import os
-from io import BytesIO
+import asyncio
+import time
+from contextlib import AsyncExitStack, ExitStack
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypeVar
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIError, AsyncOpenAI, NotFoundError
+from openai.types.beta import Assistant as OpenAIAssistant
 from openai.types.beta import Thread
 from openai.types.beta.threads import Message, Run
-from PIL import Image, ImageFile
-from tenacity import retry, stop_after_attempt, wait_random_exponential
 from tqdm import tqdm
+from tqdm.asyncio import tqdm as async_tqdm
 
+from dynamic_sketchpad.clients import get_async_client, get_client
+from dynamic_sketchpad.lazy_image import LazyImage
+from dynamic_sketchpad.metrics import (
+    CallRecord,
+    bind_call,
+    finish_call,
+    measure_call,
+)
 from dynamic_sketchpad.openai_utils import (
+    async_get_file_content,
+    async_get_image_bytes_from_message,
+    async_get_image_bytes_from_messages,
+    async_process_messages,
     display_message,
+    get_file_content,
     get_image_bytes_from_message,
+    get_image_bytes_from_messages,
     get_strings_from_message,
-    process_message,
+    process_messages,
+    to_lazy_images,
+)
+from dynamic_sketchpad.registry import get_registry, is_missing_assistant
+from dynamic_sketchpad.run_tracker import AsyncRunTracker, RunTracker
+from dynamic_sketchpad.scheduler import Reservation, get_scheduler
+from dynamic_sketchpad.streaming import (
+    CodeDelta,
+    ImageReady,
+    RunFinished,
+    StreamEvent,
+    TextDelta,
+    parse_stream_event,
 )
+from dynamic_sketchpad.tokens import estimate_request_tokens
 from dynamic_sketchpad.tools import Tool
 
 load_dotenv()
 
+T = TypeVar("T")
+
+
+def run_tokens(run: Run) -> int | None:
+    return run.usage.total_tokens if run.usage is not None else None
+
+
+def run_request_tokens(assistant: OpenAIAssistant, prompt: str) -> int:
+    """
+    Estimated tokens of running the prompt on a new thread: the instructions and
+    tool definitions sent with every run, plus the prompt as the only message.
+    """
+    tools = "\n".join(tool.model_dump_json() for tool in assistant.tools)
+    messages = [
+        {"role": "system", "content": f"{assistant.instructions or ''}\n{tools}"},
+        {"role": "user", "content": prompt},
+    ]
+    return estimate_request_tokens(messages, assistant.model)
+
+
+def record_stream_event(
+    call: CallRecord, reservation: Reservation, stream_event: StreamEvent
+) -> None:
+    if isinstance(stream_event, (TextDelta, CodeDelta)):
+        call.mark_first_token()
+    elif isinstance(stream_event, RunFinished):
+        call.add_usage(stream_event.run.usage)
+        reservation.used_tokens = run_tokens(stream_event.run)
+
 
 class Assistant:
-    def __init__(self, instructions: str, tools: list[Tool], llm_str: str = "gpt-4o"):
-        api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key)
+    def __init__(
+        self,
+        instructions: str,
+        tools: list[Tool],
+        llm_str: str = "gpt-4o",
+        temperature: float | None = None,
+    ):
+        self.client = get_client()
+        self.tracker = RunTracker(self.client)
         tool_dicts = [tool.to_dict() for tool in tools]
-        self.assistant = self.client.beta.assistants.create(
-            instructions=instructions, model=llm_str, tools=tool_dicts
+        self.assistant = get_registry().get_or_create(
+            self.client,
+            instructions=instructions,
+            model=llm_str,
+            tools=tool_dicts,
+            temperature=temperature,
         )
 
     def create_thread_and_run(self, user_input: str) -> tuple[Thread, Run]:
@@ -35,25 +103,47 @@ class Assistant:
         run = self.submit_message(user_input, thread.id)
         return thread, run
 
+    def with_assistant(self, call: Callable[[str], T]) -> T:
+        """
+        Calls with the assistant ID. The registry trusts its index without checking
+        the assistant still exists, so a deleted one is replaced and the call retried.
+        """
+        try:
+            return call(self.assistant.id)
+        except NotFoundError as e:
+            if not is_missing_assistant(e, self.assistant.id):
+                raise
+            assistant = get_registry().replace(self.client, self.assistant)
+            if assistant is None:
+                raise
+            self.assistant = assistant
+        return call(self.assistant.id)
+
     def submit_message(self, user_message: str, thread_id: str) -> Run:
         self.client.beta.threads.messages.create(
             thread_id=thread_id, role="user", content=user_message
         )
-        return self.client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=self.assistant.id,
+        return self.with_assistant(
+            lambda assistant_id: self.client.beta.threads.runs.create(
+                thread_id=thread_id, assistant_id=assistant_id
+            )
         )
 
     def gather_runs(self, *runs: Run) -> list[Run]:
-        runs = [self.poll_run(run) for run in tqdm(runs, desc="Polling runs")]
-        for run in runs:
+        completed_runs = [None] * len(runs)
+        for index, run in self.iter_completed_runs(*runs):
+            completed_runs[index] = run
+        return completed_runs
+
+    def iter_completed_runs(self, *runs: Run) -> Iterator[tuple[int, Run]]:
+        completed_runs = self.tracker.as_completed(list(runs))
+        for index, run in tqdm(completed_runs, total=len(runs), desc="Polling runs"):
             if run.status != "completed":
                 print(f"WARNING: Run {run.id} is not complete. {run=}")
-        return runs
+            yield index, run
 
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
     def poll_run(self, run: Run) -> Run:
-        return self.client.beta.threads.runs.poll(run.id, run.thread_id)
+        return self.tracker.wait(run)
 
     def last_messages(
         self, thread_id: str, include_user: bool = False
@@ -72,24 +162,115 @@ class Assistant:
         return responses
 
     def invoke_all(self, *prompts: str) -> list[list[Message]]:
-        threads_and_runs = [self.create_thread_and_run(prompt) for prompt in prompts]
-        runs = self.gather_runs(*[run for _, run in threads_and_runs])
-        messages = [self.last_messages(run.thread_id) for run in runs]
+        # Each run holds its scheduler slot until it finishes, so runs are started
+        # as slots free up while the earlier ones are polled, not all up front
+        scheduler = get_scheduler()
+        budget = scheduler.budget(self.assistant.model)
+        calls = [CallRecord("assistant.invoke", self.assistant.model) for _ in prompts]
+        held: dict[int, Reservation] = {}
+        start = time.monotonic()
+        submitted = 0
+
+        def submit(block: bool) -> list[Run] | None:
+            nonlocal submitted
+            if submitted == len(prompts):
+                return None
+            runs = []
+            while submitted < len(prompts):
+                tokens = run_request_tokens(self.assistant, prompts[submitted])
+                if block and not runs:
+                    reservation = scheduler.acquire_sync(self.assistant.model, tokens)
+                else:
+                    reservation = budget.try_acquire(tokens)
+                    if not isinstance(reservation, Reservation):
+                        break
+                index, submitted = submitted, submitted + 1
+                held[index] = reservation
+                calls[index].attempts += 1
+                calls[index].queue_wait = time.monotonic() - start
+                with bind_call(calls[index]):
+                    _, run = self.create_thread_and_run(prompts[index])
+                runs.append(run)
+            return runs
+
+        # Messages are fetched as soon as each run finishes rather than after all runs
+        messages = [None] * len(prompts)
+        try:
+            completed_runs = self.tracker.as_completed([], submit=submit)
+            for index, run in tqdm(
+                completed_runs, total=len(prompts), desc="Polling runs"
+            ):
+                if run.status != "completed":
+                    print(f"WARNING: Run {run.id} is not complete. {run=}")
+                scheduler.release(
+                    self.assistant.model, held.pop(index), run_tokens(run)
+                )
+                messages[index] = self.last_messages(run.thread_id)
+                calls[index].add_usage(run.usage)
+                finish_call(calls[index])
+        finally:
+            for reservation in held.values():
+                scheduler.release(self.assistant.model, reservation)
         return messages
 
     def invoke(self, prompt: str) -> list[Message]:
-        thread, run = self.create_thread_and_run(prompt)
-        run = self.poll_run(run)
-        messages = self.last_messages(run.thread_id)
+        # The slot is held until the run finishes, so the in-flight window also
+        # bounds the number of concurrently executing runs
+        with measure_call("assistant.invoke", self.assistant.model) as call:
+            with get_scheduler().sync_slot(
+                self.assistant.model, run_request_tokens(self.assistant, prompt)
+            ) as reservation:
+                call.attempts += 1
+                call.queue_wait = reservation.queue_wait
+                thread, run = self.create_thread_and_run(prompt)
+                run = self.poll_run(run)
+                reservation.used_tokens = run_tokens(run)
+            call.add_usage(run.usage)
+            messages = self.last_messages(run.thread_id)
         return messages
 
     def prompt(self, prompt: str) -> list[str | bytes]:
         messages = self.invoke(prompt)
-        processed_messages = []
-        for message in messages:
-            processed_messages.extend(process_message(self.client, message))
+        return process_messages(self.client, messages)
 
-        return processed_messages
+    def stream(self, prompt: str) -> Iterator[StreamEvent]:
+        """Runs the prompt, yielding text, code and images as they are produced."""
+        thread = self.client.beta.threads.create()
+        self.client.beta.threads.messages.create(
+            thread_id=thread.id, role="user", content=prompt
+        )
+        call = CallRecord("assistant.stream", self.assistant.model)
+        error = None
+        try:
+            with get_scheduler().sync_slot(
+                self.assistant.model, run_request_tokens(self.assistant, prompt)
+            ) as reservation:
+                call.attempts += 1
+                call.queue_wait = reservation.queue_wait
+                with ExitStack() as stack:
+                    stream = self.with_assistant(
+                        lambda assistant_id: stack.enter_context(
+                            self.client.beta.threads.runs.stream(
+                                thread_id=thread.id, assistant_id=assistant_id
+                            )
+                        )
+                    )
+                    for event in stream:
+                        for stream_event in parse_stream_event(event):
+                            record_stream_event(call, reservation, stream_event)
+                            if isinstance(stream_event, ImageReady):
+                                image_bytes = get_file_content(
+                                    self.client, stream_event.file_id
+                                )
+                                stream_event.image = LazyImage(
+                                    image_bytes, file_id=stream_event.file_id
+                                )
+                            yield stream_event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            finish_call(call, error)
 
     def messages_to_string(self, messages: list[Message]) -> str:
         text_messages = []
@@ -100,22 +281,20 @@ class Assistant:
         text_messages = reversed(text_messages)
         return "\n".join(text_messages)
 
-    def messages_to_images(self, messages: list[Message]) -> list[ImageFile.ImageFile]:
-        images = []
-        for message in messages:
-            images.extend(self.message_to_images(message))
+    def messages_to_images(self, messages: list[Message]) -> list[LazyImage]:
+        all_image_bytes = get_image_bytes_from_messages(self.client, messages)
+        images = [
+            image
+            for message, message_image_bytes in zip(messages, all_image_bytes)
+            for image in to_lazy_images(message, message_image_bytes)
+        ]
 
         # The images are ordered from newest to oldest, so we reverse them
         images = reversed(images)
         return images
 
-    def message_to_images(self, message: Message) -> list[ImageFile.ImageFile]:
-        all_image_bytes = self.get_image_bytes_from_message(message)
-        images = []
-        for image_bytes in all_image_bytes:
-            images.append(Image.open(BytesIO(image_bytes)))
-
-        return images
+    def message_to_images(self, message: Message) -> list[LazyImage]:
+        return to_lazy_images(message, self.get_image_bytes_from_message(message))
 
     def get_strings_from_message(self, message: Message) -> list[str]:
         return get_strings_from_message(message)
@@ -125,3 +304,208 @@ class Assistant:
 
     def display_message(self, message: Message, interactive: bool = False) -> None:
         return display_message(self.client, message, interactive=interactive)
+
+
+class AsyncAssistant:
+    def __init__(
+        self,
+        instructions: str,
+        tools: list[Tool],
+        llm_str: str = "gpt-4o",
+        temperature: float | None = None,
+    ):
+        self._client: AsyncOpenAI | None = None
+        self.tracker = AsyncRunTracker()
+        tool_dicts = [tool.to_dict() for tool in tools]
+        # Resolved synchronously so the assistant is available outside an event loop
+        self.assistant = get_registry().get_or_create(
+            get_client(),
+            instructions=instructions,
+            model=llm_str,
+            tools=tool_dicts,
+            temperature=temperature,
+        )
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is not None:
+            return self._client
+        return get_async_client()
+
+    @client.setter
+    def client(self, client: AsyncOpenAI) -> None:
+        self._client = client
+        self.tracker.client = client
+
+    async def create_thread_and_run(self, user_input: str) -> tuple[Thread, Run]:
+        thread = await self.client.beta.threads.create()
+        run = await self.submit_message(user_input, thread.id)
+        return thread, run
+
+    async def with_assistant(self, call: Callable[[str], Awaitable[T]]) -> T:
+        """
+        Calls with the assistant ID. The registry trusts its index without checking
+        the assistant still exists, so a deleted one is replaced and the call retried.
+        """
+        try:
+            return await call(self.assistant.id)
+        except NotFoundError as e:
+            if not is_missing_assistant(e, self.assistant.id):
+                raise
+            assistant = await asyncio.to_thread(
+                get_registry().replace, get_client(), self.assistant
+            )
+            if assistant is None:
+                raise
+            self.assistant = assistant
+        return await call(self.assistant.id)
+
+    async def submit_message(self, user_message: str, thread_id: str) -> Run:
+        await self.client.beta.threads.messages.create(
+            thread_id=thread_id, role="user", content=user_message
+        )
+        return await self.with_assistant(
+            lambda assistant_id: self.client.beta.threads.runs.create(
+                thread_id=thread_id, assistant_id=assistant_id
+            )
+        )
+
+    async def cancel_run(self, run: Run) -> None:
+        """Cancels the run on the server, so an abandoned run stops billing."""
+        try:
+            await self.client.beta.threads.runs.cancel(run.id, thread_id=run.thread_id)
+        except APIError as e:
+            print(f"WARNING: Failed to cancel run {run.id}. {e=}")
+
+    async def poll_run(self, run: Run) -> Run:
+        run = await self.tracker.wait(run)
+        if run.status != "completed":
+            print(f"WARNING: Run {run.id} is not complete. {run=}")
+        return run
+
+    async def last_messages(
+        self, thread_id: str, include_user: bool = False
+    ) -> list[Message]:
+        messages = await self.client.beta.threads.messages.list(thread_id)
+
+        responses = []
+        for message in messages.data:
+            if message.role == "assistant":
+                responses.append(message)
+            else:
+                if include_user:
+                    responses.append(message)
+                break
+
+        return responses
+
+    async def invoke_all(self, *prompts: str) -> list[list[Message]]:
+        # gather preserves input order, so results line up with the prompts
+        return await async_tqdm.gather(
+            *[self.invoke(prompt) for prompt in prompts], desc="Invoking assistant"
+        )
+
+    async def invoke_as_completed(
+        self, *prompts: str
+    ) -> AsyncIterator[tuple[int, list[Message]]]:
+        async def invoke(index: int, prompt: str) -> tuple[int, list[Message]]:
+            return index, await self.invoke(prompt)
+
+        tasks = [
+            asyncio.create_task(invoke(index, prompt))
+            for index, prompt in enumerate(prompts)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def invoke(self, prompt: str) -> list[Message]:
+        # The slot is held until the run finishes, so the in-flight window also
+        # bounds the number of concurrently executing runs
+        with measure_call("assistant.invoke", self.assistant.model) as call:
+            async with get_scheduler().slot(
+                self.assistant.model, run_request_tokens(self.assistant, prompt)
+            ) as reservation:
+                call.attempts += 1
+                call.queue_wait = reservation.queue_wait
+                thread, run = await self.create_thread_and_run(prompt)
+                try:
+                    run = await self.poll_run(run)
+                except asyncio.CancelledError:
+                    # Cancelling the task alone would leave the run going on the server
+                    await self.cancel_run(run)
+                    raise
+                reservation.used_tokens = run_tokens(run)
+            call.add_usage(run.usage)
+            return await self.last_messages(run.thread_id)
+
+    async def prompt(self, prompt: str) -> list[str | bytes]:
+        messages = await self.invoke(prompt)
+        return await async_process_messages(self.client, messages)
+
+    async def stream(self, prompt: str) -> AsyncIterator[StreamEvent]:
+        """Runs the prompt, yielding text, code and images as they are produced."""
+        thread = await self.client.beta.threads.create()
+        await self.client.beta.threads.messages.create(
+            thread_id=thread.id, role="user", content=prompt
+        )
+        call = CallRecord("assistant.stream", self.assistant.model)
+        error = None
+        try:
+            async with get_scheduler().slot(
+                self.assistant.model, run_request_tokens(self.assistant, prompt)
+            ) as reservation:
+                call.attempts += 1
+                call.queue_wait = reservation.queue_wait
+                async with AsyncExitStack() as stack:
+                    stream = await self.with_assistant(
+                        lambda assistant_id: stack.enter_async_context(
+                            self.client.beta.threads.runs.stream(
+                                thread_id=thread.id, assistant_id=assistant_id
+                            )
+                        )
+                    )
+                    async for event in stream:
+                        for stream_event in parse_stream_event(event):
+                            record_stream_event(call, reservation, stream_event)
+                            if isinstance(stream_event, ImageReady):
+                                image_bytes = await async_get_file_content(
+                                    self.client, stream_event.file_id
+                                )
+                                stream_event.image = LazyImage(
+                                    image_bytes, file_id=stream_event.file_id
+                                )
+                            yield stream_event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            finish_call(call, error)
+
+    def messages_to_string(self, messages: list[Message]) -> str:
+        text_messages = []
+        for message in messages:
+            text_messages.extend(get_strings_from_message(message))
+
+        # The messages are ordered from newest to oldest, so we reverse them
+        return "\n".join(reversed(text_messages))
+
+    async def messages_to_images(self, messages: list[Message]) -> list[LazyImage]:
+        all_image_bytes = await async_get_image_bytes_from_messages(
+            self.client, messages
+        )
+        images = [
+            image
+            for message, message_image_bytes in zip(messages, all_image_bytes)
+            for image in to_lazy_images(message, message_image_bytes)
+        ]
+
+        # The images are ordered from newest to oldest, so we reverse them
+        return list(reversed(images))
+
+    async def message_to_images(self, message: Message) -> list[LazyImage]:
+        all_image_bytes = await async_get_image_bytes_from_message(self.client, message)
+        return to_lazy_images(message, all_image_bytes)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+from openai import APIError, AsyncOpenAI
+from openai.types import Batch
+from openai.types.chat import ChatCompletion
+
+from dynamic_sketchpad.run_tracker import (
+    MAX_POLL_FAILURES,
+    TRANSIENT_ERRORS,
+    PollFailures,
+)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# Per-batch limits of the Batch API on the number of requests and input file size
+MAX_BATCH_REQUESTS = 50_000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+
+def chunk_lines(lines: list[str], max_requests: int, max_bytes: int) -> list[list[str]]:
+    """Splits JSONL lines into consecutive chunks within both batch limits."""
+    chunks, chunk, chunk_bytes = [], [], 0
+    for line in lines:
+        line_bytes = len(line.encode()) + 1
+        if chunk and (
+            len(chunk) >= max_requests or chunk_bytes + line_bytes > max_bytes
+        ):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(line)
+        chunk_bytes += line_bytes
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class BatchRunner:
+    """
+    Runs chat-completion requests through the Batch API: the requests are uploaded
+    as JSONL, split into as many batches as the per-batch limits require, each
+    batch is polled until it finishes, and the results are mapped back to input
+    order. Items without a successful result come back as None. Uploaded input
+    files are deleted once their batch has finished, and a batch whose wait is
+    aborted is cancelled rather than left running unobserved.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        poll_interval: float = 30.0,
+        completion_window: str = "24h",
+        max_requests: int = MAX_BATCH_REQUESTS,
+        max_bytes: int = MAX_BATCH_BYTES,
+        max_poll_failures: int = MAX_POLL_FAILURES,
+    ):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.failures = PollFailures(max_poll_failures)
+
+    async def run(self, bodies: list[dict]) -> list[ChatCompletion | None]:
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": str(index),
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": body,
+                }
+            )
+            for index, body in enumerate(bodies)
+        ]
+        chunks = chunk_lines(lines, self.max_requests, self.max_bytes)
+        offsets = [0]
+        for chunk in chunks[:-1]:
+            offsets.append(offsets[-1] + len(chunk))
+        chunk_results = await asyncio.gather(
+            *[self.run_chunk(chunk, offset) for chunk, offset in zip(chunks, offsets)]
+        )
+        return [result for results in chunk_results for result in results]
+
+    async def run_chunk(
+        self, lines: list[str], offset: int
+    ) -> list[ChatCompletion | None]:
+        input_file = await self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode()), purpose="batch"
+        )
+        try:
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window,
+            )
+            try:
+                batch = await self.wait(batch)
+            except BaseException:
+                await self.cancel(batch.id)
+                raise
+            if batch.status != "completed":
+                print(f"WARNING: Batch {batch.id} finished with status {batch.status}.")
+            return await self.results(batch, len(lines), offset)
+        finally:
+            await self.delete_file(input_file.id)
+
+    async def delete_file(self, file_id: str) -> None:
+        # A leftover input file only costs storage, so it never fails the batch
+        try:
+            await self.client.files.delete(file_id)
+        except APIError as e:
+            print(f"WARNING: Failed to delete batch input file {file_id}. {e=}")
+
+    async def cancel(self, batch_id: str) -> None:
+        try:
+            await self.client.batches.cancel(batch_id)
+        except APIError as e:
+            print(f"WARNING: Failed to cancel abandoned batch {batch_id}. {e=}")
+
+    async def wait(self, batch: Batch) -> Batch:
+        while batch.status not in TERMINAL_BATCH_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                retrieved = await self.client.batches.retrieve(batch.id)
+            except TRANSIENT_ERRORS as e:
+                self.failures.record(batch, e)
+                continue
+            self.failures.reset(batch)
+            batch = retrieved
+        return batch
+
+    async def results(
+        self, batch: Batch, n: int, offset: int = 0
+    ) -> list[ChatCompletion | None]:
+        results = [None] * n
+        if batch.output_file_id is None:
+            return results
+
+        output = await self.client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response")
+            if response is not None and response.get("status_code") == 200:
+                results[int(item["custom_id"]) - offset] = (
+                    ChatCompletion.model_validate(response["body"])
+                )
+        return results
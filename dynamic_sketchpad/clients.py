@@ -0,0 +1,163 @@
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import AsyncIterator
+from weakref import WeakKeyDictionary
+
+import httpx
+from openai import (
+    DEFAULT_MAX_RETRIES,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+)
+
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+@dataclass(frozen=True)
+class ConnectionSettings:
+    max_connections: int = 256
+    max_keepalive_connections: int = 64
+    keepalive_expiry: float = 60.0
+    http2: bool = HTTP2_AVAILABLE
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+_settings = ConnectionSettings()
+_lock = threading.Lock()
+_clients: dict[tuple, OpenAI] = {}
+# httpx async pools are bound to the loop they were first used on, so async clients
+# are shared per event loop and closed when it shuts down
+_async_clients: WeakKeyDictionary = WeakKeyDictionary()
+_async_closers: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def configure_connections(
+    max_connections: int = ConnectionSettings.max_connections,
+    max_keepalive_connections: int = ConnectionSettings.max_keepalive_connections,
+    keepalive_expiry: float = ConnectionSettings.keepalive_expiry,
+    http2: bool = HTTP2_AVAILABLE,
+) -> None:
+    """Sets the pool settings for clients created after this call."""
+    global _settings
+    if http2 and not HTTP2_AVAILABLE:
+        raise ValueError("HTTP/2 requires the h2 package, install httpx[http2].")
+    with _lock:
+        _settings = ConnectionSettings(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            http2=http2,
+        )
+        _clients.clear()
+        _async_clients.clear()
+
+
+def _get_or_create(clients: dict, key: tuple, create, max_retries: int):
+    # Clients differing only in retries are copies sharing one connection pool
+    if key not in clients:
+        clients[key] = create()
+    if max_retries == DEFAULT_MAX_RETRIES:
+        return clients[key]
+    if (*key, max_retries) not in clients:
+        clients[(*key, max_retries)] = clients[key].with_options(
+            max_retries=max_retries
+        )
+    return clients[(*key, max_retries)]
+
+
+async def _close_clients(clients: dict) -> None:
+    # Copies made by with_options share their base client's pool, closing is idempotent
+    open_clients = list(clients.values())
+    clients.clear()
+    await asyncio.gather(
+        *[client.close() for client in open_clients], return_exceptions=True
+    )
+
+
+async def _close_at_shutdown(clients: dict) -> AsyncIterator[None]:
+    # Stays suspended for the life of the loop. asyncio.run closes unfinished async
+    # generators in loop.shutdown_asyncgens, which runs this cleanup on that loop.
+    try:
+        yield
+    finally:
+        await _close_clients(clients)
+
+
+def _loop_clients(loop: asyncio.AbstractEventLoop) -> dict:
+    if loop not in _async_clients:
+        clients = _async_clients[loop] = {}
+        closer = _async_closers[loop] = _close_at_shutdown(clients)
+        asyncio.ensure_future(closer.asend(None))
+    return _async_clients[loop]
+
+
+async def aclose_async_clients() -> None:
+    """
+    Closes the shared async clients of the running loop. Loops run with asyncio.run
+    close them on shutdown; other loops should await this before closing.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    await _close_clients(clients)
+
+
+def get_client(
+    api_key: str | None = None,
+    base_url: str | None = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> OpenAI:
+    """Returns the process-wide sync client for the API key and base URL."""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL")
+    with _lock:
+        return _get_or_create(
+            _clients,
+            (api_key, base_url),
+            lambda: OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=DefaultHttpxClient(
+                    limits=_settings.limits(), http2=_settings.http2
+                ),
+            ),
+            max_retries,
+        )
+
+
+def get_async_client(
+    api_key: str | None = None,
+    base_url: str | None = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> AsyncOpenAI:
+    """
+    Returns the async client for the API key and base URL shared by everything
+    running on the current event loop. Must be called from a running loop.
+    """
+    loop = asyncio.get_running_loop()
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL")
+    with _lock:
+        return _get_or_create(
+            _loop_clients(loop),
+            (api_key, base_url),
+            lambda: AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=_settings.limits(), http2=_settings.http2
+                ),
+            ),
+            max_retries,
+        )
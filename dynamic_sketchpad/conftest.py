@@ -0,0 +1,201 @@
+import json
+import time
+from typing import Callable
+
+import httpx
+from openai import AsyncOpenAI
+from openai.types.beta import Assistant as OpenAIAssistant
+
+from dynamic_sketchpad.assistant import AsyncAssistant
+from dynamic_sketchpad.run_tracker import AsyncRunTracker
+
+FAST_POLLS = dict(initial_interval=0.001, max_interval=0.01, jitter=0.0)
+
+
+def chat_completion(
+    content: str | None, model: str = "gpt-4o", usage: dict | None = None, **message
+) -> dict:
+    """A chat.completion body answering with content and any other message fields."""
+    completion = {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content, **message},
+            }
+        ],
+    }
+    if usage is not None:
+        completion["usage"] = usage
+    return completion
+
+
+def run_object(run_id: str, thread_id: str, status: str) -> dict:
+    return {
+        "id": run_id,
+        "object": "thread.run",
+        "created_at": 0,
+        "thread_id": thread_id,
+        "assistant_id": "asst",
+        "status": status,
+        "model": "gpt-4o",
+        "instructions": "",
+        "tools": [],
+        "parallel_tool_calls": True,
+    }
+
+
+def message_object(thread_id: str, role: str, text: str) -> dict:
+    return {
+        "id": f"msg-{thread_id}-{role}",
+        "object": "thread.message",
+        "created_at": 0,
+        "thread_id": thread_id,
+        "role": role,
+        "status": "completed",
+        "attachments": [],
+        "metadata": {},
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+    }
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class AssistantsAPI:
+    """
+    Stand-in for the threads, messages, runs and file-content endpoints. Each run
+    completes delay(prompt, run_number) seconds after it was created and answers
+    with the prompt followed by "!"; streamed runs finish at once. File contents
+    are the file ID.
+    """
+
+    def __init__(self, delay: Callable[[str, int], float] = lambda prompt, n: 0.0):
+        self.delay = delay
+        self.prompts: dict[str, str] = {}
+        self.runs: dict[str, tuple[str, float]] = {}
+        self.cancelled: list[str] = []
+        self.finished: set[str] = set()
+        self.active = 0
+        self.peak_active = 0
+
+    def status(self, run_id: str) -> str:
+        if run_id in self.cancelled:
+            return "cancelled"
+        _, done_at = self.runs[run_id]
+        return "completed" if time.monotonic() >= done_at else "in_progress"
+
+    def stream_run(self, run_id: str, thread_id: str) -> httpx.Response:
+        message = message_object(thread_id, "assistant", "")
+        delta = {
+            "id": message["id"],
+            "object": "thread.message.delta",
+            "delta": {
+                "content": [
+                    {
+                        "index": 0,
+                        "type": "text",
+                        "text": {"value": f"{self.prompts[thread_id]}!"},
+                    }
+                ]
+            },
+        }
+        body = (
+            sse("thread.run.created", run_object(run_id, thread_id, "queued"))
+            + sse("thread.message.created", message)
+            + sse("thread.message.delta", delta)
+            + sse("thread.run.completed", run_object(run_id, thread_id, "completed"))
+            + "event: done\ndata: [DONE]\n\n"
+        )
+        return httpx.Response(
+            200, text=body, headers={"content-type": "text/event-stream"}
+        )
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        parts = request.url.path.strip("/").split("/")[1:]
+        if parts[0] == "files":
+            return httpx.Response(200, content=parts[1].encode())
+        if parts == ["threads"]:
+            thread_id = f"thread-{len(self.prompts)}"
+            self.prompts[thread_id] = ""
+            return httpx.Response(
+                200, json={"id": thread_id, "object": "thread", "created_at": 0}
+            )
+        thread_id = parts[1]
+        if parts[2:] == ["messages"] and request.method == "POST":
+            self.prompts[thread_id] = json.loads(request.content)["content"]
+            return httpx.Response(
+                200, json=message_object(thread_id, "user", self.prompts[thread_id])
+            )
+        if parts[2:] == ["messages"]:
+            prompt = self.prompts[thread_id]
+            messages = [
+                message_object(thread_id, "assistant", f"{prompt}!"),
+                message_object(thread_id, "user", prompt),
+            ]
+            return httpx.Response(
+                200,
+                json={
+                    "object": "list",
+                    "data": messages,
+                    "first_id": messages[0]["id"],
+                    "last_id": messages[-1]["id"],
+                    "has_more": False,
+                },
+            )
+        if parts[2:] == ["runs"] and json.loads(request.content).get("stream"):
+            run_id = f"run-{len(self.runs)}"
+            self.runs[run_id] = (thread_id, time.monotonic())
+            self.finished.add(run_id)
+            return self.stream_run(run_id, thread_id)
+        if parts[2:] == ["runs"]:
+            run_id = f"run-{len(self.runs)}"
+            delay = self.delay(self.prompts[thread_id], len(self.runs))
+            self.runs[run_id] = (thread_id, time.monotonic() + delay)
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            return httpx.Response(200, json=run_object(run_id, thread_id, "queued"))
+        run_id = parts[3]
+        if parts[4:] == ["cancel"]:
+            self.cancelled.append(run_id)
+            self.active -= 1
+            return httpx.Response(200, json=run_object(run_id, thread_id, "cancelling"))
+        status = self.status(run_id)
+        if status == "completed" and run_id not in self.finished:
+            self.finished.add(run_id)
+            self.active -= 1
+        return httpx.Response(200, json=run_object(run_id, thread_id, status))
+
+
+def async_assistant(
+    api: AssistantsAPI | None = None, base_url: str | None = None
+) -> AsyncAssistant:
+    """An assistant talking to the API stand-in, or to a server at base_url."""
+    # Built without the registry so no assistant is looked up or created
+    assistant = AsyncAssistant.__new__(AsyncAssistant)
+    assistant._client = None
+    assistant.tracker = AsyncRunTracker(**FAST_POLLS)
+    if api is not None:
+        assistant.client = AsyncOpenAI(
+            api_key="test",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(api)),
+        )
+    else:
+        assistant.client = AsyncOpenAI(api_key="test", base_url=base_url, max_retries=0)
+    assistant.assistant = OpenAIAssistant.model_validate(
+        dict(
+            id="asst",
+            object="assistant",
+            created_at=0,
+            model="gpt-4o",
+            instructions="",
+            tools=[],
+        )
+    )
+    return assistant
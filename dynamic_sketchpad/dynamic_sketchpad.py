@@ -1,4 +1,10 @@
-from dynamic_sketchpad.assistant import Assistant
+import asyncio
+
+from openai.types.beta.threads import Message
+from pydantic import BaseModel
+
+from dynamic_sketchpad.assistant import Assistant, AsyncAssistant
+from dynamic_sketchpad.llm import LLM, create_message
 from dynamic_sketchpad.tools import Tool
 
 DEFAULT_HINT_PROMPT = """
@@ -94,6 +100,11 @@ You are a personal tutor designed to guide students through problem-solving with
 DEFAULT_ANSWER_PROMPT = "You are a personal tutor. When asked a question, write and run code to draw a helpful diagram to help solve the question, then use the diagram to solve the question."
 
 
+VALIDATOR_INSTRUCTIONS = (
+    "You are a validator. Check the quality and clarity of the hint provided."
+)
+
+
 class DynamicSketchpad(Assistant):
     def __init__(self, instructions: str | None = None, llm_str: str = "gpt-4o"):
         if instructions is None:
@@ -105,31 +116,201 @@ class DynamicSketchpad(Assistant):
         )
 
 
+class AsyncDynamicSketchpad(AsyncAssistant):
+    def __init__(self, instructions: str | None = None, llm_str: str = "gpt-4o"):
+        if instructions is None:
+            instructions = DEFAULT_ANSWER_PROMPT
+        super().__init__(
+            instructions=instructions,
+            tools=[Tool.CODE_INTERPRETER],
+            llm_str=llm_str,
+        )
+
+
 class HintValidator(Assistant):
     def __init__(self, llm_str: str = "gpt-4o"):
         super().__init__(
-            instructions="You are a validator. Check the quality and clarity of the hint provided.",
+            instructions=VALIDATOR_INSTRUCTIONS,
             tools=[Tool.CODE_INTERPRETER],
             llm_str=llm_str,
         )
 
     def validate_hint(self, hint: str, question: str) -> bool:
-        response = self.prompt(
-            f"Validate this hint: {hint}. Is the hint clear and helpful to answer this questions: {question}? Reply with YES or NO."
+        response = self.prompt(validation_prompt(hint, question))
+        return "YES" in response[0].upper()
+
+
+class AsyncHintValidator(AsyncAssistant):
+    def __init__(self, llm_str: str = "gpt-4o"):
+        super().__init__(
+            instructions=VALIDATOR_INSTRUCTIONS,
+            tools=[Tool.CODE_INTERPRETER],
+            llm_str=llm_str,
         )
+
+    async def validate_hint(self, hint: str, question: str) -> bool:
+        response = await self.prompt(validation_prompt(hint, question))
         return "YES" in response[0].upper()
 
 
+class HintVerdict(BaseModel):
+    valid: bool
+    reason: str
+
+
+class HintVerdicts(BaseModel):
+    verdicts: list[HintVerdict]
+
+
+class LLMHintValidator(LLM):
+    """
+    Validates hints with a single structured-output chat completion instead of an
+    assistant run, so no thread, run polling or code interpreter is involved.
+    """
+
+    def __init__(self, llm_str: str = "gpt-4o-mini"):
+        super().__init__(llm_str=llm_str, default_instructions=VALIDATOR_INSTRUCTIONS)
+
+    async def verdict(self, hint: str, question: str) -> HintVerdict:
+        message = create_message("user", verdict_prompt(hint, question))
+        completion = await self.parse_completion([message], response_format=HintVerdict)
+        parsed = completion.choices[0].message.parsed
+        if parsed is None:
+            # A refusal or an unparseable reply is never a valid hint
+            refusal = completion.choices[0].message.refusal
+            print(f"WARNING: No verdict for hint, rejecting it. {refusal=}")
+            return HintVerdict(valid=False, reason=f"No verdict: {refusal}")
+        return parsed
+
+    async def validate_hint(self, hint: str, question: str) -> bool:
+        return (await self.verdict(hint, question)).valid
+
+    async def validate_hints(
+        self, hints_and_questions: list[tuple[str, str]], batch_size: int = 20
+    ) -> list[HintVerdict]:
+        batches = [
+            hints_and_questions[i : i + batch_size]
+            for i in range(0, len(hints_and_questions), batch_size)
+        ]
+        verdicts = await asyncio.gather(*[self._validate_batch(b) for b in batches])
+        return [verdict for batch_verdicts in verdicts for verdict in batch_verdicts]
+
+    async def _validate_batch(
+        self, hints_and_questions: list[tuple[str, str]]
+    ) -> list[HintVerdict]:
+        pairs = "\n\n".join(
+            f"### Pair {i}\nHint: {hint}\nQuestion: {question}"
+            for i, (hint, question) in enumerate(hints_and_questions)
+        )
+        message = create_message(
+            "user",
+            f"For each pair below, decide whether the hint is clear and helpful to answer the question. Return exactly one verdict per pair, in order.\n\n{pairs}",
+        )
+        completion = await self.parse_completion(
+            [message], response_format=HintVerdicts
+        )
+        parsed = completion.choices[0].message.parsed
+        verdicts = parsed.verdicts if parsed is not None else []
+        if len(verdicts) != len(hints_and_questions):
+            print(
+                f"WARNING: Expected {len(hints_and_questions)} verdicts, got {len(verdicts)}. Validating individually."
+            )
+            return await asyncio.gather(
+                *[
+                    self.verdict(hint, question)
+                    for hint, question in hints_and_questions
+                ]
+            )
+        return verdicts
+
+
+def validation_question(hint: str, question: str) -> str:
+    return f"Validate this hint: {hint}. Is the hint clear and helpful to answer this questions: {question}?"
+
+
+def validation_prompt(hint: str, question: str) -> str:
+    return f"{validation_question(hint, question)} Reply with YES or NO."
+
+
+def verdict_prompt(hint: str, question: str) -> str:
+    return f"{validation_question(hint, question)} Set valid to whether it is and give the reason for your verdict."
+
+
 def generate_and_validate_hint(
-    question: str, sketchpad: DynamicSketchpad, validator: HintValidator
+    question: str,
+    sketchpad: DynamicSketchpad,
+    validator: HintValidator,
+    max_attempts: int | None = None,
 ):
     hint = sketchpad.invoke(prompt=question)
-    is_valid = validator.validate_hint(hint[0], question)
+    is_valid = validator.validate_hint(sketchpad.messages_to_string(hint), question)
+    attempts = 1
 
     while not is_valid:
+        if max_attempts is not None and attempts >= max_attempts:
+            raise RuntimeError(f"No valid hint after {attempts} attempts.")
         print("Hint failed validation. Generating a new hint...")
         hint = sketchpad.invoke(prompt=question)
-        is_valid = validator.validate_hint(hint[0], question)
+        is_valid = validator.validate_hint(sketchpad.messages_to_string(hint), question)
+        attempts += 1
 
     print("Hint validated successfully.")
     return hint
+
+
+async def speculative_generate_and_validate_hint(
+    question: str,
+    sketchpad: AsyncDynamicSketchpad,
+    validator: AsyncHintValidator | LLMHintValidator,
+    n_candidates: int = 3,
+    max_attempts: int = 9,
+) -> list[Message]:
+    """
+    Generates up to n_candidates hints concurrently and validates each as soon as it
+    arrives. The first valid hint is returned and the remaining attempts cancelled,
+    along with their runs on the server; a failed attempt is replaced by a new one
+    until max_attempts have been started.
+    """
+
+    async def attempt() -> tuple[list[Message], bool]:
+        hint = await sketchpad.invoke(prompt=question)
+        is_valid = await validator.validate_hint(
+            sketchpad.messages_to_string(hint), question
+        )
+        return hint, is_valid
+
+    attempts = 0
+    pending = set()
+
+    def launch() -> None:
+        nonlocal attempts
+        attempts += 1
+        pending.add(asyncio.create_task(attempt()))
+
+    for _ in range(min(n_candidates, max_attempts)):
+        launch()
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is not None:
+                    print(f"WARNING: Hint attempt failed. {task.exception()=}")
+                else:
+                    hint, is_valid = task.result()
+                    if is_valid:
+                        print("Hint validated successfully.")
+                        return hint
+                    print("Hint failed validation. Generating a new hint...")
+
+                if attempts < max_attempts:
+                    launch()
+    finally:
+        for task in pending:
+            task.cancel()
+        # Waited for so each cancelled attempt gets to cancel its run on the server
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    raise RuntimeError(f"No valid hint after {attempts} attempts.")
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from dynamic_sketchpad.paths import CACHE_DIR
+
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+
+
+class FileCache:
+    """
+    Two-tier cache for OpenAI file contents keyed by file ID.
+
+    Files are immutable once created, so entries never need invalidation. Both the
+    in-memory and the on-disk tier are bounded in bytes and evict the least recently
+    used entries first.
+    """
+
+    def __init__(
+        self,
+        directory: Path = CACHE_DIR / "files",
+        max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        # File name -> size of the disk tier, least recently used first. Scanned once
+        # and then kept up to date, so eviction never lists the directory again.
+        self._disk: OrderedDict[str, int] | None = None
+        self._disk_bytes = 0
+        # Guards the bookkeeping only; file reads and writes happen outside of it
+        self._lock = threading.Lock()
+
+    def _path(self, file_id: str) -> Path:
+        return self.directory / re.sub(r"[^A-Za-z0-9_.-]", "_", file_id)
+
+    def _remember(self, file_id: str, data: bytes) -> None:
+        if file_id in self._memory:
+            self._memory.move_to_end(file_id)
+            return
+        self._memory[file_id] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _disk_entries(self) -> list[os.DirEntry]:
+        if not self.directory.exists():
+            return []
+        return [entry for entry in os.scandir(self.directory) if entry.is_file()]
+
+    def _scan_disk(self) -> OrderedDict[str, int]:
+        entries = []
+        for entry in self._disk_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+        return OrderedDict((name, size) for _, name, size in sorted(entries))
+
+    def _disk_index(self) -> OrderedDict[str, int]:
+        if self._disk is None:
+            disk = self._scan_disk()
+            with self._lock:
+                if self._disk is None:
+                    self._disk = disk
+                    self._disk_bytes = sum(disk.values())
+        return self._disk
+
+    def _evictions(self) -> list[str]:
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            name, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(name)
+        return evicted
+
+    def _forget_disk(self, name: str) -> None:
+        size = self._disk.pop(name, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def get_cached(self, file_id: str) -> bytes | None:
+        """Returns the file from the memory tier without touching the disk."""
+        with self._lock:
+            if file_id in self._memory:
+                self._memory.move_to_end(file_id)
+                return self._memory[file_id]
+        return None
+
+    def get(self, file_id: str) -> bytes | None:
+        data = self.get_cached(file_id)
+        if data is not None:
+            return data
+
+        disk = self._disk_index()
+        path = self._path(file_id)
+        try:
+            data = path.read_bytes()
+            # The modification time doubles as the last access time across processes
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget_disk(path.name)
+            return None
+        with self._lock:
+            if path.name in disk:
+                disk.move_to_end(path.name)
+            else:
+                disk[path.name] = len(data)
+                self._disk_bytes += len(data)
+            self._remember(file_id, data)
+        return data
+
+    def put(self, file_id: str, data: bytes) -> None:
+        disk = self._disk_index()
+        path = self._path(file_id)
+        with self._lock:
+            self._remember(file_id, data)
+            if path.name in disk:
+                disk.move_to_end(path.name)
+                return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if path.name not in disk:
+                disk[path.name] = len(data)
+                self._disk_bytes += len(data)
+            evicted = self._evictions()
+        for name in evicted:
+            try:
+                os.remove(self.directory / name)
+            except FileNotFoundError:
+                pass
+
+    def get_or_fetch(self, file_id: str, fetch: Callable[[], bytes]) -> bytes:
+        data = self.get(file_id)
+        if data is None:
+            data = fetch()
+            self.put(file_id, data)
+        return data
+
+    async def async_get_or_fetch(
+        self, file_id: str, fetch: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        # Memory hits are answered on the loop, disk access runs in a worker thread
+        data = self.get_cached(file_id)
+        if data is None:
+            data = await asyncio.to_thread(self.get, file_id)
+        if data is None:
+            data = await fetch()
+            await asyncio.to_thread(self.put, file_id, data)
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._disk = OrderedDict()
+            self._disk_bytes = 0
+        for entry in self._disk_entries():
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+_file_cache = FileCache()
+
+
+def get_file_cache() -> FileCache:
+    return _file_cache
@@ -0,0 +1,79 @@
+import os
+import struct
+from functools import cached_property
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class LazyImage:
+    """
+    Encoded image bytes that are only decoded on demand.
+
+    Size and format come from the file header, so holding many of these costs no
+    more than the compressed bytes, and they can be written out without a
+    decode/re-encode cycle.
+    """
+
+    def __init__(self, data: bytes, file_id: str | None = None):
+        self.data = data
+        self.file_id = file_id
+
+    @cached_property
+    def _header(self) -> tuple[str | None, tuple[int, int]]:
+        if self.data.startswith(PNG_SIGNATURE) and self.data[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", self.data[16:24])
+            return "PNG", (width, height)
+
+        # Image.open only parses the header until the pixel data is accessed
+        with Image.open(BytesIO(self.data)) as image:
+            return image.format, image.size
+
+    @property
+    def format(self) -> str | None:
+        return self._header[0]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._header[1]
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    def open(self) -> Image.Image:
+        image = Image.open(BytesIO(self.data))
+        image.load()
+        return image
+
+    def thumbnail(self, size: tuple[int, int]) -> Image.Image:
+        image = Image.open(BytesIO(self.data))
+        # draft lets JPEG decoders downscale while decoding
+        image.draft(image.mode, size)
+        image.thumbnail(size)
+        return image
+
+    def thumbnail_bytes(self, size: tuple[int, int], format: str = "PNG") -> bytes:
+        buffer = BytesIO()
+        self.thumbnail(size).save(buffer, format=format)
+        return buffer.getvalue()
+
+    def save(self, path: str | os.PathLike) -> None:
+        Path(path).write_bytes(self.data)
+
+    def _repr_png_(self) -> bytes | None:
+        return self.data if self.format == "PNG" else None
+
+    def __repr__(self) -> str:
+        return f"LazyImage(file_id={self.file_id!r}, format={self.format!r}, size={self.size!r}, nbytes={self.nbytes})"
@@ -0,0 +1,163 @@
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping
+
+from openai import APIStatusError
+from tenacity import RetryCallState
+from tenacity.wait import wait_base
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+RATE_KINDS = ("requests", "tokens")
+
+
+def parse_duration(value: str) -> float | None:
+    """Parses rate-limit reset durations such as "1s", "6m0s" or "20ms"."""
+    matches = DURATION_PATTERN.findall(value)
+    if not matches:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in matches)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> float | None:
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        value = headers["retry-after"]
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> int | None:
+    try:
+        return int(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by responses and rate-limit headers.
+
+    The cap stays off, admitting up to max_limit, until the server first reports
+    x-ratelimit-* headers or pushes back with a 429 or a 5xx, so traffic that never
+    reports back, such as assistant runs, runs at the configured concurrency. From
+    then on the limit starts at initial_limit and grows one request per success
+    (slow start) until the first sign of pressure, then by about one request per
+    window of in-flight requests; a 429, a 5xx or a nearly exhausted
+    x-ratelimit-remaining-* budget shrinks it multiplicatively, at most once per
+    cooldown so a burst of responses to the same pressure counts once. When the
+    server says how long to wait, all callers are paused for exactly that long
+    instead of sleeping independently.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 256,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        headroom: float = 0.05,
+        cooldown: float = 1.0,
+    ):
+        self.initial_limit = initial_limit
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.headroom = headroom
+        self.cooldown = cooldown
+        self.active = False
+        self.slow_start = True
+        self.paused_until = 0.0
+        self._last_backoff = float("-inf")
+        self._lock = threading.Lock()
+
+    def set_max_limit(self, max_limit: float) -> None:
+        """An explicit new maximum also becomes the limit, whether higher or lower."""
+        with self._lock:
+            self.max_limit = max_limit
+            if self.active:
+                self.limit = max_limit
+
+    @property
+    def max_in_flight(self) -> int:
+        limit = self.limit if self.active else self.max_limit
+        return max(int(limit), 1)
+
+    def _activate(self) -> None:
+        if not self.active:
+            self.active = True
+            self.limit = min(self.initial_limit, self.max_limit)
+
+    def pause_remaining(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def _pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _backoff(self) -> None:
+        self.slow_start = False
+        now = time.monotonic()
+        if now - self._last_backoff >= self.cooldown:
+            self._last_backoff = now
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+
+    def on_success(self, headers: Mapping[str, str]) -> None:
+        with self._lock:
+            if any(f"x-ratelimit-limit-{kind}" in headers for kind in RATE_KINDS):
+                self._activate()
+            if not self.active:
+                return
+            for kind in RATE_KINDS:
+                remaining = _header_int(headers, f"x-ratelimit-remaining-{kind}")
+                limit = _header_int(headers, f"x-ratelimit-limit-{kind}")
+                if remaining is None or not limit:
+                    continue
+                if remaining / limit < self.headroom:
+                    self._backoff()
+                    if remaining == 0:
+                        reset = parse_duration(
+                            headers.get(f"x-ratelimit-reset-{kind}", "")
+                        )
+                        self._pause(reset or 0.0)
+                    return
+            increase = self.increase if self.slow_start else self.increase / self.limit
+            self.limit = min(self.max_limit, self.limit + increase)
+
+    def on_error(self, status_code: int, headers: Mapping[str, str]) -> None:
+        with self._lock:
+            if status_code == 429 or status_code >= 500:
+                self._activate()
+                self._backoff()
+            retry_after = retry_after_seconds(headers)
+            if status_code == 429 and retry_after is not None:
+                self._pause(retry_after)
+
+
+class wait_retry_after(wait_base):
+    """Waits as long as the server asked via Retry-After, else uses the fallback."""
+
+    def __init__(self, fallback: wait_base):
+        self.fallback = fallback
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        exception = retry_state.outcome.exception()
+        if isinstance(exception, APIStatusError):
+            retry_after = retry_after_seconds(exception.response.headers)
+            if retry_after is not None:
+                return retry_after
+        return self.fallback(retry_state)
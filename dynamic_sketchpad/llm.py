@@ -1,18 +1,32 @@
 import asyncio
-import os
-from typing import Dict, TypedDict, TypeVar
+from typing import AsyncIterator, Dict, TypedDict, TypeVar
 
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from openai import APIStatusError, AsyncOpenAI
 from openai.types import Completion
+from openai.types.chat import ChatCompletion
 from openai.types.chat.parsed_chat_completion import ParsedChatCompletion
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 from tqdm.asyncio import tqdm
 
+from dynamic_sketchpad.batch import BatchRunner
+from dynamic_sketchpad.clients import get_async_client
+from dynamic_sketchpad.limiter import wait_retry_after
+from dynamic_sketchpad.metrics import current_call, measure_call
+from dynamic_sketchpad.response_cache import ResponseCache, canonical_key
+from dynamic_sketchpad.scheduler import get_scheduler
+from dynamic_sketchpad.tokens import (
+    TruncationPolicy,
+    estimate_request_tokens,
+    truncate_messages,
+)
+
 load_dotenv()
 
 ResponseFormatT = TypeVar("ResponseFormatT")
 
+RETRY_WAIT = wait_retry_after(fallback=wait_random_exponential(min=1, max=60))
+
 
 class Message(TypedDict):
     role: str
@@ -37,17 +51,50 @@ def from_messages_to_prompt(
     )
 
 
+def reply_token_limit(kwargs: dict) -> int | None:
+    """The completion token cap of a request, under either parameter name."""
+    return kwargs.get("max_completion_tokens") or kwargs.get("max_tokens")
+
+
 class LLM:
     def __init__(
-        self, llm_str: str = "gpt-4o", default_instructions: str | None = None
+        self,
+        llm_str: str = "gpt-4o",
+        default_instructions: str | None = None,
+        cache: ResponseCache | None = None,
+        truncation: TruncationPolicy | None = None,
     ):
-        self.client = AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-        )
+        self._client: AsyncOpenAI | None = None
         self.llm_str = llm_str
         self.instructions = default_instructions
+        self.cache = cache
+        self.truncation = truncation
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is not None:
+            return self._client
+        # Retries are left to tenacity so every 429 reaches the concurrency limiter
+        return get_async_client(max_retries=0)
+
+    @client.setter
+    def client(self, client: AsyncOpenAI) -> None:
+        self._client = client
+
+    @property
+    def batch_client(self) -> AsyncOpenAI:
+        if self._client is not None:
+            return self._client
+        # Batch traffic bypasses the limiter and polls for hours, so it keeps the
+        # client's own retries
+        return get_async_client()
+
+    async def generate_responses(
+        self, input_texts: list[str], batch: bool = False, **kwargs
+    ) -> list[str]:
+        if batch:
+            return await self.generate_responses_batch(input_texts, **kwargs)
 
-    async def generate_responses(self, input_texts: list[str], **kwargs) -> list[str]:
         return await tqdm.gather(
             *[
                 self.generate_response(input_text, **kwargs)
@@ -55,43 +102,219 @@ class LLM:
             ]
         )
 
+    async def iter_responses(
+        self, input_texts: list[str], max_pending: int = 32, **kwargs
+    ) -> AsyncIterator[tuple[int, str]]:
+        """
+        Yields (index, response) pairs in completion order. At most max_pending
+        responses are requested or waiting to be consumed at any time, so a slow
+        consumer throttles generation instead of buffering every response.
+        """
+        pending = asyncio.Semaphore(max_pending)
+        completed = asyncio.Queue()
+        tasks = []
+
+        async def generate(index: int):
+            try:
+                response = await self.generate_response(input_texts[index], **kwargs)
+            except Exception as e:
+                completed.put_nowait((index, None, e))
+            else:
+                completed.put_nowait((index, response, None))
+
+        async def spawn():
+            for index in range(len(input_texts)):
+                await pending.acquire()
+                tasks.append(asyncio.create_task(generate(index)))
+
+        spawner = asyncio.create_task(spawn())
+        try:
+            for _ in range(len(input_texts)):
+                index, response, error = await completed.get()
+                if error is not None:
+                    raise error
+                yield index, response
+                pending.release()
+        finally:
+            spawner.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def generate_responses_batch(
+        self, input_texts: list[str], poll_interval: float = 30.0, **kwargs
+    ) -> list[str]:
+        """
+        Generates responses through the Batch API, trading latency for throughput
+        and cost. Cached responses are reused and only the rest are batched; items
+        the batch fails to answer are retried with live calls.
+        """
+        # Requests are keyed like live ones, so both modes share cached responses
+        bodies, keys = [], []
+        for input_text in input_texts:
+            request_kwargs = dict(kwargs)
+            messages = self._fit_to_budget(
+                self._with_instructions(
+                    [create_message("user", input_text)], request_kwargs
+                ),
+                request_kwargs,
+            )
+            bodies.append(
+                {"model": self.llm_str, "messages": messages, **request_kwargs}
+            )
+            keys.append(
+                canonical_key(model=self.llm_str, messages=messages, **request_kwargs)
+            )
+
+        completions = [None] * len(input_texts)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get_many, keys)
+            for i, value in enumerate(cached):
+                if value is not None:
+                    completions[i] = ChatCompletion.model_validate_json(value)
+        uncached = [i for i, completion in enumerate(completions) if completion is None]
+
+        if uncached:
+            runner = BatchRunner(self.batch_client, poll_interval=poll_interval)
+            batch_completions = await runner.run([bodies[i] for i in uncached])
+            for i, completion in zip(uncached, batch_completions):
+                completions[i] = completion
+            if self.cache is not None:
+                await asyncio.to_thread(
+                    self.cache.put_many,
+                    {
+                        keys[i]: completions[i].model_dump_json()
+                        for i in uncached
+                        if completions[i] is not None
+                    },
+                )
+
+        responses = [
+            completion.choices[0].message.content if completion is not None else None
+            for completion in completions
+        ]
+        failed = [i for i, completion in enumerate(completions) if completion is None]
+        if failed:
+            print(f"WARNING: {len(failed)} batch items failed, retrying them live.")
+            retried = await self.generate_responses(
+                [input_texts[i] for i in failed], **kwargs
+            )
+            for i, response in zip(failed, retried):
+                responses[i] = response
+
+        return responses
+
     async def generate_response(self, input_text: str, **kwargs) -> str:
-        print(f"Generating response for input: {input_text}")
         messages = [create_message("user", input_text)]
         completion = await self.create_completion(messages, **kwargs)
         return completion.choices[0].message.content
 
-    @retry(wait=wait_random_exponential(min=10, max=60), stop=stop_after_attempt(6))
     async def create_completion(self, messages: list[Message], **kwargs) -> Completion:
-        instructions = kwargs.pop("instructions", self.instructions)
-
-        if instructions is not None:
-            system_message = create_message("system", instructions)
-            messages = [system_message, *messages]
-
-        response = await self.client.chat.completions.create(
-            model=self.llm_str,
-            messages=messages,
-            **kwargs,
+        messages = self._fit_to_budget(
+            self._with_instructions(messages, kwargs), kwargs
         )
-        return response
+        with measure_call("chat.completions.create", self.llm_str) as call:
+            if self.cache is None:
+                return await self._create_completion(messages, **kwargs)
+
+            key = canonical_key(model=self.llm_str, messages=messages, **kwargs)
+            completion = await self.cache.get_or_create(
+                key,
+                lambda: self._create_completion(messages, **kwargs),
+                ChatCompletion,
+            )
+            call.cache_hit = call.attempts == 0
+            return completion
 
-    @retry(wait=wait_random_exponential(min=10, max=60), stop=stop_after_attempt(6))
     async def parse_completion(
         self, messages: list[Message], response_format: ResponseFormatT, **kwargs
     ) -> ParsedChatCompletion[ResponseFormatT]:
+        messages = self._fit_to_budget(
+            self._with_instructions(messages, kwargs), kwargs
+        )
+        with measure_call("chat.completions.parse", self.llm_str) as call:
+            if self.cache is None:
+                return await self._parse_completion(messages, response_format, **kwargs)
+
+            key = canonical_key(
+                model=self.llm_str,
+                messages=messages,
+                response_format=response_format,
+                **kwargs,
+            )
+            completion = await self.cache.get_or_create(
+                key,
+                lambda: self._parse_completion(messages, response_format, **kwargs),
+                ParsedChatCompletion[response_format],
+            )
+            call.cache_hit = call.attempts == 0
+            return completion
+
+    def _with_instructions(
+        self, messages: list[Message], kwargs: dict
+    ) -> list[Message]:
         instructions = kwargs.pop("instructions", self.instructions)
 
         if instructions is not None:
             system_message = create_message("system", instructions)
             messages = [system_message, *messages]
+        return messages
+
+    def _fit_to_budget(self, messages: list[Message], kwargs: dict) -> list[Message]:
+        # With a truncation policy, requests over the context window are truncated
+        # up front rather than rejected by the API
+        if self.truncation is None:
+            return messages
+        limit = get_scheduler().max_request_tokens(self.llm_str) - (
+            reply_token_limit(kwargs) or 0
+        )
+        return truncate_messages(messages, limit, self.llm_str, self.truncation)
+
+    @retry(wait=RETRY_WAIT, stop=stop_after_attempt(6))
+    async def _create_completion(
+        self, messages: list[Message], **kwargs
+    ) -> ChatCompletion:
+        return await self._request(
+            self.client.chat.completions.with_raw_response.create, messages, **kwargs
+        )
 
-        response = await self.client.beta.chat.completions.parse(
-            model=self.llm_str,
-            messages=messages,
+    @retry(wait=RETRY_WAIT, stop=stop_after_attempt(6))
+    async def _parse_completion(
+        self, messages: list[Message], response_format: ResponseFormatT, **kwargs
+    ) -> ParsedChatCompletion[ResponseFormatT]:
+        return await self._request(
+            self.client.beta.chat.completions.with_raw_response.parse,
+            messages,
             response_format=response_format,
             **kwargs,
         )
+
+    async def _request(self, create, messages: list[Message], **kwargs):
+        scheduler = get_scheduler()
+        tokens = estimate_request_tokens(
+            messages, self.llm_str, reply_token_limit(kwargs)
+        )
+        call = current_call()
+        async with scheduler.slot(self.llm_str, tokens) as reservation:
+            if call is not None:
+                call.attempts += 1
+                call.queue_wait += reservation.queue_wait
+            try:
+                raw_response = await create(
+                    model=self.llm_str, messages=messages, **kwargs
+                )
+            except APIStatusError as e:
+                scheduler.observe_error(
+                    self.llm_str, e.response.status_code, e.response.headers
+                )
+                raise
+            scheduler.observe_response(self.llm_str, raw_response.headers)
+            response = raw_response.parse()
+            if response.usage is not None:
+                reservation.used_tokens = response.usage.total_tokens
+            if call is not None:
+                # Non-streaming: the first token arrives with the whole response
+                call.mark_first_token()
+                call.add_usage(response.usage)
         return response
 
 
@@ -0,0 +1,223 @@
+import statistics
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Protocol
+
+
+@dataclass
+class CallRecord:
+    operation: str
+    model: str
+    started_at: float = field(default_factory=time.monotonic)
+    queue_wait: float = 0.0
+    time_to_first_token: float | None = None
+    latency: float = 0.0
+    attempts: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cache_hit: bool = False
+    error: str | None = None
+
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - 1, 0)
+
+    def mark_first_token(self) -> None:
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.monotonic() - self.started_at
+
+    def add_usage(self, usage) -> None:
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+        prompt_tokens_details = getattr(usage, "prompt_tokens_details", None)
+        if prompt_tokens_details is not None:
+            self.cached_tokens += prompt_tokens_details.cached_tokens or 0
+
+
+class MetricsSink(Protocol):
+    def record(self, record: CallRecord) -> None: ...
+
+
+_sinks: list[MetricsSink] = []
+_sinks_lock = threading.Lock()
+_current_call: ContextVar[CallRecord | None] = ContextVar("current_call", default=None)
+
+
+def add_sink(sink: MetricsSink) -> None:
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink: MetricsSink) -> None:
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def current_call() -> CallRecord | None:
+    return _current_call.get()
+
+
+def finish_call(record: CallRecord, error: Exception | None = None) -> None:
+    record.latency = time.monotonic() - record.started_at
+    if error is not None:
+        record.error = type(error).__name__
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        sink.record(record)
+
+
+@contextmanager
+def bind_call(record: CallRecord) -> Iterator[CallRecord]:
+    """Makes the record the current call without finishing it on exit."""
+    token = _current_call.set(record)
+    try:
+        yield record
+    finally:
+        _current_call.reset(token)
+
+
+@contextmanager
+def measure_call(operation: str, model: str) -> Iterator[CallRecord]:
+    """Times a call and publishes its record to every sink when it finishes."""
+    with bind_call(CallRecord(operation, model)) as record:
+        error = None
+        try:
+            yield record
+        except Exception as e:
+            # A cancelled call (CancelledError, GeneratorExit) is not a failed one
+            error = e
+            raise
+        finally:
+            finish_call(record, error)
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percentile - 1]
+
+
+class InMemoryMetrics:
+    def __init__(self):
+        self.records: list[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, record: CallRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> dict[tuple[str, str], dict[str, float]]:
+        with self._lock:
+            records = list(self.records)
+
+        grouped = defaultdict(list)
+        for record in records:
+            grouped[(record.operation, record.model)].append(record)
+
+        summary = {}
+        for key, group in grouped.items():
+            latencies = [record.latency for record in group]
+            ttfts = [
+                record.time_to_first_token
+                for record in group
+                if record.time_to_first_token is not None
+            ]
+            stats = {
+                "calls": len(group),
+                "errors": sum(record.error is not None for record in group),
+                "cache_hits": sum(record.cache_hit for record in group),
+                "retries": sum(record.retries for record in group),
+                "latency_mean": statistics.fmean(latencies),
+                "latency_p50": _percentile(latencies, 50),
+                "latency_p95": _percentile(latencies, 95),
+                "queue_wait_mean": statistics.fmean(r.queue_wait for r in group),
+                "prompt_tokens": sum(record.prompt_tokens for record in group),
+                "completion_tokens": sum(record.completion_tokens for record in group),
+                "cached_tokens": sum(record.cached_tokens for record in group),
+            }
+            if ttfts:
+                stats["ttft_p50"] = _percentile(ttfts, 50)
+                stats["ttft_p95"] = _percentile(ttfts, 95)
+            summary[key] = stats
+        return summary
+
+
+class PrometheusMetrics:
+    """Aggregates call records into counters rendered in the Prometheus text format."""
+
+    COUNTERS = {
+        "calls_total": "Number of calls",
+        "errors_total": "Number of failed calls",
+        "retries_total": "Number of retried attempts",
+        "cache_hits_total": "Number of calls served from the response cache",
+        "latency_seconds_sum": "Total call latency",
+        "queue_wait_seconds_sum": "Total time spent waiting for the scheduler",
+        "time_to_first_token_seconds_sum": "Total time to first token",
+        "prompt_tokens_total": "Prompt tokens",
+        "completion_tokens_total": "Completion tokens",
+        "cached_tokens_total": "Cached prompt tokens",
+    }
+
+    def __init__(self, namespace: str = "dynamic_sketchpad"):
+        self.namespace = namespace
+        self._values = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def record(self, record: CallRecord) -> None:
+        with self._lock:
+            values = self._values[(record.operation, record.model)]
+            values["calls_total"] += 1
+            values["errors_total"] += record.error is not None
+            values["retries_total"] += record.retries
+            values["cache_hits_total"] += record.cache_hit
+            values["latency_seconds_sum"] += record.latency
+            values["queue_wait_seconds_sum"] += record.queue_wait
+            values["time_to_first_token_seconds_sum"] += record.time_to_first_token or 0
+            values["prompt_tokens_total"] += record.prompt_tokens
+            values["completion_tokens_total"] += record.completion_tokens
+            values["cached_tokens_total"] += record.cached_tokens
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, description in self.COUNTERS.items():
+                metric = f"{self.namespace}_{name}"
+                lines.append(f"# HELP {metric} {description}")
+                lines.append(f"# TYPE {metric} counter")
+                for (operation, model), values in sorted(self._values.items()):
+                    labels = f'operation="{operation}",model="{model}"'
+                    lines.append(f"{metric}{{{labels}}} {values[name]}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+        """Serves the metrics at /metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
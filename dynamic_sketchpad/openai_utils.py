@@ -1,43 +1,172 @@
-from io import BytesIO
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
 from IPython.display import Image as IPythonImage
 from IPython.display import Markdown, display
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from openai.types.beta.threads import Message, MessageContent
-from PIL import Image
+
+from dynamic_sketchpad.file_cache import get_file_cache
+from dynamic_sketchpad.lazy_image import LazyImage
+
+MAX_FETCH_CONCURRENCY = 8
 
 
 def get_strings_from_message(message: Message) -> list[str]:
     return [content.text.value for content in message.content if content.type == "text"]
 
 
-def get_image_bytes_from_message(client: OpenAI, message: Message) -> list[bytes]:
+def get_image_file_ids(message: Message) -> list[str]:
     return [
-        to_image(client, content)
+        content.image_file.file_id
         for content in message.content
         if content.type == "image_file"
     ]
 
 
+def get_image_bytes_from_message(
+    client: OpenAI, message: Message, max_workers: int = MAX_FETCH_CONCURRENCY
+) -> list[bytes]:
+    return fetch_file_contents(client, get_image_file_ids(message), max_workers)
+
+
+def get_image_bytes_from_messages(
+    client: OpenAI, messages: list[Message], max_workers: int = MAX_FETCH_CONCURRENCY
+) -> list[list[bytes]]:
+    file_ids = [get_image_file_ids(message) for message in messages]
+    contents = iter(
+        fetch_file_contents(client, list(chain.from_iterable(file_ids)), max_workers)
+    )
+    return [[next(contents) for _ in message_file_ids] for message_file_ids in file_ids]
+
+
+def to_lazy_images(message: Message, all_image_bytes: list[bytes]) -> list[LazyImage]:
+    return [
+        LazyImage(image_bytes, file_id=file_id)
+        for file_id, image_bytes in zip(get_image_file_ids(message), all_image_bytes)
+    ]
+
+
 def to_image(client: OpenAI, message_content: MessageContent) -> bytes:
     if message_content.type != "image_file":
         raise ValueError("Message content must be an image file.")
 
-    file_id = message_content.image_file.file_id
-    image_data = client.files.content(file_id)
-    image_data_bytes = image_data.read()
-    return image_data_bytes
+    return get_file_content(client, message_content.image_file.file_id)
+
+
+def get_file_content(client: OpenAI, file_id: str) -> bytes:
+    return get_file_cache().get_or_fetch(
+        file_id, lambda: client.files.content(file_id).read()
+    )
+
+
+def fetch_file_contents(
+    client: OpenAI, file_ids: list[str], max_workers: int = MAX_FETCH_CONCURRENCY
+) -> list[bytes]:
+    if len(file_ids) <= 1:
+        return [get_file_content(client, file_id) for file_id in file_ids]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_ids))) as executor:
+        return list(
+            executor.map(lambda file_id: get_file_content(client, file_id), file_ids)
+        )
+
+
+async def async_get_image_bytes_from_message(
+    client: AsyncOpenAI,
+    message: Message,
+    max_concurrency: int = MAX_FETCH_CONCURRENCY,
+) -> list[bytes]:
+    return await async_fetch_file_contents(
+        client, get_image_file_ids(message), max_concurrency
+    )
+
+
+async def async_get_image_bytes_from_messages(
+    client: AsyncOpenAI,
+    messages: list[Message],
+    max_concurrency: int = MAX_FETCH_CONCURRENCY,
+) -> list[list[bytes]]:
+    file_ids = [get_image_file_ids(message) for message in messages]
+    contents = iter(
+        await async_fetch_file_contents(
+            client, list(chain.from_iterable(file_ids)), max_concurrency
+        )
+    )
+    return [[next(contents) for _ in message_file_ids] for message_file_ids in file_ids]
+
+
+async def async_to_image(client: AsyncOpenAI, message_content: MessageContent) -> bytes:
+    if message_content.type != "image_file":
+        raise ValueError("Message content must be an image file.")
+
+    return await async_get_file_content(client, message_content.image_file.file_id)
+
+
+async def async_get_file_content(client: AsyncOpenAI, file_id: str) -> bytes:
+    async def fetch() -> bytes:
+        image_data = await client.files.content(file_id)
+        return await image_data.aread()
+
+    return await get_file_cache().async_get_or_fetch(file_id, fetch)
+
+
+async def async_fetch_file_contents(
+    client: AsyncOpenAI,
+    file_ids: list[str],
+    max_concurrency: int = MAX_FETCH_CONCURRENCY,
+) -> list[bytes]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(file_id: str) -> bytes:
+        async with semaphore:
+            return await async_get_file_content(client, file_id)
+
+    return await asyncio.gather(*[fetch(file_id) for file_id in file_ids])
 
 
 def process_message(client: OpenAI, message: Message) -> list[str | bytes]:
-    message_contents = []
-    for content in message.content:
-        if content.type == "image_file":
-            message_contents.append(to_image(client, content))
-        else:
-            message_contents.append(content.text.value)
+    return process_messages(client, [message])
 
-    return message_contents
+
+def process_messages(
+    client: OpenAI, messages: list[Message], max_workers: int = MAX_FETCH_CONCURRENCY
+) -> list[str | bytes]:
+    # Images are prefetched together so they download concurrently
+    images = iter(
+        chain.from_iterable(
+            get_image_bytes_from_messages(client, messages, max_workers)
+        )
+    )
+    return [
+        next(images) if content.type == "image_file" else content.text.value
+        for message in messages
+        for content in message.content
+    ]
+
+
+async def async_process_message(
+    client: AsyncOpenAI, message: Message
+) -> list[str | bytes]:
+    return await async_process_messages(client, [message])
+
+
+async def async_process_messages(
+    client: AsyncOpenAI,
+    messages: list[Message],
+    max_concurrency: int = MAX_FETCH_CONCURRENCY,
+) -> list[str | bytes]:
+    images = iter(
+        chain.from_iterable(
+            await async_get_image_bytes_from_messages(client, messages, max_concurrency)
+        )
+    )
+    return [
+        next(images) if content.type == "image_file" else content.text.value
+        for message in messages
+        for content in message.content
+    ]
 
 
 def display_message(
@@ -45,17 +174,13 @@ def display_message(
 ) -> None:
     for content in message.content:
         if content.type == "image_file":
-            image_bytes = to_image(client, content)
-            img = Image.open(BytesIO(image_bytes))
+            image = LazyImage(to_image(client, content))
             if interactive:
-                width, height = img.size
-                img.thumbnail((width // 2, height // 2))  # Resize image
-                resized_bytes = BytesIO()
-                img.save(resized_bytes, format="PNG")
-                resized_bytes.seek(0)
-                display(IPythonImage(data=resized_bytes.getvalue()))
+                width, height = image.size
+                resized_bytes = image.thumbnail_bytes((width // 2, height // 2))
+                display(IPythonImage(data=resized_bytes))
             else:
-                img.show()
+                image.open().show()
         else:
             if interactive:
                 display(Markdown(content.text.value))
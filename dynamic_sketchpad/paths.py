@@ -0,0 +1,8 @@
+import os
+from pathlib import Path
+
+CACHE_DIR = Path(
+    os.getenv(
+        "DYNAMIC_SKETCHPAD_CACHE_DIR", Path.home() / ".cache" / "dynamic_sketchpad"
+    )
+)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from openai import NotFoundError, OpenAI
+from openai.types.beta import Assistant as OpenAIAssistant
+
+from dynamic_sketchpad.paths import CACHE_DIR
+
+REGISTRY_METADATA_KEY = "registry_key"
+
+
+def assistant_key(
+    instructions: str,
+    model: str,
+    tools: list[dict],
+    temperature: float | None = None,
+    name: str | None = None,
+) -> str:
+    payload = json.dumps(
+        {
+            "instructions": instructions,
+            "model": model,
+            "tools": tools,
+            "temperature": temperature,
+            "name": name,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def account_key(client: OpenAI, key: str) -> str:
+    """
+    Scopes a registry key to the account and endpoint of the client, since an
+    assistant id is only valid where it was created. The API key is hashed so it
+    never reaches the on-disk index.
+    """
+    api_key_fingerprint = hashlib.sha256(client.api_key.encode()).hexdigest()[:16]
+    return f"{api_key_fingerprint}@{client.base_url}:{key}"
+
+
+def is_missing_assistant(error: NotFoundError, assistant_id: str) -> bool:
+    """Whether a 404 is about the assistant rather than the thread or run."""
+    return assistant_id in error.message
+
+
+class AssistantRegistry:
+    """
+    Reuses remote assistants with identical configuration instead of creating a new
+    one per construction. Assistants are found in a local on-disk index first, then
+    by their registry key in the remote assistant metadata, and only created if
+    neither has a match. Index entries are scoped to the API key and base URL.
+
+    Resolved assistants are kept for the life of the process and indexed ones are
+    trusted without a round trip; a caller that finds its assistant deleted, such
+    as on a 404 from runs.create, calls replace to forget and recreate it.
+    """
+
+    def __init__(self, path: Path = CACHE_DIR / "assistants.json"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._resolved: dict[str, OpenAIAssistant] = {}
+        self._configs: dict[str, dict] = {}
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            return json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, index: dict[str, dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(index, indent=2))
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> OpenAIAssistant | None:
+        with self._lock:
+            entry = self._load().get(key)
+        return OpenAIAssistant.model_validate(entry) if entry is not None else None
+
+    def put(self, key: str, assistant: OpenAIAssistant) -> None:
+        with self._lock:
+            index = self._load()
+            index[key] = assistant.model_dump(mode="json")
+            self._save(index)
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            index = self._load()
+            if index.pop(key, None) is not None:
+                self._save(index)
+
+    def lookup(self, client: OpenAI, key: str) -> OpenAIAssistant | None:
+        for assistant in client.beta.assistants.list(limit=100):
+            if (assistant.metadata or {}).get(REGISTRY_METADATA_KEY) == key:
+                return assistant
+        return None
+
+    def get_or_create(
+        self,
+        client: OpenAI,
+        instructions: str,
+        model: str,
+        tools: list[dict],
+        temperature: float | None = None,
+        name: str | None = None,
+    ) -> OpenAIAssistant:
+        key = assistant_key(instructions, model, tools, temperature, name)
+        index_key = account_key(client, key)
+        with self._lock:
+            if index_key in self._resolved:
+                return self._resolved[index_key]
+
+        assistant = self.get(index_key)
+        if assistant is None:
+            assistant = self.lookup(client, key)
+            if assistant is None:
+                optional_params = {"temperature": temperature, "name": name}
+                assistant = client.beta.assistants.create(
+                    instructions=instructions,
+                    model=model,
+                    tools=tools,
+                    metadata={REGISTRY_METADATA_KEY: key},
+                    **{k: v for k, v in optional_params.items() if v is not None},
+                )
+            self.put(index_key, assistant)
+        with self._lock:
+            self._resolved[index_key] = assistant
+            self._configs[index_key] = dict(
+                instructions=instructions,
+                model=model,
+                tools=tools,
+                temperature=temperature,
+                name=name,
+            )
+        return assistant
+
+    def replace(self, client: OpenAI, stale: OpenAIAssistant) -> OpenAIAssistant | None:
+        """
+        Forgets an assistant that no longer exists and resolves its configuration
+        again, or returns None if it was not resolved through this registry.
+        """
+        with self._lock:
+            index_keys = [
+                index_key
+                for index_key, assistant in self._resolved.items()
+                if assistant.id == stale.id
+            ]
+            for index_key in index_keys:
+                del self._resolved[index_key]
+        if not index_keys:
+            return None
+        for index_key in index_keys:
+            self.forget(index_key)
+        return self.get_or_create(client, **self._configs[index_keys[0]])
+
+
+_registry = AssistantRegistry()
+
+
+def get_registry() -> AssistantRegistry:
+    return _registry
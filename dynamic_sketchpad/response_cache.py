@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel
+
+from dynamic_sketchpad.paths import CACHE_DIR
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def canonical_key(**request) -> str:
+    def default(value):
+        if isinstance(value, type) and issubclass(value, BaseModel):
+            return value.model_json_schema()
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json")
+        return str(value)
+
+    payload = json.dumps(request, sort_keys=True, default=default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of API responses keyed by a canonical request hash.
+
+    Entries expire after ttl seconds and the least recently used entries are evicted
+    beyond max_entries. Identical requests that are in flight at the same time are
+    coalesced so only one of them reaches the API.
+    """
+
+    def __init__(
+        self,
+        path: Path = CACHE_DIR / "responses.sqlite",
+        ttl: float | None = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+            "ON responses (accessed_at)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+        self._in_flight: dict[tuple[int, str], asyncio.Future] = {}
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._connection.commit()
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC, rowid DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._connection.commit()
+
+    def get_many(self, keys: list[str]) -> list[str | None]:
+        return [self.get(key) for key in keys]
+
+    def put_many(self, values: dict[str, str]) -> None:
+        for key, value in values.items():
+            self.put(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    async def get_or_create(
+        self,
+        key: str,
+        create: Callable[[], Awaitable[ResponseT]],
+        response_type: type[ResponseT],
+    ) -> ResponseT:
+        # SQLite is queried in a worker thread so a slow disk never stalls the loop.
+        # Futures belong to a loop, so in-flight requests are only shared per loop.
+        flight_key = (id(asyncio.get_running_loop()), key)
+        while True:
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                return response_type.model_validate_json(cached)
+
+            leader = self._in_flight.get(flight_key)
+            if leader is None:
+                return await self._create(flight_key, key, create)
+            try:
+                return await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                # Only the leader was cancelled, so this caller makes the request
+                if not leader.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+    async def _create(
+        self,
+        flight_key: tuple[int, str],
+        key: str,
+        create: Callable[[], Awaitable[ResponseT]],
+    ) -> ResponseT:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[flight_key] = future
+        try:
+            try:
+                response = await create()
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Mark the exception as retrieved when no other caller is waiting on it
+                future.exception()
+                raise
+            future.set_result(response)
+            # Still in flight until stored, so an identical request cannot slip
+            # between the cache and the in-flight table
+            await asyncio.to_thread(self.put, key, response.model_dump_json())
+            return response
+        finally:
+            del self._in_flight[flight_key]
@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import random
+import time
+from typing import AsyncIterator, Callable, Iterator
+
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+from openai.types import Batch
+from openai.types.beta.threads import Run
+
+from dynamic_sketchpad.clients import get_async_client
+
+TERMINAL_RUN_STATUSES = {
+    "completed",
+    "incomplete",
+    "failed",
+    "cancelled",
+    "expired",
+    "requires_action",
+}
+TRANSIENT_ERRORS = (APIConnectionError, InternalServerError, RateLimitError)
+# Matches the retry bound used for other API calls
+MAX_POLL_FAILURES = 6
+
+
+class PollSchedule:
+    """
+    Adaptive, jittered poll interval for one run.
+
+    The interval grows geometrically while the run status stays the same and resets
+    whenever it changes, so active runs are checked often and long runs cheaply.
+    """
+
+    def __init__(
+        self,
+        initial_interval: float = 0.5,
+        max_interval: float = 8.0,
+        backoff: float = 1.5,
+        jitter: float = 0.25,
+    ):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.interval = initial_interval
+        self.status: str | None = None
+
+    def next_delay(self, status: str | None) -> float:
+        if status != self.status:
+            self.status = status
+            self.interval = self.initial_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class PollFailures:
+    """
+    Counts consecutive failed polls per run or batch. Transient errors are retried
+    on the next poll, but after max_failures in a row the last error is raised
+    instead of polling a broken endpoint forever.
+    """
+
+    def __init__(self, max_failures: int = MAX_POLL_FAILURES):
+        self.max_failures = max_failures
+        self._failures: dict[str, int] = {}
+
+    def record(self, polled: Run | Batch, error: Exception) -> None:
+        failures = self._failures.get(polled.id, 0) + 1
+        if failures >= self.max_failures:
+            self._failures.pop(polled.id, None)
+            raise error
+        self._failures[polled.id] = failures
+        print(
+            f"WARNING: Failed to poll {polled.object} {polled.id}, retrying. {error=}"
+        )
+
+    def reset(self, polled: Run | Batch) -> None:
+        self._failures.pop(polled.id, None)
+
+
+class RunTracker:
+    """Watches many runs together and yields each one as soon as it finishes."""
+
+    def __init__(
+        self,
+        client: OpenAI,
+        max_poll_failures: int = MAX_POLL_FAILURES,
+        **poll_schedule_kwargs,
+    ):
+        self.client = client
+        self.failures = PollFailures(max_poll_failures)
+        self.poll_schedule_kwargs = poll_schedule_kwargs
+
+    def _retrieve(self, run: Run) -> Run:
+        try:
+            retrieved = self.client.beta.threads.runs.retrieve(
+                run.id, thread_id=run.thread_id
+            )
+        except TRANSIENT_ERRORS as e:
+            self.failures.record(run, e)
+            return run
+        self.failures.reset(run)
+        return retrieved
+
+    def as_completed(
+        self,
+        runs: list[Run],
+        submit: Callable[[bool], list[Run] | None] | None = None,
+    ) -> Iterator[tuple[int, Run]]:
+        """
+        Yields (index, run) pairs as runs finish. With submit, more runs are started
+        while the others are polled: submit(block) returns the newly started runs,
+        indexed after the earlier ones, or None once there is nothing left to start.
+        It is called with block=True only when no run is pending, so it may wait
+        for capacity without stalling the runs that would free it.
+        """
+        schedules = {}
+        # Heap of (next poll time, index, run) so the most overdue run is polled first
+        pending = []
+        started = 0
+
+        def track(new_runs: list[Run]) -> list[tuple[int, Run]]:
+            nonlocal started
+            finished = []
+            for run in new_runs:
+                index, started = started, started + 1
+                if run.status in TERMINAL_RUN_STATUSES:
+                    finished.append((index, run))
+                    continue
+                schedules[index] = PollSchedule(**self.poll_schedule_kwargs)
+                delay = schedules[index].next_delay(run.status)
+                heapq.heappush(pending, (time.monotonic() + delay, index, run))
+            return finished
+
+        yield from track(runs)
+        while True:
+            if submit is not None:
+                new_runs = submit(not pending)
+                if new_runs is None:
+                    submit = None
+                else:
+                    yield from track(new_runs)
+            if not pending:
+                if submit is None:
+                    return
+                continue
+
+            poll_at, index, run = heapq.heappop(pending)
+            time.sleep(max(0.0, poll_at - time.monotonic()))
+            run = self._retrieve(run)
+            if run.status in TERMINAL_RUN_STATUSES:
+                yield index, run
+            else:
+                delay = schedules[index].next_delay(run.status)
+                heapq.heappush(pending, (time.monotonic() + delay, index, run))
+
+    def wait(self, run: Run) -> Run:
+        for _, run in self.as_completed([run]):
+            return run
+
+
+class AsyncRunTracker:
+    """
+    Waits for runs with adaptive polling. Without a client, the shared client of
+    the running loop is used.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        max_poll_failures: int = MAX_POLL_FAILURES,
+        **poll_schedule_kwargs,
+    ):
+        self.client = client
+        self.failures = PollFailures(max_poll_failures)
+        self.poll_schedule_kwargs = poll_schedule_kwargs
+
+    async def _retrieve(self, run: Run) -> Run:
+        try:
+            client = self.client or get_async_client()
+            retrieved = await client.beta.threads.runs.retrieve(
+                run.id, thread_id=run.thread_id
+            )
+        except TRANSIENT_ERRORS as e:
+            self.failures.record(run, e)
+            return run
+        self.failures.reset(run)
+        return retrieved
+
+    async def wait(self, run: Run) -> Run:
+        schedule = PollSchedule(**self.poll_schedule_kwargs)
+        while run.status not in TERMINAL_RUN_STATUSES:
+            await asyncio.sleep(schedule.next_delay(run.status))
+            run = await self._retrieve(run)
+        return run
+
+    async def as_completed(self, runs: list[Run]) -> AsyncIterator[tuple[int, Run]]:
+        async def wait(index: int, run: Run) -> tuple[int, Run]:
+            return index, await self.wait(run)
+
+        tasks = [
+            asyncio.create_task(wait(index, run)) for index, run in enumerate(runs)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,252 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Mapping
+
+from dynamic_sketchpad.limiter import AdaptiveConcurrencyLimiter
+from dynamic_sketchpad.tokens import context_window
+
+RATE_WINDOW_SECONDS = 60.0
+INITIAL_IN_FLIGHT = 8
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    requests_per_minute: int = 500
+    tokens_per_minute: int = 30_000
+    max_in_flight: int = 32
+
+
+class Reservation:
+    def __init__(self, timestamp: float, tokens: int):
+        self.timestamp = timestamp
+        self.tokens = tokens
+        self.used_tokens: int | None = None
+        self.queue_wait = 0.0
+
+
+def wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ModelBudget:
+    """
+    Sliding-window RPM/TPM budget with a bounded in-flight window for one model.
+
+    Accounting is guarded by a threading lock rather than asyncio primitives so the
+    same budget can be shared by sync callers, threads and separate event loops.
+    """
+
+    def __init__(self, limits: RateLimits):
+        self.limits = limits
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=INITIAL_IN_FLIGHT,
+            max_limit=limits.max_in_flight,
+        )
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        # Callers waiting for a free slot: sync ones on the condition, async ones on
+        # a future of their own loop, woken thread-safely
+        self._released = threading.Condition(self._lock)
+        self._async_waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = (
+            set()
+        )
+        self._window: deque[Reservation] = deque()
+        self._window_tokens = 0
+
+    def configure(self, limits: RateLimits) -> None:
+        """
+        Changes the limits in place, so reservations made under the old limits are
+        still released into this budget.
+        """
+        with self._lock:
+            self.limits = limits
+            self.limiter.set_max_limit(limits.max_in_flight)
+            self._notify_waiters()
+
+    def _expire(self, now: float) -> None:
+        while self._window and now - self._window[0].timestamp >= RATE_WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft().tokens
+
+    def _token_delay(self, tokens: int, now: float) -> float:
+        excess = self._window_tokens + tokens - self.limits.tokens_per_minute
+        if excess <= 0:
+            return 0.0
+        for reservation in self._window:
+            excess -= reservation.tokens
+            if excess <= 0:
+                return reservation.timestamp + RATE_WINDOW_SECONDS - now
+        return 0.0
+
+    def _try_acquire(self, tokens: int) -> Reservation | float:
+        # A request larger than the whole TPM budget is admitted once the window is
+        # empty instead of waiting forever
+        tokens = min(tokens, self.limits.tokens_per_minute)
+        pause = self.limiter.pause_remaining()
+        if pause > 0:
+            return pause
+        if self.in_flight >= self.limiter.max_in_flight:
+            return math.inf
+
+        now = time.monotonic()
+        self._expire(now)
+        delay = 0.0
+        if len(self._window) >= self.limits.requests_per_minute:
+            delay = self._window[0].timestamp + RATE_WINDOW_SECONDS - now
+        delay = max(delay, self._token_delay(tokens, now))
+        if delay > 0:
+            return delay
+
+        reservation = Reservation(now, tokens)
+        self._window.append(reservation)
+        self._window_tokens += tokens
+        self.in_flight += 1
+        return reservation
+
+    def try_acquire(self, tokens: int) -> Reservation | float:
+        """
+        Returns a reservation, or the number of seconds to wait before retrying,
+        which is infinite while the in-flight window is full until a release.
+        """
+        with self._lock:
+            return self._try_acquire(tokens)
+
+    def acquire_sync(self, tokens: int) -> Reservation:
+        with self._released:
+            while not isinstance(reservation := self._try_acquire(tokens), Reservation):
+                self._released.wait(None if math.isinf(reservation) else reservation)
+            return reservation
+
+    async def acquire(self, tokens: int) -> Reservation:
+        loop = asyncio.get_running_loop()
+        while True:
+            # The waiter is registered under the lock, so a release between the
+            # failed attempt and the wait still wakes it
+            with self._lock:
+                reservation = self._try_acquire(tokens)
+                if isinstance(reservation, Reservation):
+                    return reservation
+                waiter = loop.create_future()
+                self._async_waiters.add((loop, waiter))
+            try:
+                timeout = None if math.isinf(reservation) else reservation
+                await asyncio.wait([waiter], timeout=timeout)
+            finally:
+                with self._lock:
+                    self._async_waiters.discard((loop, waiter))
+
+    def _notify_waiters(self) -> None:
+        self._released.notify_all()
+        for loop, waiter in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(wake, waiter)
+            except RuntimeError:
+                # The waiting loop has already been closed
+                pass
+        self._async_waiters.clear()
+
+    def release(self, reservation: Reservation, used_tokens: int | None = None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if used_tokens is not None and reservation in self._window:
+                self._window_tokens += used_tokens - reservation.tokens
+                reservation.tokens = used_tokens
+            self._notify_waiters()
+
+
+class RequestScheduler:
+    """Process-wide admission control for OpenAI requests, budgeted per model."""
+
+    def __init__(self, default_limits: RateLimits = RateLimits()):
+        self.default_limits = default_limits
+        self._budgets: dict[str, ModelBudget] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, model: str, limits: RateLimits) -> None:
+        with self._lock:
+            if model in self._budgets:
+                self._budgets[model].configure(limits)
+            else:
+                self._budgets[model] = ModelBudget(limits)
+
+    def budget(self, model: str) -> ModelBudget:
+        with self._lock:
+            if model not in self._budgets:
+                self._budgets[model] = ModelBudget(self.default_limits)
+            return self._budgets[model]
+
+    def max_request_tokens(self, model: str) -> int:
+        """
+        The largest request the model accepts. The TPM budget only delays
+        requests, a request larger than it is admitted once the window is empty.
+        """
+        return context_window(model)
+
+    async def acquire(self, model: str, tokens: int) -> Reservation:
+        start = time.monotonic()
+        reservation = await self.budget(model).acquire(tokens)
+        reservation.queue_wait = time.monotonic() - start
+        return reservation
+
+    def acquire_sync(self, model: str, tokens: int) -> Reservation:
+        start = time.monotonic()
+        reservation = self.budget(model).acquire_sync(tokens)
+        reservation.queue_wait = time.monotonic() - start
+        return reservation
+
+    def release(
+        self, model: str, reservation: Reservation, used_tokens: int | None = None
+    ) -> None:
+        self.budget(model).release(reservation, used_tokens)
+
+    def observe_response(self, model: str, headers: Mapping[str, str]) -> None:
+        self.budget(model).limiter.on_success(headers)
+
+    def observe_error(
+        self, model: str, status_code: int, headers: Mapping[str, str]
+    ) -> None:
+        self.budget(model).limiter.on_error(status_code, headers)
+
+    @asynccontextmanager
+    async def slot(self, model: str, tokens: int):
+        reservation = await self.acquire(model, tokens)
+        try:
+            yield reservation
+        finally:
+            self.release(model, reservation, reservation.used_tokens)
+
+    @contextmanager
+    def sync_slot(self, model: str, tokens: int):
+        reservation = self.acquire_sync(model, tokens)
+        try:
+            yield reservation
+        finally:
+            self.release(model, reservation, reservation.used_tokens)
+
+
+_scheduler = RequestScheduler()
+
+
+def get_scheduler() -> RequestScheduler:
+    return _scheduler
+
+
+def configure_rate_limits(
+    model: str,
+    requests_per_minute: int = RateLimits.requests_per_minute,
+    tokens_per_minute: int = RateLimits.tokens_per_minute,
+    max_in_flight: int = RateLimits.max_in_flight,
+) -> None:
+    _scheduler.configure(
+        model,
+        RateLimits(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_in_flight=max_in_flight,
+        ),
+    )
@@ -0,0 +1,478 @@
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from pathlib import Path
+from typing import Callable
+
+import httpx
+
+RECORDED_HEADERS = {"content-type"}
+RATE_WINDOW_SECONDS = 60.0
+EVENT_STREAM = "text/event-stream"
+THREAD_PATH = re.compile(r"^/v1/threads/([^/?]+)")
+
+
+@dataclass
+class StandInRequest:
+    method: str
+    path: str
+    headers: dict[str, str]
+    body: bytes
+
+    @property
+    def body_hash(self) -> str | None:
+        """
+        Canonical hash of a JSON body. Other bodies (multipart uploads) have random
+        boundaries and are not hashed.
+        """
+        if not self.headers.get("content-type", "").startswith("application/json"):
+            return None
+        canonical = json.dumps(json.loads(self.body or b"null"), sort_keys=True)
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    @property
+    def key(self) -> str:
+        """Identifies equivalent requests across sessions."""
+        return self.keyed_path(self.path)
+
+    def keyed_path(self, path: str) -> str:
+        parts = [self.method, path]
+        if self.body_hash is not None:
+            parts.append(self.body_hash)
+        return " ".join(parts)
+
+    @property
+    def route(self) -> str:
+        return self.path.split("?")[0]
+
+    @property
+    def thread_id(self) -> str | None:
+        match = THREAD_PATH.match(self.path)
+        return match[1] if match is not None and match[1] != "runs" else None
+
+    @property
+    def creates_thread(self) -> bool:
+        return self.method == "POST" and self.route == "/v1/threads"
+
+    @property
+    def thread_identity(self) -> str | None:
+        """
+        What distinguishes the thread this request creates or first writes to: its
+        initial messages, or the first message posted to an empty thread.
+        """
+        if self.creates_thread:
+            writes = self.body_hash is not None and self.json() not in (None, {})
+        else:
+            writes = (
+                self.method == "POST"
+                and self.route == f"/v1/threads/{self.thread_id}/messages"
+            )
+        return f"thread-{self.body_hash}" if writes else None
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+
+@dataclass
+class RecordedResponse:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+    @property
+    def is_event_stream(self) -> bool:
+        return self.headers.get("content-type", "").startswith(EVENT_STREAM)
+
+    def to_dict(self) -> dict:
+        try:
+            body, encoding = self.body.decode(), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(self.body).decode(), "base64"
+        return {
+            "status": self.status,
+            "headers": self.headers,
+            "body": body,
+            "body_encoding": encoding,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RecordedResponse":
+        body = data["body"].encode()
+        if data["body_encoding"] == "base64":
+            body = base64.b64decode(body)
+        return cls(data["status"], data["headers"], body)
+
+    @classmethod
+    def json(cls, data, status: int = 200) -> "RecordedResponse":
+        return cls(
+            status, {"content-type": "application/json"}, json.dumps(data).encode()
+        )
+
+    @classmethod
+    def event_stream(cls, events: list[tuple[str | None, str]]) -> "RecordedResponse":
+        lines = []
+        for event, data in events:
+            if event is not None:
+                lines.append(f"event: {event}\n")
+            lines.append(f"data: {data}\n\n")
+        return cls(200, {"content-type": EVENT_STREAM}, "".join(lines).encode())
+
+
+class Cassette:
+    """
+    Recorded responses keyed by request. Repeated requests (such as polling a run)
+    replay their recorded responses in order, and the last one once exhausted.
+
+    Empty threads are all created by the same request, so requests on a thread are
+    keyed by what was first written to it rather than by its ID. Replayed threads
+    get fresh IDs, so concurrent clients may create their threads and post to them
+    in any order. Threads started with the same message are interchangeable and
+    are replayed in the order they were recorded, as are file uploads, whose
+    multipart bodies are not compared.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path is not None else None
+        self.interactions: dict[str, list[RecordedResponse]] = defaultdict(list)
+        # Thread ID -> identity, recorded ones plus the IDs handed out in replay
+        self.threads: dict[str, str] = {}
+        self._cursors: dict[str, int] = defaultdict(int)
+        self._replayed_threads = count()
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            data = json.loads(self.path.read_text())
+            for key, responses in data["interactions"].items():
+                self.interactions[key] = [
+                    RecordedResponse.from_dict(response) for response in responses
+                ]
+            self.threads.update(data.get("threads", {}))
+
+    def key(self, request: StandInRequest) -> str:
+        """The request key, with the thread ID replaced by the thread's identity."""
+        thread_id = request.thread_id
+        if thread_id is None:
+            return request.key
+        with self._lock:
+            identity = self.threads.get(thread_id)
+            if identity is None:
+                identity = request.thread_identity
+                if identity is None:
+                    return request.key
+                self.threads[thread_id] = identity
+        return request.keyed_path(request.path.replace(thread_id, identity, 1))
+
+    def record_thread(
+        self, request: StandInRequest, response: RecordedResponse
+    ) -> None:
+        if request.creates_thread and response.status == 200:
+            identity = request.thread_identity
+            if identity is not None:
+                with self._lock:
+                    self.threads[json.loads(response.body)["id"]] = identity
+
+    def replay_thread(
+        self, request: StandInRequest, response: RecordedResponse
+    ) -> RecordedResponse:
+        """Gives a replayed thread an ID of its own, bound on its first message."""
+        if not request.creates_thread or response.status != 200:
+            return response
+        thread = json.loads(response.body)
+        thread["id"] = f"thread_standin_{next(self._replayed_threads)}"
+        identity = request.thread_identity
+        if identity is not None:
+            with self._lock:
+                self.threads[thread["id"]] = identity
+        return RecordedResponse.json(thread)
+
+    def record(self, key: str, response: RecordedResponse) -> None:
+        with self._lock:
+            self.interactions[key].append(response)
+
+    def replay(self, key: str) -> RecordedResponse | None:
+        with self._lock:
+            responses = self.interactions.get(key)
+            if not responses:
+                return None
+            index = min(self._cursors[key], len(responses) - 1)
+            self._cursors[key] += 1
+            return responses[index]
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._cursors.clear()
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                "interactions": {
+                    key: [response.to_dict() for response in responses]
+                    for key, responses in self.interactions.items()
+                },
+                "threads": {
+                    thread_id: identity
+                    for thread_id, identity in self.threads.items()
+                    if not thread_id.startswith("thread_standin_")
+                },
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(data, indent=1))
+
+
+@dataclass
+class SyntheticLatency:
+    """Delay before each response and between replayed stream events."""
+
+    response: float = 0.0
+    stream_event: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+    _random: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+
+    def _sample(self, base: float) -> float:
+        if base <= 0:
+            return 0.0
+        return max(0.0, base * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def before_response(self) -> float:
+        return self._sample(self.response)
+
+    def between_events(self) -> float:
+        return self._sample(self.stream_event)
+
+
+class SimulatedRateLimit:
+    """Sliding-window RPM limit answering like the API: headers and 429s."""
+
+    def __init__(self, requests_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self._requests: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def admit(self) -> tuple[bool, dict[str, str]]:
+        with self._lock:
+            now = time.monotonic()
+            while self._requests and now - self._requests[0] >= RATE_WINDOW_SECONDS:
+                self._requests.popleft()
+            admitted = len(self._requests) < self.requests_per_minute
+            if admitted:
+                self._requests.append(now)
+            reset = 0.0
+            if self._requests:
+                reset = self._requests[0] + RATE_WINDOW_SECONDS - now
+            remaining = self.requests_per_minute - len(self._requests)
+
+        reset_ms = max(int(reset * 1000), 1)
+        headers = {
+            "x-ratelimit-limit-requests": str(self.requests_per_minute),
+            "x-ratelimit-remaining-requests": str(remaining),
+            "x-ratelimit-reset-requests": f"{reset_ms}ms",
+        }
+        if not admitted:
+            headers["retry-after-ms"] = str(reset_ms)
+        return admitted, headers
+
+
+class StandInServer:
+    """
+    Local stand-in for the OpenAI API.
+
+    With an upstream URL, requests are forwarded and the responses recorded to the
+    cassette; without one, the cassette is replayed, falling back to the optional
+    fallback handler for requests it has not seen. Point clients at base_url.
+    Streamed responses are buffered while recording and replayed event by event.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        upstream: str | None = None,
+        latency: SyntheticLatency | None = None,
+        requests_per_minute: int | None = None,
+        fallback: Callable[[StandInRequest], RecordedResponse | None] | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/") if upstream is not None else None
+        self.latency = latency or SyntheticLatency()
+        self.rate_limit = (
+            SimulatedRateLimit(requests_per_minute) if requests_per_minute else None
+        )
+        self.fallback = fallback
+        self._upstream_client = httpx.Client(timeout=600) if upstream else None
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._upstream_client is not None:
+            self._upstream_client.close()
+        if self.upstream is not None and self.cassette.path is not None:
+            self.cassette.save()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def respond(self, request: StandInRequest) -> RecordedResponse:
+        if self.upstream is not None:
+            return self._forward(request)
+
+        key = self.cassette.key(request)
+        response = self.cassette.replay(key)
+        if response is not None:
+            return self.cassette.replay_thread(request, response)
+        if self.fallback is not None:
+            response = self.fallback(request)
+        if response is None:
+            return RecordedResponse.json(
+                {"error": {"message": f"No recorded response for {key}"}},
+                status=501,
+            )
+        return response
+
+    def _forward(self, request: StandInRequest) -> RecordedResponse:
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name not in {"host", "content-length", "accept-encoding"}
+        }
+        upstream_response = self._upstream_client.request(
+            request.method,
+            self.upstream + request.path.removeprefix("/v1"),
+            headers=headers,
+            content=request.body,
+        )
+        response = RecordedResponse(
+            upstream_response.status_code,
+            {
+                name: value
+                for name, value in upstream_response.headers.items()
+                if name in RECORDED_HEADERS
+            },
+            upstream_response.content,
+        )
+        self.cassette.record(self.cassette.key(request), response)
+        self.cassette.record_thread(request, response)
+        return response
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("content-length") or 0)
+                request = StandInRequest(
+                    self.command,
+                    self.path,
+                    {name.lower(): value for name, value in self.headers.items()},
+                    self.rfile.read(length),
+                )
+                time.sleep(stand_in.latency.before_response())
+
+                headers = {}
+                if stand_in.rate_limit is not None:
+                    admitted, headers = stand_in.rate_limit.admit()
+                    if not admitted:
+                        self._send(
+                            RecordedResponse.json(
+                                {
+                                    "error": {
+                                        "message": "Rate limit reached",
+                                        "type": "requests",
+                                        "code": "rate_limit_exceeded",
+                                    }
+                                },
+                                status=429,
+                            ),
+                            headers,
+                        )
+                        return
+                self._send(stand_in.respond(request), headers)
+
+            def _send(self, response: RecordedResponse, extra_headers: dict) -> None:
+                self.send_response(response.status)
+                for name, value in {**response.headers, **extra_headers}.items():
+                    self.send_header(name, value)
+                if not response.is_event_stream:
+                    self.send_header("content-length", str(len(response.body)))
+                    self.end_headers()
+                    self.wfile.write(response.body)
+                    return
+
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+                for event in response.body.split(b"\n\n"):
+                    if not event.strip():
+                        continue
+                    self._write_chunk(event + b"\n\n")
+                    time.sleep(stand_in.latency.between_events())
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            do_GET = do_POST = do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Record or replay OpenAI traffic.")
+    parser.add_argument("cassette", type=Path)
+    parser.add_argument(
+        "--record",
+        metavar="UPSTREAM",
+        help="forward to and record from this base URL, e.g. https://api.openai.com/v1",
+    )
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--stream-event-latency", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=None)
+    args = parser.parse_args()
+
+    server = StandInServer(
+        Cassette(args.cassette),
+        upstream=args.record,
+        latency=SyntheticLatency(args.latency, args.stream_event_latency),
+        requests_per_minute=args.requests_per_minute,
+        port=args.port,
+    ).start()
+    print(f"Serving at {server.base_url}, set OPENAI_BASE_URL to use it.")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
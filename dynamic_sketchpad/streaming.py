@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Iterator
+
+from openai.types.beta import AssistantStreamEvent
+from openai.types.beta.threads import Run
+
+from dynamic_sketchpad.lazy_image import LazyImage
+
+RUN_TERMINAL_EVENTS = {
+    "thread.run.completed",
+    "thread.run.incomplete",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.requires_action",
+}
+
+
+@dataclass
+class TextDelta:
+    text: str
+
+
+@dataclass
+class CodeDelta:
+    code: str
+
+
+@dataclass
+class ImageReady:
+    file_id: str
+    image: LazyImage | None = None
+
+
+@dataclass
+class RunFinished:
+    run: Run
+
+
+StreamEvent = TextDelta | CodeDelta | ImageReady | RunFinished
+
+
+def parse_stream_event(event: AssistantStreamEvent) -> Iterator[StreamEvent]:
+    """Converts a raw assistant stream event into zero or more stream events."""
+    match event.event:
+        case "thread.message.delta":
+            for content in event.data.delta.content or []:
+                if content.type == "text" and content.text and content.text.value:
+                    yield TextDelta(content.text.value)
+                elif content.type == "image_file" and content.image_file:
+                    yield ImageReady(content.image_file.file_id)
+        case "thread.run.step.delta":
+            step_details = event.data.delta.step_details
+            if step_details is None or step_details.type != "tool_calls":
+                return
+            for tool_call in step_details.tool_calls or []:
+                if tool_call.type == "code_interpreter" and tool_call.code_interpreter:
+                    if tool_call.code_interpreter.input:
+                        yield CodeDelta(tool_call.code_interpreter.input)
+        case event_type if event_type in RUN_TERMINAL_EVENTS:
+            yield RunFinished(event.data)
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from openai import InternalServerError, OpenAI
+from openai.types.beta import Assistant as OpenAIAssistant
+
+from dynamic_sketchpad.assistant import Assistant, run_request_tokens
+from dynamic_sketchpad.conftest import AssistantsAPI, async_assistant, sse
+from dynamic_sketchpad.metrics import InMemoryMetrics, add_sink, remove_sink
+from dynamic_sketchpad.streaming import RunFinished, TextDelta
+from dynamic_sketchpad.tokens import estimate_request_tokens
+
+
+def make_assistant(instructions: str, tools: list[dict]) -> OpenAIAssistant:
+    return OpenAIAssistant.model_validate(
+        dict(
+            id="asst",
+            object="assistant",
+            created_at=0,
+            model="gpt-4o",
+            instructions=instructions,
+            tools=tools,
+        )
+    )
+
+
+def test_run_request_tokens_counts_instructions_and_tools():
+    prompt = "Is this graph connected?"
+    bare = make_assistant("", [])
+    instructed = make_assistant("Draw the graph before answering. " * 50, [])
+    with_tools = make_assistant(
+        instructed.instructions,
+        [
+            {
+                "type": "function",
+                "function": {
+                    "name": "draw_graph",
+                    "description": "Draws a graph from its edge list.",
+                    "parameters": {"type": "object", "properties": {}},
+                },
+            }
+        ],
+    )
+
+    prompt_only = estimate_request_tokens(
+        [{"role": "user", "content": prompt}], "gpt-4o"
+    )
+    assert run_request_tokens(bare, prompt) > prompt_only
+    assert run_request_tokens(instructed, prompt) > prompt_only + 200
+    assert run_request_tokens(with_tools, prompt) > run_request_tokens(
+        instructed, prompt
+    )
+
+
+RUN = {
+    "id": "run",
+    "object": "thread.run",
+    "created_at": 0,
+    "thread_id": "thread",
+    "assistant_id": "asst",
+    "status": "completed",
+    "model": "gpt-4o",
+    "instructions": "",
+    "tools": [],
+    "parallel_tool_calls": True,
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+
+MESSAGE = {
+    "id": "msg",
+    "object": "thread.message",
+    "created_at": 0,
+    "thread_id": "thread",
+    "role": "assistant",
+    "status": "in_progress",
+    "content": [],
+}
+
+
+def text_delta(text: str) -> str:
+    return sse(
+        "thread.message.delta",
+        {
+            "id": "msg",
+            "object": "thread.message.delta",
+            "delta": {
+                "content": [{"index": 0, "type": "text", "text": {"value": text}}]
+            },
+        },
+    )
+
+
+def streaming_api(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path.endswith("/threads"):
+        return httpx.Response(
+            200, json={"id": "thread", "object": "thread", "created_at": 0}
+        )
+    if path.endswith("/messages"):
+        return httpx.Response(200, json={**MESSAGE, "role": "user"})
+    if path.endswith("/runs"):
+        if json.loads(request.content).get("assistant_id") == "broken":
+            return httpx.Response(500, json={"error": {"message": "down"}})
+        body = (
+            sse("thread.run.created", {**RUN, "status": "queued"})
+            + sse("thread.message.created", MESSAGE)
+            + text_delta("Hello")
+            + text_delta(" world")
+            + sse("thread.run.completed", RUN)
+            + "event: done\ndata: [DONE]\n\n"
+        )
+        return httpx.Response(
+            200, text=body, headers={"content-type": "text/event-stream"}
+        )
+    return httpx.Response(404)
+
+
+@pytest.fixture
+def records():
+    metrics = InMemoryMetrics()
+    add_sink(metrics)
+    yield metrics.records
+    remove_sink(metrics)
+
+
+def streaming_assistant(assistant_id: str = "asst") -> Assistant:
+    # Built without the registry so no assistant is looked up or created
+    assistant = Assistant.__new__(Assistant)
+    assistant.client = OpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(streaming_api)),
+    )
+    assistant.assistant = make_assistant("", []).model_copy(update={"id": assistant_id})
+    return assistant
+
+
+def test_stream_records_a_finished_call(records):
+    events = list(streaming_assistant().stream("Say hello"))
+
+    assert [event.text for event in events if isinstance(event, TextDelta)] == [
+        "Hello",
+        " world",
+    ]
+    assert isinstance(events[-1], RunFinished)
+    (record,) = records
+    assert record.error is None
+    assert record.prompt_tokens == 10
+    assert record.time_to_first_token is not None
+
+
+def test_stream_closed_early_is_not_an_error(records):
+    stream = streaming_assistant().stream("Say hello")
+    next(stream)
+    stream.close()
+
+    (record,) = records
+    assert record.operation == "assistant.stream"
+    assert record.error is None
+
+
+def test_stream_records_failures(records):
+    with pytest.raises(InternalServerError):
+        list(streaming_assistant("broken").stream("Say hello"))
+
+    (record,) = records
+    assert record.error == "InternalServerError"
+
+
+# Later prompts finish first
+DELAYS = {"slow": 0.3, "medium": 0.2, "fast": 0.1}
+
+
+def test_async_invoke_all_overlaps_runs_and_keeps_input_order():
+    api = AssistantsAPI(delay=lambda prompt, n: DELAYS[prompt])
+    assistant = async_assistant(api)
+
+    start = time.monotonic()
+    results = asyncio.run(assistant.invoke_all("slow", "medium", "fast"))
+    elapsed = time.monotonic() - start
+
+    assert [assistant.messages_to_string(messages) for messages in results] == [
+        "slow!",
+        "medium!",
+        "fast!",
+    ]
+    assert api.peak_active == 3
+    assert elapsed < sum(DELAYS.values())
+
+
+def test_async_invoke_as_completed_yields_in_completion_order():
+    assistant = async_assistant(AssistantsAPI(delay=lambda prompt, n: DELAYS[prompt]))
+
+    async def main():
+        return [
+            (index, assistant.messages_to_string(messages))
+            async for index, messages in assistant.invoke_as_completed(
+                "slow", "medium", "fast"
+            )
+        ]
+
+    assert asyncio.run(main()) == [(2, "fast!"), (1, "medium!"), (0, "slow!")]
@@ -0,0 +1,245 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import DEFAULT_MAX_RETRIES, AsyncOpenAI, InternalServerError
+
+from dynamic_sketchpad.batch import BatchRunner, chunk_lines
+from dynamic_sketchpad.conftest import chat_completion
+from dynamic_sketchpad.llm import LLM
+from dynamic_sketchpad.response_cache import ResponseCache
+
+
+def batch(batch_id: str, status: str, output_file_id: str | None = None) -> dict:
+    return {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": "/v1/chat/completions",
+        "input_file_id": "file-input",
+        "completion_window": "24h",
+        "created_at": 0,
+        "status": status,
+        "output_file_id": output_file_id,
+    }
+
+
+class BatchStandIn:
+    """Minimal stand-in for the files, batches and chat-completion endpoints."""
+
+    def __init__(self, failing_ids: set[str] = frozenset(), failed_polls: int = 0):
+        self.failing_ids = failing_ids
+        self.failed_polls = failed_polls
+        self.uploads: dict[str, list[dict]] = {}
+        self.deleted: list[str] = []
+        self.cancelled: list[str] = []
+        self.live_calls = 0
+
+    @property
+    def requests(self) -> list[dict]:
+        return [request for upload in self.uploads.values() for request in upload]
+
+    def output_lines(self, file_id: str) -> str:
+        lines = []
+        for request in self.uploads[file_id]:
+            custom_id = request["custom_id"]
+            prompt = request["body"]["messages"][-1]["content"]
+            if custom_id in self.failing_ids:
+                response = {"status_code": 500, "body": {}}
+            else:
+                response = {"status_code": 200, "body": chat_completion(f"{prompt}!")}
+            lines.append(json.dumps({"custom_id": custom_id, "response": response}))
+        return "\n".join(lines)
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == "POST" and path.endswith("/files"):
+            file_id = f"file-{len(self.uploads)}"
+            self.uploads[file_id] = [
+                json.loads(line)
+                for line in request.content.decode().splitlines()
+                if line.startswith('{"custom_id"')
+            ]
+            return httpx.Response(
+                200,
+                json={
+                    "id": file_id,
+                    "object": "file",
+                    "bytes": 0,
+                    "created_at": 0,
+                    "filename": "batch.jsonl",
+                    "purpose": "batch",
+                    "status": "processed",
+                },
+            )
+        if request.method == "DELETE" and "/files/" in path:
+            file_id = path.rsplit("/", 1)[-1]
+            self.deleted.append(file_id)
+            return httpx.Response(
+                200, json={"id": file_id, "object": "file", "deleted": True}
+            )
+        if request.method == "POST" and path.endswith("/batches"):
+            input_file_id = json.loads(request.content)["input_file_id"]
+            return httpx.Response(200, json=batch(input_file_id, "in_progress"))
+        if request.method == "POST" and path.endswith("/cancel"):
+            input_file_id = path.split("/")[-2]
+            self.cancelled.append(input_file_id)
+            return httpx.Response(200, json=batch(input_file_id, "cancelling"))
+        if request.method == "GET" and "/batches/" in path:
+            if self.failed_polls:
+                self.failed_polls -= 1
+                return httpx.Response(503, json={"error": {}})
+            input_file_id = path.rsplit("/", 1)[-1]
+            return httpx.Response(
+                200, json=batch(input_file_id, "completed", f"{input_file_id}.out")
+            )
+        if path.endswith(".out/content"):
+            file_id = path.split("/")[-2].removesuffix(".out")
+            return httpx.Response(200, text=self.output_lines(file_id))
+        if path.endswith("/chat/completions"):
+            self.live_calls += 1
+            prompt = json.loads(request.content)["messages"][-1]["content"]
+            return httpx.Response(200, json=chat_completion(f"{prompt}?"))
+        return httpx.Response(404)
+
+
+def stand_in_client(stand_in: BatchStandIn, **kwargs) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key="test",
+        **kwargs,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(stand_in)),
+    )
+
+
+def test_batch_mode_maps_results_to_input_order_and_falls_back(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    stand_in = BatchStandIn(failing_ids={"1"})
+    llm = LLM(default_instructions="Be brief.")
+    llm.client = stand_in_client(stand_in)
+
+    responses = asyncio.run(
+        llm.generate_responses(["a", "b", "c"], batch=True, poll_interval=0)
+    )
+
+    assert responses == ["a!", "b?", "c!"]
+    assert stand_in.live_calls == 1
+    assert stand_in.requests[0]["body"]["messages"][0] == {
+        "role": "system",
+        "content": "Be brief.",
+    }
+    assert stand_in.deleted == ["file-0"]
+
+
+def test_chunk_lines_respects_request_and_byte_limits():
+    lines = ["a" * 9, "b" * 9, "c" * 9, "d" * 29]
+
+    assert chunk_lines(lines, max_requests=2, max_bytes=1000) == [
+        lines[:2],
+        lines[2:],
+    ]
+    assert chunk_lines(lines, max_requests=10, max_bytes=20) == [
+        lines[:2],
+        lines[2:3],
+        lines[3:],
+    ]
+
+
+def test_batch_runner_splits_oversized_batches_and_deletes_inputs():
+    stand_in = BatchStandIn(failing_ids={"3"})
+    runner = BatchRunner(stand_in_client(stand_in), poll_interval=0, max_requests=2)
+    bodies = [
+        {"model": "gpt-4o", "messages": [{"role": "user", "content": prompt}]}
+        for prompt in "abcde"
+    ]
+
+    completions = asyncio.run(runner.run(bodies))
+
+    assert len(stand_in.uploads) == 3
+    assert [
+        completion.choices[0].message.content if completion else None
+        for completion in completions
+    ] == ["a!", "b!", "c!", None, "e!"]
+    assert sorted(stand_in.deleted) == sorted(stand_in.uploads)
+
+
+def test_batch_mode_shares_the_response_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    stand_in = BatchStandIn()
+    llm = LLM(cache=ResponseCache(tmp_path / "responses.sqlite"))
+    llm.client = stand_in_client(stand_in)
+
+    live = asyncio.run(llm.generate_responses(["a"]))
+    batched = asyncio.run(
+        llm.generate_responses(["a", "b"], batch=True, poll_interval=0)
+    )
+    again = asyncio.run(llm.generate_responses(["a", "b"], batch=True, poll_interval=0))
+
+    assert live == ["a?"]
+    assert batched == ["a?", "b!"]
+    assert again == batched
+    assert [
+        request["body"]["messages"][-1]["content"] for request in stand_in.requests
+    ] == ["b"]
+
+
+BODIES = [
+    {"model": "gpt-4o", "messages": [{"role": "user", "content": prompt}]}
+    for prompt in "ab"
+]
+
+
+def test_batch_runner_retries_transient_poll_errors():
+    stand_in = BatchStandIn(failed_polls=2)
+    runner = BatchRunner(
+        stand_in_client(stand_in, max_retries=0), poll_interval=0, max_poll_failures=3
+    )
+
+    completions = asyncio.run(runner.run(BODIES))
+
+    assert [completion.choices[0].message.content for completion in completions] == [
+        "a!",
+        "b!",
+    ]
+    assert stand_in.cancelled == []
+
+
+def test_batch_runner_cancels_the_batch_when_polling_gives_up():
+    stand_in = BatchStandIn(failed_polls=3)
+    runner = BatchRunner(
+        stand_in_client(stand_in, max_retries=0), poll_interval=0, max_poll_failures=3
+    )
+
+    with pytest.raises(InternalServerError):
+        asyncio.run(runner.run(BODIES))
+
+    assert stand_in.cancelled == ["file-0"]
+    assert stand_in.deleted == ["file-0"]
+
+
+def test_batch_runner_cancels_the_batch_when_the_caller_is_cancelled():
+    stand_in = BatchStandIn()
+    runner = BatchRunner(stand_in_client(stand_in), poll_interval=10)
+
+    async def main():
+        task = asyncio.create_task(runner.run(BODIES))
+        while not stand_in.uploads:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+    assert stand_in.cancelled == ["file-0"]
+    assert stand_in.deleted == ["file-0"]
+
+
+def test_batch_mode_keeps_client_retries(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    llm = LLM()
+
+    async def main():
+        return llm.client.max_retries, llm.batch_client.max_retries
+
+    assert asyncio.run(main()) == (0, DEFAULT_MAX_RETRIES)
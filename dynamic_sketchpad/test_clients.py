@@ -0,0 +1,46 @@
+import asyncio
+
+from dynamic_sketchpad.clients import (
+    aclose_async_clients,
+    get_async_client,
+    get_client,
+)
+
+
+def test_sync_clients_are_shared_per_key():
+    client = get_client(api_key="test")
+    assert get_client(api_key="test") is client
+    assert get_client(api_key="other") is not client
+
+    no_retries = get_client(api_key="test", max_retries=0)
+    assert no_retries.max_retries == 0
+    assert no_retries._client is client._client
+
+
+def test_async_clients_are_shared_per_event_loop():
+    async def clients():
+        return get_async_client(api_key="test"), get_async_client(api_key="test")
+
+    first, same = asyncio.run(clients())
+    second, _ = asyncio.run(clients())
+    assert first is same
+    assert second is not first
+
+
+def test_async_clients_are_closed_when_the_loop_shuts_down():
+    async def client():
+        return get_async_client(api_key="test")
+
+    assert asyncio.run(client()).is_closed()
+
+
+def test_async_clients_can_be_closed_explicitly():
+    async def main():
+        client = get_async_client(api_key="test")
+        no_retries = get_async_client(api_key="test", max_retries=0)
+        await aclose_async_clients()
+        return client, no_retries, get_async_client(api_key="test")
+
+    client, no_retries, reopened = asyncio.run(main())
+    assert client.is_closed() and no_retries.is_closed()
+    assert reopened is not client
@@ -0,0 +1,207 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from dynamic_sketchpad.conftest import AssistantsAPI, async_assistant, chat_completion
+from dynamic_sketchpad.dynamic_sketchpad import (
+    LLMHintValidator,
+    generate_and_validate_hint,
+    speculative_generate_and_validate_hint,
+)
+
+
+class FakeSketchpad:
+    """Answers each invoke with a message holding the next hint of the script."""
+
+    def __init__(self, hints: list[str], delays: dict[str, float] | None = None):
+        self.hints = hints
+        self.delays = delays or {}
+        self.invoked = 0
+        self.cancelled: list[str] = []
+
+    def next_hint(self) -> list[SimpleNamespace]:
+        hint = self.hints[self.invoked % len(self.hints)]
+        self.invoked += 1
+        return [SimpleNamespace(text=hint)]
+
+    def invoke(self, prompt: str) -> list[SimpleNamespace]:
+        return self.next_hint()
+
+    def messages_to_string(self, messages: list[SimpleNamespace]) -> str:
+        return "\n".join(message.text for message in messages)
+
+
+class FakeAsyncSketchpad(FakeSketchpad):
+    async def invoke(self, prompt: str) -> list[SimpleNamespace]:
+        messages = self.next_hint()
+        try:
+            await asyncio.sleep(self.delays.get(messages[0].text, 0.0))
+        except asyncio.CancelledError:
+            self.cancelled.append(messages[0].text)
+            raise
+        return messages
+
+
+class FakeValidator:
+    def __init__(self, valid_hints: set[str]):
+        self.valid_hints = valid_hints
+        self.validated: list[str] = []
+
+    def validate_hint(self, hint: str, question: str) -> bool:
+        self.validated.append(hint)
+        return hint in self.valid_hints
+
+
+class FakeAsyncValidator(FakeValidator):
+    async def validate_hint(self, hint: str, question: str) -> bool:
+        return super().validate_hint(hint, question)
+
+
+def test_generate_and_validate_hint_validates_hint_text():
+    sketchpad = FakeSketchpad(["vague", "draw the graph"])
+    validator = FakeValidator({"draw the graph"})
+
+    hint = generate_and_validate_hint("question", sketchpad, validator)
+
+    assert sketchpad.messages_to_string(hint) == "draw the graph"
+    assert validator.validated == ["vague", "draw the graph"]
+
+
+def test_generate_and_validate_hint_gives_up_after_max_attempts():
+    sketchpad = FakeSketchpad(["vague"])
+    validator = FakeValidator(set())
+
+    with pytest.raises(RuntimeError, match="after 3 attempts"):
+        generate_and_validate_hint("question", sketchpad, validator, max_attempts=3)
+
+
+def test_speculative_hint_returns_first_valid_and_cancels_the_rest():
+    sketchpad = FakeAsyncSketchpad(
+        ["slow", "fast", "slower"], delays={"slow": 5.0, "slower": 10.0}
+    )
+    validator = FakeAsyncValidator({"fast", "slow", "slower"})
+
+    async def main():
+        hint = await speculative_generate_and_validate_hint(
+            "question", sketchpad, validator, n_candidates=3
+        )
+        # Let the cancelled attempts unwind before the loop shuts down
+        await asyncio.sleep(0)
+        return hint, list(sketchpad.cancelled)
+
+    hint, cancelled = asyncio.run(main())
+
+    assert sketchpad.messages_to_string(hint) == "fast"
+    assert sorted(cancelled) == ["slow", "slower"]
+    assert validator.validated == ["fast"]
+
+
+def test_speculative_hint_cancels_the_losing_runs_on_the_server():
+    # The first run created finishes at once, the others would run for a minute
+    api = AssistantsAPI(delay=lambda prompt, n: 0.0 if n == 0 else 60.0)
+    sketchpad = async_assistant(api)
+    validator = FakeAsyncValidator({"question!"})
+
+    hint = asyncio.run(
+        speculative_generate_and_validate_hint(
+            "question", sketchpad, validator, n_candidates=3
+        )
+    )
+
+    assert sketchpad.messages_to_string(hint) == "question!"
+    assert sorted(api.cancelled) == ["run-1", "run-2"]
+
+
+def test_speculative_hint_replaces_rejected_attempts():
+    sketchpad = FakeAsyncSketchpad(["vague", "vague", "draw the graph"])
+    validator = FakeAsyncValidator({"draw the graph"})
+
+    hint = asyncio.run(
+        speculative_generate_and_validate_hint(
+            "question", sketchpad, validator, n_candidates=1
+        )
+    )
+
+    assert sketchpad.messages_to_string(hint) == "draw the graph"
+    assert sketchpad.invoked == 3
+
+
+def test_speculative_hint_raises_when_every_attempt_is_rejected():
+    sketchpad = FakeAsyncSketchpad(["vague"])
+    validator = FakeAsyncValidator(set())
+
+    with pytest.raises(RuntimeError, match="after 5 attempts"):
+        asyncio.run(
+            speculative_generate_and_validate_hint(
+                "question", sketchpad, validator, n_candidates=2, max_attempts=5
+            )
+        )
+    assert sketchpad.invoked == 5
+    assert len(validator.validated) == 5
+
+
+def completion(message: dict) -> httpx.Response:
+    return httpx.Response(200, json=chat_completion(model="gpt-4o-mini", **message))
+
+
+def llm_validator(handler) -> tuple[LLMHintValidator, list[dict]]:
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return handler(requests[-1])
+
+    validator = LLMHintValidator()
+    validator.client = AsyncOpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+    )
+    return validator, requests
+
+
+def test_llm_validator_prompt_matches_the_verdict_schema():
+    validator, requests = llm_validator(
+        lambda body: completion(
+            {"content": json.dumps({"valid": True, "reason": "Clear."})}
+        )
+    )
+
+    verdict = asyncio.run(validator.verdict("draw the graph", "question"))
+
+    assert verdict.valid and verdict.reason == "Clear."
+    prompt = requests[0]["messages"][-1]["content"]
+    assert "YES or NO" not in prompt
+    assert "valid" in prompt
+    assert requests[0]["response_format"]["type"] == "json_schema"
+
+
+def test_llm_validator_rejects_refused_verdict():
+    validator, _ = llm_validator(
+        lambda body: completion({"content": None, "refusal": "I can't help."})
+    )
+
+    verdict = asyncio.run(validator.verdict("draw the graph", "question"))
+
+    assert not verdict.valid
+    assert "I can't help." in verdict.reason
+
+
+def test_llm_validator_validates_individually_after_refused_batch():
+    def handler(body):
+        if "verdicts" in json.dumps(body["response_format"]):
+            return completion({"content": None, "refusal": "I can't help."})
+        return completion({"content": json.dumps({"valid": True, "reason": "ok"})})
+
+    validator, requests = llm_validator(handler)
+
+    verdicts = asyncio.run(
+        validator.validate_hints([("a", "question"), ("b", "question")])
+    )
+
+    assert [verdict.valid for verdict in verdicts] == [True, True]
+    assert len(requests) == 3
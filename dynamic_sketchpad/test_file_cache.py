@@ -0,0 +1,85 @@
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+from dynamic_sketchpad.file_cache import FileCache
+
+
+def test_get_or_fetch_only_fetches_once(tmp_path):
+    cache = FileCache(tmp_path)
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return b"image"
+
+    assert cache.get_or_fetch("file-1", fetch) == b"image"
+    assert cache.get_or_fetch("file-1", fetch) == b"image"
+    assert len(fetches) == 1
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    FileCache(tmp_path).put("file-1", b"image")
+    assert FileCache(tmp_path).get("file-1") == b"image"
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = FileCache(tmp_path, max_memory_bytes=10)
+    cache.put("file-1", b"12345")
+    cache.put("file-2", b"12345")
+    cache.get("file-1")
+    cache.put("file-3", b"12345")
+    assert list(cache._memory) == ["file-1", "file-3"]
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = FileCache(tmp_path, max_disk_bytes=10)
+    cache.put("file-1", b"12345")
+    os.utime(tmp_path / "file-1", (0, 0))
+    cache.put("file-2", b"12345")
+    cache.put("file-3", b"12345")
+    assert sorted(os.listdir(tmp_path)) == ["file-2", "file-3"]
+
+
+def test_disk_tier_is_scanned_once(tmp_path, monkeypatch):
+    FileCache(tmp_path).put("file-0", b"12345")
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+
+    cache = FileCache(tmp_path, max_disk_bytes=10)
+    for i in range(1, 5):
+        cache.put(f"file-{i}", b"12345")
+
+    assert len(scans) == 1
+    assert sorted(os.listdir(tmp_path)) == ["file-3", "file-4"]
+    assert cache._disk_bytes == 10
+
+
+def test_disk_file_removed_elsewhere_is_forgotten(tmp_path):
+    cache = FileCache(tmp_path, max_memory_bytes=0)
+    cache.put("file-1", b"12345")
+    cache.put("file-2", b"12345")
+    os.remove(tmp_path / "file-1")
+
+    assert cache.get("file-1") is None
+    assert cache._disk_bytes == 5
+
+
+def test_async_get_or_fetch_reads_disk_off_the_loop(tmp_path, monkeypatch):
+    FileCache(tmp_path).put("file-1", b"image")
+    cache = FileCache(tmp_path)
+    readers = []
+    read_bytes = Path.read_bytes
+    monkeypatch.setattr(
+        Path,
+        "read_bytes",
+        lambda path: readers.append(threading.get_ident()) or read_bytes(path),
+    )
+
+    async def fetch():
+        raise AssertionError("Cached files are not fetched")
+
+    assert asyncio.run(cache.async_get_or_fetch("file-1", fetch)) == b"image"
+    assert readers and threading.get_ident() not in readers
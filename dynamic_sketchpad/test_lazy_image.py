@@ -0,0 +1,43 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageFile
+
+from dynamic_sketchpad.lazy_image import LazyImage
+
+
+def encode(format: str, size: tuple[int, int] = (64, 32)) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format=format)
+    return buffer.getvalue()
+
+
+# Encoded up front, since encoding decodes the source image
+ENCODED = {format: encode(format) for format in ["PNG", "JPEG", "GIF"]}
+
+
+@pytest.fixture
+def no_decoding(monkeypatch):
+    def load(self):
+        raise AssertionError("Pixel data was decoded")
+
+    monkeypatch.setattr(Image.Image, "load", load)
+    monkeypatch.setattr(ImageFile.ImageFile, "load", load)
+
+
+def test_png_size_comes_from_the_header_alone():
+    # Only the signature and IHDR chunk, so any decode would fail
+    image = LazyImage(ENCODED["PNG"][:24])
+
+    assert image.size == (64, 32)
+    assert image.format == "PNG"
+    with pytest.raises(OSError):
+        image.open()
+
+
+@pytest.mark.parametrize("format", list(ENCODED))
+def test_size_does_not_decode_pixels(format, no_decoding):
+    image = LazyImage(ENCODED[format])
+
+    assert image.size == (64, 32)
+    assert image.format == format
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from dynamic_sketchpad.conftest import chat_completion
+from dynamic_sketchpad.limiter import (
+    AdaptiveConcurrencyLimiter,
+    parse_duration,
+    retry_after_seconds,
+)
+from dynamic_sketchpad.llm import LLM, create_message
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h2m3.5s", 3723.5), ("", None)],
+)
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "2"}) == 0.25
+    assert retry_after_seconds({"retry-after": "2"}) == 2.0
+    assert retry_after_seconds({}) is None
+
+
+HEADROOM = {"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "99"}
+
+
+def test_limit_is_off_until_the_server_reports_rate_limits():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=64)
+    limiter.on_success({})
+    assert limiter.max_in_flight == 64
+
+    limiter.on_success(HEADROOM)
+    assert limiter.max_in_flight == 9
+
+
+def test_limit_grows_on_success_and_halves_once_per_cooldown():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=64)
+    for _ in range(8):
+        limiter.on_success(HEADROOM)
+    assert limiter.max_in_flight == 16
+
+    limiter.on_error(429, {"retry-after": "1"})
+    limiter.on_error(429, {"retry-after": "1"})
+    assert limiter.max_in_flight == 8
+    assert 0.9 < limiter.pause_remaining() <= 1.0
+
+    limiter.on_success(HEADROOM)
+    assert limiter.max_in_flight == 8
+
+
+def test_set_max_limit_raises_an_active_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=16)
+    limiter.on_error(429, {})
+    assert limiter.max_in_flight == 4
+
+    limiter.set_max_limit(256)
+    assert limiter.max_in_flight == 256
+
+
+def test_low_remaining_budget_backs_off():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8)
+    limiter.on_success(
+        {
+            "x-ratelimit-limit-requests": "100",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "20ms",
+        }
+    )
+    assert limiter.max_in_flight == 4
+    assert 0 < limiter.pause_remaining() <= 0.02
+
+
+def test_llm_sleeps_exactly_as_long_as_retry_after(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return httpx.Response(
+                429, headers={"retry-after-ms": "100"}, json={"error": {}}
+            )
+        return httpx.Response(200, json=chat_completion("ok", model="limiter-test"))
+
+    llm = LLM(llm_str="limiter-test")
+    llm.client = AsyncOpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    completion = asyncio.run(llm.create_completion([create_message("user", "hi")]))
+
+    assert completion.choices[0].message.content == "ok"
+    assert 0.1 <= calls[1] - calls[0] < 1.0
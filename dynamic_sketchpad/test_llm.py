@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from dynamic_sketchpad.conftest import chat_completion
+from dynamic_sketchpad.llm import LLM, create_message
+from dynamic_sketchpad.scheduler import RequestScheduler
+
+DELAYS = {"slow": 0.2, "medium": 0.1, "fast": 0.0}
+
+
+async def delayed_echo(request: httpx.Request) -> httpx.Response:
+    prompt = json.loads(request.content)["messages"][-1]["content"]
+    await asyncio.sleep(DELAYS[prompt])
+    return httpx.Response(200, json=chat_completion(prompt.upper()))
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    llm = LLM()
+    llm.client = AsyncOpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(delayed_echo)),
+    )
+    return llm
+
+
+async def collect(responses):
+    return [item async for item in responses]
+
+
+def test_iter_responses_yields_in_completion_order(llm):
+    results = asyncio.run(collect(llm.iter_responses(["slow", "medium", "fast"])))
+    assert results == [(2, "FAST"), (1, "MEDIUM"), (0, "SLOW")]
+
+
+def test_iter_responses_bounds_pending_requests(llm):
+    results = asyncio.run(
+        collect(llm.iter_responses(["slow", "medium", "fast"], max_pending=1))
+    )
+    assert results == [(0, "SLOW"), (1, "MEDIUM"), (2, "FAST")]
+
+
+def test_iter_responses_raises_errors(llm, monkeypatch):
+    async def generate_response(input_text: str) -> str:
+        raise ValueError(input_text)
+
+    monkeypatch.setattr(llm, "generate_response", generate_response)
+    with pytest.raises(ValueError, match="broken"):
+        asyncio.run(collect(llm.iter_responses(["broken"])))
+
+
+def test_request_reserves_either_completion_token_cap(llm, monkeypatch):
+    scheduler = RequestScheduler()
+    reserved = []
+
+    def slot(model: str, tokens: int):
+        reserved.append(tokens)
+        return RequestScheduler.slot(scheduler, model, tokens)
+
+    monkeypatch.setattr(scheduler, "slot", slot)
+    monkeypatch.setattr("dynamic_sketchpad.llm.get_scheduler", lambda: scheduler)
+    messages = [create_message("user", "fast")]
+
+    async def main():
+        await llm.create_completion(messages)
+        await llm.create_completion(messages, max_tokens=500)
+        await llm.create_completion(messages, max_completion_tokens=500)
+
+    asyncio.run(main())
+
+    uncapped, legacy, current = reserved
+    assert legacy == current == uncapped + 500
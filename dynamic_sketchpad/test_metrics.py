@@ -0,0 +1,109 @@
+import asyncio
+import urllib.request
+
+import httpx
+from openai import AsyncOpenAI
+
+from dynamic_sketchpad.conftest import chat_completion
+from dynamic_sketchpad.llm import LLM, create_message
+from dynamic_sketchpad.metrics import (
+    InMemoryMetrics,
+    PrometheusMetrics,
+    add_sink,
+    measure_call,
+    remove_sink,
+)
+
+
+def test_llm_records_retries_tokens_and_latency(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after-ms": "10"}, json={})
+        return httpx.Response(
+            200,
+            json=chat_completion(
+                "ok",
+                model="metrics-test",
+                usage={
+                    "prompt_tokens": 12,
+                    "completion_tokens": 3,
+                    "total_tokens": 15,
+                    "prompt_tokens_details": {"cached_tokens": 8},
+                },
+            ),
+        )
+
+    llm = LLM(llm_str="metrics-test")
+    llm.client = AsyncOpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    metrics = InMemoryMetrics()
+    add_sink(metrics)
+    try:
+        asyncio.run(llm.create_completion([create_message("user", "hi")]))
+    finally:
+        remove_sink(metrics)
+
+    [record] = metrics.records
+    assert record.operation == "chat.completions.create"
+    assert record.retries == 1
+    assert (record.prompt_tokens, record.completion_tokens) == (12, 3)
+    assert record.cached_tokens == 8
+    assert record.latency >= record.time_to_first_token > 0
+    assert record.error is None
+
+
+def test_prometheus_endpoint_renders_counters():
+    metrics = PrometheusMetrics()
+    add_sink(metrics)
+    try:
+        try:
+            with measure_call("op", "model") as call:
+                call.prompt_tokens = 5
+                raise ValueError
+        except ValueError:
+            pass
+    finally:
+        remove_sink(metrics)
+
+    server = metrics.serve(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        body = urllib.request.urlopen(url).read().decode()
+    finally:
+        server.shutdown()
+
+    assert 'dynamic_sketchpad_errors_total{operation="op",model="model"} 1.0' in body
+    assert (
+        'dynamic_sketchpad_prompt_tokens_total{operation="op",model="model"} 5.0'
+        in body
+    )
+
+
+def test_cancelled_call_is_not_an_error():
+    metrics = InMemoryMetrics()
+
+    async def measured():
+        with measure_call("op", "model"):
+            await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(measured())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    add_sink(metrics)
+    try:
+        asyncio.run(main())
+    finally:
+        remove_sink(metrics)
+
+    [record] = metrics.records
+    assert record.error is None
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from itertools import count
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, OpenAI
+from openai.types.beta.threads import Message
+
+from dynamic_sketchpad import openai_utils
+from dynamic_sketchpad.file_cache import FileCache
+from dynamic_sketchpad.openai_utils import (
+    async_get_image_bytes_from_messages,
+    async_process_messages,
+    get_image_bytes_from_messages,
+    process_messages,
+)
+
+# Earlier files take longer, so downloads finish in reverse order
+DELAYS = {"file-1": 0.15, "file-2": 0.1, "file-3": 0.05, "file-4": 0.0}
+
+
+def message(*content: str) -> Message:
+    return Message.model_validate(
+        dict(
+            id="msg",
+            object="thread.message",
+            created_at=0,
+            thread_id="thread",
+            role="assistant",
+            status="completed",
+            attachments=[],
+            metadata={},
+            content=[
+                (
+                    {"type": "image_file", "image_file": {"file_id": item}}
+                    if item.startswith("file-")
+                    else {"type": "text", "text": {"value": item, "annotations": []}}
+                )
+                for item in content
+            ],
+        )
+    )
+
+
+MESSAGES = [
+    message("first", "file-1", "file-2"),
+    message("file-3"),
+    message("last", "file-4"),
+]
+
+
+def file_id(request: httpx.Request) -> str:
+    return request.url.path.split("/")[-2]
+
+
+def sync_files(request: httpx.Request) -> httpx.Response:
+    time.sleep(DELAYS[file_id(request)])
+    return httpx.Response(200, content=file_id(request).encode())
+
+
+async def async_files(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(DELAYS[file_id(request)])
+    return httpx.Response(200, content=file_id(request).encode())
+
+
+@pytest.fixture(autouse=True)
+def file_cache(tmp_path, monkeypatch):
+    # A fresh cache per lookup, so every call downloads its files again
+    caches = count()
+    monkeypatch.setattr(
+        openai_utils,
+        "get_file_cache",
+        lambda: FileCache(tmp_path / str(next(caches))),
+    )
+
+
+def test_concurrent_downloads_keep_message_order():
+    client = OpenAI(
+        api_key="test",
+        http_client=httpx.Client(transport=httpx.MockTransport(sync_files)),
+    )
+
+    assert get_image_bytes_from_messages(client, MESSAGES) == [
+        [b"file-1", b"file-2"],
+        [b"file-3"],
+        [b"file-4"],
+    ]
+    assert process_messages(client, MESSAGES) == [
+        "first",
+        b"file-1",
+        b"file-2",
+        b"file-3",
+        "last",
+        b"file-4",
+    ]
+
+
+def test_async_concurrent_downloads_keep_message_order():
+    client = AsyncOpenAI(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(async_files)),
+    )
+
+    async def main():
+        return (
+            await async_get_image_bytes_from_messages(client, MESSAGES),
+            await async_process_messages(client, MESSAGES, max_concurrency=2),
+        )
+
+    image_bytes, processed = asyncio.run(main())
+
+    assert image_bytes == [[b"file-1", b"file-2"], [b"file-3"], [b"file-4"]]
+    assert processed == [
+        "first",
+        b"file-1",
+        b"file-2",
+        b"file-3",
+        "last",
+        b"file-4",
+    ]
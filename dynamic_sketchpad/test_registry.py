@@ -0,0 +1,207 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, OpenAI
+
+from dynamic_sketchpad import assistant as assistant_module
+from dynamic_sketchpad.assistant import Assistant, AsyncAssistant
+from dynamic_sketchpad.registry import AssistantRegistry
+
+
+class FakeAssistants:
+    """
+    Assistants endpoints for one account, counting how often each is hit, plus
+    runs that fail like the API when their assistant does not exist.
+    """
+
+    def __init__(self):
+        self.assistants: dict[str, dict] = {}
+        self.created = 0
+        self.listed = 0
+        self.retrieved = 0
+        self.runs: list[str] = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/v1")
+        if path.endswith("/messages"):
+            return httpx.Response(
+                200,
+                json={
+                    "id": "msg",
+                    "object": "thread.message",
+                    "created_at": 0,
+                    "thread_id": "thread",
+                    "role": "user",
+                    "status": "completed",
+                    "content": [],
+                },
+            )
+        if path.endswith("/runs"):
+            assistant_id = json.loads(request.content)["assistant_id"]
+            if assistant_id not in self.assistants:
+                return httpx.Response(
+                    404,
+                    json={
+                        "error": {
+                            "message": f"No assistant found with id '{assistant_id}'."
+                        }
+                    },
+                )
+            self.runs.append(assistant_id)
+            return httpx.Response(
+                200,
+                json={
+                    "id": "run",
+                    "object": "thread.run",
+                    "created_at": 0,
+                    "thread_id": "thread",
+                    "assistant_id": assistant_id,
+                    "status": "queued",
+                    "model": "gpt-4o",
+                    "instructions": "",
+                    "tools": [],
+                    "parallel_tool_calls": True,
+                },
+            )
+        if path == "/assistants" and request.method == "POST":
+            self.created += 1
+            assistant = {
+                "id": f"asst_{self.created}",
+                "object": "assistant",
+                "created_at": 0,
+                "tools": [],
+                **json.loads(request.content),
+            }
+            self.assistants[assistant["id"]] = assistant
+            return httpx.Response(200, json=assistant)
+        if path == "/assistants" and request.method == "GET":
+            self.listed += 1
+            data = list(self.assistants.values())
+            return httpx.Response(
+                200, json={"object": "list", "data": data, "has_more": False}
+            )
+        assistant_id = path.removeprefix("/assistants/")
+        self.retrieved += 1
+        if assistant_id in self.assistants:
+            return httpx.Response(200, json=self.assistants[assistant_id])
+        return httpx.Response(404, json={"error": {"message": "No assistant found"}})
+
+    def client(self, api_key: str = "key", base_url: str = "https://a.test/v1"):
+        return OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=httpx.Client(transport=httpx.MockTransport(self.handle)),
+        )
+
+    def async_client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key="key",
+            base_url="https://a.test/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle)),
+        )
+
+
+CONFIG = dict(instructions="Draw things.", model="gpt-4o", tools=[])
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return AssistantRegistry(tmp_path / "assistants.json")
+
+
+def test_reuses_indexed_assistant(registry):
+    account = FakeAssistants()
+    first = registry.get_or_create(account.client(), **CONFIG)
+    second = registry.get_or_create(account.client(), **CONFIG)
+
+    assert first.id == second.id
+    assert account.created == 1
+    assert account.listed == 1
+
+
+def test_index_is_scoped_to_api_key_and_base_url(registry):
+    accounts = [FakeAssistants() for _ in range(3)]
+    registry.get_or_create(accounts[0].client(api_key="first"), **CONFIG)
+
+    registry.get_or_create(accounts[1].client(api_key="second"), **CONFIG)
+    registry.get_or_create(
+        accounts[2].client(api_key="first", base_url="https://b.test/v1"), **CONFIG
+    )
+
+    assert [account.created for account in accounts] == [1, 1, 1]
+    assert len(json.loads(registry.path.read_text())) == 3
+    assert "first" not in registry.path.read_text()
+
+
+def test_indexed_assistant_is_resolved_without_a_round_trip(registry, tmp_path):
+    account = FakeAssistants()
+    created = registry.get_or_create(account.client(), **CONFIG)
+    requests = (account.created, account.listed, account.retrieved)
+
+    restarted = AssistantRegistry(registry.path)
+    indexed = restarted.get_or_create(account.client(), **CONFIG)
+    registry.path.unlink()
+    memoized = restarted.get_or_create(account.client(), **CONFIG)
+
+    assert indexed.id == memoized.id == created.id
+    assert (account.created, account.listed, account.retrieved) == requests
+
+
+def test_stale_index_entry_is_forgotten_and_recreated(registry):
+    account = FakeAssistants()
+    stale = registry.get_or_create(account.client(), **CONFIG)
+    del account.assistants[stale.id]
+
+    fresh = registry.replace(account.client(), stale)
+
+    assert fresh.id != stale.id
+    assert account.created == 2
+    assert registry.get_or_create(account.client(), **CONFIG).id == fresh.id
+    assert fresh.id in registry.path.read_text()
+    assert stale.id not in registry.path.read_text()
+
+
+@pytest.fixture
+def account(registry, monkeypatch):
+    account = FakeAssistants()
+    monkeypatch.setattr(assistant_module, "get_registry", lambda: registry)
+    monkeypatch.setattr(assistant_module, "get_client", account.client)
+    return account
+
+
+def test_assistant_replaces_a_deleted_assistant_when_its_run_fails(account):
+    assistant = Assistant(instructions="Draw things.", tools=[])
+    stale_id = assistant.assistant.id
+    del account.assistants[stale_id]
+
+    assistant.submit_message("hi", "thread")
+
+    assert assistant.assistant.id != stale_id
+    assert account.runs == [assistant.assistant.id]
+
+
+def test_async_assistant_replaces_a_deleted_assistant_when_its_run_fails(account):
+    assistant = AsyncAssistant(instructions="Draw things.", tools=[])
+    assistant.client = account.async_client()
+    stale_id = assistant.assistant.id
+    del account.assistants[stale_id]
+
+    asyncio.run(assistant.submit_message("hi", "thread"))
+
+    assert assistant.assistant.id != stale_id
+    assert account.runs == [assistant.assistant.id]
+
+
+def test_finds_remote_assistant_by_metadata(registry, tmp_path):
+    account = FakeAssistants()
+    created = registry.get_or_create(account.client(), **CONFIG)
+
+    other_machine = AssistantRegistry(tmp_path / "other.json")
+    found = other_machine.get_or_create(account.client(), **CONFIG)
+
+    assert found.id == created.id
+    assert account.created == 1
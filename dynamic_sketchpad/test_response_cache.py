@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+from openai.types.chat.parsed_chat_completion import ParsedChatCompletion
+from pydantic import BaseModel
+
+from dynamic_sketchpad.conftest import chat_completion
+from dynamic_sketchpad.response_cache import ResponseCache, canonical_key
+
+
+class Answer(BaseModel):
+    answer: int
+
+
+def parsed_completion(answer: int) -> ParsedChatCompletion[Answer]:
+    return ParsedChatCompletion[Answer].model_validate(
+        chat_completion(f'{{"answer": {answer}}}', parsed={"answer": answer})
+    )
+
+
+def test_canonical_key_ignores_argument_order():
+    messages = [{"role": "user", "content": "hi"}]
+    assert canonical_key(model="gpt-4o", messages=messages, temperature=0) == (
+        canonical_key(temperature=0, messages=messages, model="gpt-4o")
+    )
+    assert canonical_key(model="gpt-4o", response_format=Answer) != (
+        canonical_key(model="gpt-4o")
+    )
+
+
+def test_parsed_completion_round_trips_through_cache(tmp_path):
+    calls = []
+
+    async def create():
+        calls.append(1)
+        return parsed_completion(42)
+
+    async def main():
+        cache = ResponseCache(tmp_path / "cache.sqlite")
+        await cache.get_or_create("key", create, ParsedChatCompletion[Answer])
+        cache = ResponseCache(tmp_path / "cache.sqlite")
+        return await cache.get_or_create("key", create, ParsedChatCompletion[Answer])
+
+    response = asyncio.run(main())
+    assert response.choices[0].message.parsed == Answer(answer=42)
+    assert len(calls) == 1
+
+
+def test_identical_in_flight_requests_are_coalesced(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return parsed_completion(1)
+
+    async def main():
+        return await asyncio.gather(
+            *[
+                cache.get_or_create("key", create, ParsedChatCompletion[Answer])
+                for _ in range(5)
+            ]
+        )
+
+    assert len(asyncio.run(main())) == 5
+    assert len(calls) == 1
+
+
+def test_expired_and_evicted_entries_are_dropped(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttl=-1)
+    cache.put("key", "value")
+    assert cache.get("key") is None
+
+    cache = ResponseCache(tmp_path / "lru.sqlite", max_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, key)
+    assert [cache.get(key) for key in ["a", "b", "c"]] == [None, "b", "c"]
+
+
+def test_sqlite_is_queried_off_the_event_loop(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    threads = []
+    for name in ["get", "put"]:
+        method = getattr(cache, name)
+
+        def in_thread(*args, method=method):
+            threads.append(threading.get_ident())
+            return method(*args)
+
+        setattr(cache, name, in_thread)
+
+    async def create():
+        return parsed_completion(1)
+
+    async def main():
+        for _ in range(2):
+            await cache.get_or_create("key", create, ParsedChatCompletion[Answer])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert len(threads) == 3
+    assert loop_thread not in threads
+
+
+def test_followers_retry_when_the_leading_request_is_cancelled(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return parsed_completion(len(calls))
+
+    async def main():
+        leader = asyncio.create_task(
+            cache.get_or_create("key", create, ParsedChatCompletion[Answer])
+        )
+        while not calls:
+            await asyncio.sleep(0.001)
+        follower = asyncio.create_task(
+            cache.get_or_create("key", create, ParsedChatCompletion[Answer])
+        )
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    response, leader_cancelled = asyncio.run(main())
+    assert leader_cancelled
+    assert response.choices[0].message.parsed == Answer(answer=2)
+    assert len(calls) == 2
@@ -0,0 +1,151 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError
+from openai.types.beta.threads import Run
+
+from dynamic_sketchpad.run_tracker import AsyncRunTracker, PollSchedule, RunTracker
+
+FAST_POLLS = dict(initial_interval=0.001, max_interval=0.002, jitter=0.0)
+
+
+def make_run(run_id: str, status: str) -> Run:
+    return Run.model_construct(id=run_id, thread_id="thread", status=status)
+
+
+def connection_error() -> APIConnectionError:
+    return APIConnectionError(request=httpx.Request("GET", "https://example.com"))
+
+
+class ScriptedRuns:
+    """Answers retrievals of each run from a script of statuses and errors."""
+
+    def __init__(self, scripts: dict[str, list]):
+        self.scripts = scripts
+        self.retrievals: list[str] = []
+
+    def next(self, run_id: str) -> Run:
+        self.retrievals.append(run_id)
+        script = self.scripts[run_id]
+        step = script.pop(0) if len(script) > 1 else script[0]
+        if isinstance(step, Exception):
+            raise step
+        return make_run(run_id, step)
+
+    def client(self):
+        return SimpleNamespace(
+            beta=SimpleNamespace(
+                threads=SimpleNamespace(
+                    runs=SimpleNamespace(
+                        retrieve=lambda run_id, thread_id: self.next(run_id)
+                    )
+                )
+            )
+        )
+
+    def async_client(self):
+        async def retrieve(run_id, thread_id):
+            return self.next(run_id)
+
+        return SimpleNamespace(
+            beta=SimpleNamespace(
+                threads=SimpleNamespace(runs=SimpleNamespace(retrieve=retrieve))
+            )
+        )
+
+
+def test_poll_schedule_backs_off_and_resets_on_status_change():
+    schedule = PollSchedule(
+        initial_interval=1.0, max_interval=4.0, backoff=2.0, jitter=0.0
+    )
+    delays = [schedule.next_delay("queued") for _ in range(4)]
+    assert delays == [1.0, 2.0, 4.0, 4.0]
+    assert schedule.next_delay("in_progress") == 1.0
+
+
+@pytest.mark.parametrize(
+    "status", ["completed", "incomplete", "failed", "cancelled", "expired"]
+)
+def test_run_tracker_stops_at_terminal_states(status):
+    runs = ScriptedRuns({"run": ["queued", "in_progress", status]})
+    tracker = RunTracker(runs.client(), **FAST_POLLS)
+
+    finished = tracker.wait(make_run("run", "queued"))
+
+    assert finished.status == status
+    assert len(runs.retrievals) == 3
+
+
+def test_run_tracker_yields_runs_as_they_complete():
+    runs = ScriptedRuns(
+        {
+            "slow": ["in_progress"] * 5 + ["completed"],
+            "fast": ["completed"],
+        }
+    )
+    tracker = RunTracker(runs.client(), **FAST_POLLS)
+
+    completed = list(
+        tracker.as_completed(
+            [
+                make_run("slow", "queued"),
+                make_run("fast", "queued"),
+                make_run("done", "completed"),
+            ]
+        )
+    )
+
+    assert [index for index, _ in completed] == [2, 1, 0]
+
+
+def test_run_tracker_retries_transient_errors():
+    runs = ScriptedRuns({"run": [connection_error(), connection_error(), "completed"]})
+    tracker = RunTracker(runs.client(), **FAST_POLLS)
+
+    assert tracker.wait(make_run("run", "queued")).status == "completed"
+
+
+def test_run_tracker_raises_after_repeated_failures():
+    runs = ScriptedRuns({"run": [connection_error()]})
+    tracker = RunTracker(runs.client(), max_poll_failures=3, **FAST_POLLS)
+
+    with pytest.raises(APIConnectionError):
+        tracker.wait(make_run("run", "queued"))
+    assert len(runs.retrievals) == 3
+
+
+def test_async_run_tracker_waits_for_terminal_state():
+    runs = ScriptedRuns({"run": ["in_progress", connection_error(), "failed"]})
+    tracker = AsyncRunTracker(runs.async_client(), **FAST_POLLS)
+
+    finished = asyncio.run(tracker.wait(make_run("run", "queued")))
+
+    assert finished.status == "failed"
+
+
+def test_async_run_tracker_raises_after_repeated_failures():
+    runs = ScriptedRuns({"run": [connection_error()]})
+    tracker = AsyncRunTracker(runs.async_client(), max_poll_failures=2, **FAST_POLLS)
+
+    with pytest.raises(APIConnectionError):
+        asyncio.run(tracker.wait(make_run("run", "queued")))
+    assert len(runs.retrievals) == 2
+
+
+def test_run_tracker_starts_submitted_runs_while_polling():
+    runs = ScriptedRuns({f"run{i}": ["in_progress", "completed"] for i in range(3)})
+    tracker = RunTracker(runs.client(), **FAST_POLLS)
+    queued = [make_run(f"run{i}", "queued") for i in range(3)]
+
+    def submit(block):
+        if not queued:
+            return None
+        # Starts one run at a time, as if the in-flight window had a single slot
+        return [queued.pop(0)] if block else []
+
+    completed = list(tracker.as_completed([], submit=submit))
+
+    assert [index for index, _ in completed] == [0, 1, 2]
+    assert runs.retrievals == ["run0", "run0", "run1", "run1", "run2", "run2"]
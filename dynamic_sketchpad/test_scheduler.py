@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+from dynamic_sketchpad.scheduler import ModelBudget, RateLimits, RequestScheduler
+
+
+def test_in_flight_window_is_bounded():
+    budget = ModelBudget(RateLimits(max_in_flight=2))
+    first = budget.try_acquire(10)
+    budget.try_acquire(10)
+    assert isinstance(budget.try_acquire(10), float)
+
+    budget.release(first)
+    assert not isinstance(budget.try_acquire(10), float)
+
+
+def test_requests_per_minute_budget_returns_delay():
+    budget = ModelBudget(RateLimits(requests_per_minute=1))
+    budget.release(budget.try_acquire(1))
+    delay = budget.try_acquire(1)
+    assert isinstance(delay, float)
+    assert 59 < delay <= 60
+
+
+def test_tokens_per_minute_uses_reported_usage():
+    budget = ModelBudget(RateLimits(tokens_per_minute=100))
+    reservation = budget.try_acquire(90)
+    assert isinstance(budget.try_acquire(20), float)
+
+    budget.release(reservation, used_tokens=10)
+    assert not isinstance(budget.try_acquire(20), float)
+
+
+def test_slot_limits_concurrency():
+    scheduler = RequestScheduler(RateLimits(max_in_flight=3))
+    active = 0
+    peak = 0
+
+    async def work():
+        nonlocal active, peak
+        async with scheduler.slot("model", 1):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def main():
+        await asyncio.gather(*[work() for _ in range(10)])
+
+    asyncio.run(main())
+    assert peak == 3
+
+
+def test_configured_in_flight_applies_to_traffic_without_rate_limit_headers():
+    scheduler = RequestScheduler()
+    scheduler.configure(
+        "model", RateLimits(requests_per_minute=1000, max_in_flight=256)
+    )
+    active = 0
+    peak = 0
+
+    async def work():
+        nonlocal active, peak
+        async with scheduler.slot("model", 1):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def main():
+        await asyncio.gather(*[work() for _ in range(100)])
+
+    asyncio.run(main())
+    assert peak == 100
+
+
+def test_configure_updates_budget_in_place():
+    scheduler = RequestScheduler()
+    budget = scheduler.budget("gpt-4o")
+    reservation = budget.try_acquire(10)
+
+    scheduler.configure("gpt-4o", RateLimits(max_in_flight=4))
+    scheduler.release("gpt-4o", reservation)
+
+    assert scheduler.budget("gpt-4o") is budget
+    assert budget.in_flight == 0
+    assert budget.limits.max_in_flight == 4
+    assert budget.limiter.max_in_flight <= 4
+
+
+def test_release_wakes_sync_waiter():
+    budget = ModelBudget(RateLimits(max_in_flight=1))
+    held = budget.try_acquire(1)
+    acquired = threading.Event()
+
+    def waiter():
+        budget.acquire_sync(1)
+        acquired.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    budget.release(held)
+    assert acquired.wait(1.0)
+    thread.join()
+
+
+def test_release_from_another_thread_wakes_async_waiter():
+    budget = ModelBudget(RateLimits(max_in_flight=1))
+    held = budget.try_acquire(1)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.call_later(
+            0.05, threading.Thread(target=budget.release, args=(held,)).start
+        )
+        start = time.monotonic()
+        await asyncio.wait_for(budget.acquire(1), timeout=1.0)
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) < 0.5
+    assert budget.in_flight == 1
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import time
+from itertools import count
+
+import httpx
+import pytest
+from openai import OpenAI, RateLimitError
+
+from dynamic_sketchpad import openai_utils
+from dynamic_sketchpad.conftest import AssistantsAPI, async_assistant, chat_completion
+from dynamic_sketchpad.file_cache import FileCache
+from dynamic_sketchpad.openai_utils import async_get_file_content
+from dynamic_sketchpad.standin import (
+    Cassette,
+    RecordedResponse,
+    StandInRequest,
+    StandInServer,
+    SyntheticLatency,
+)
+
+
+def chunk(content: str) -> str:
+    return json.dumps(
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "delta": {"content": content}}],
+        }
+    )
+
+
+def upstream_api(request: StandInRequest) -> RecordedResponse:
+    body = request.json()
+    prompt = body["messages"][-1]["content"]
+    if body.get("stream"):
+        return RecordedResponse.event_stream(
+            [(None, chunk(word)) for word in prompt.split()] + [(None, "[DONE]")]
+        )
+    return RecordedResponse.json(chat_completion(prompt.upper()))
+
+
+def complete(client: OpenAI, prompt: str) -> str:
+    completion = client.chat.completions.create(
+        model="gpt-4o", messages=[{"role": "user", "content": prompt}]
+    )
+    return completion.choices[0].message.content
+
+
+def stream(client: OpenAI, prompt: str) -> list[str]:
+    chunks = client.chat.completions.create(
+        model="gpt-4o", messages=[{"role": "user", "content": prompt}], stream=True
+    )
+    return [chunk.choices[0].delta.content for chunk in chunks]
+
+
+def test_records_then_replays_offline(tmp_path):
+    path = tmp_path / "cassette.json"
+    with StandInServer(Cassette(), fallback=upstream_api) as upstream:
+        with StandInServer(Cassette(path), upstream=upstream.base_url) as recorder:
+            client = OpenAI(api_key="test", base_url=recorder.base_url)
+            assert complete(client, "hello there") == "HELLO THERE"
+            assert stream(client, "one two three") == ["one", "two", "three"]
+
+    latency = SyntheticLatency(stream_event=0.02)
+    with StandInServer(Cassette(path), latency=latency) as replay:
+        client = OpenAI(api_key="test", base_url=replay.base_url, max_retries=0)
+        assert complete(client, "hello there") == "HELLO THERE"
+        start = time.monotonic()
+        assert stream(client, "one two three") == ["one", "two", "three"]
+        assert time.monotonic() - start >= 0.06
+
+
+def test_simulated_rate_limit_returns_429_with_retry_after():
+    with StandInServer(
+        Cassette(), fallback=upstream_api, requests_per_minute=1
+    ) as stand_in:
+        client = OpenAI(api_key="test", base_url=stand_in.base_url, max_retries=0)
+        complete(client, "first")
+        with pytest.raises(RateLimitError) as error:
+            complete(client, "second")
+
+    headers = error.value.response.headers
+    assert headers["x-ratelimit-remaining-requests"] == "0"
+    assert 59_000 < int(headers["retry-after-ms"]) <= 60_000
+
+
+def recorded_upstream(api: AssistantsAPI):
+    def respond(request: StandInRequest) -> RecordedResponse:
+        response = api(
+            httpx.Request(
+                request.method,
+                f"http://upstream{request.path}",
+                headers=request.headers,
+                content=request.body,
+            )
+        )
+        return RecordedResponse(
+            response.status_code,
+            {"content-type": response.headers.get("content-type", "")},
+            response.content,
+        )
+
+    return respond
+
+
+PROMPTS = ["first", "second", "third"]
+
+
+async def use_assistant(base_url: str, prompts: list[str]) -> tuple:
+    assistant = async_assistant(base_url=base_url)
+    texts = [
+        assistant.messages_to_string(messages)
+        for messages in await assistant.invoke_all(*prompts)
+    ]
+    streamed = [event async for event in assistant.stream("streamed")]
+    image = await async_get_file_content(assistant.client, "file-plot")
+    return texts, streamed[-1].run.status, image
+
+
+def test_assistant_flow_replays_in_any_order(tmp_path, monkeypatch):
+    # A fresh file cache per lookup, so file contents are always requested
+    caches = count()
+    monkeypatch.setattr(
+        openai_utils, "get_file_cache", lambda: FileCache(tmp_path / str(next(caches)))
+    )
+    path = tmp_path / "cassette.json"
+    api = AssistantsAPI(delay=lambda prompt, n: 0.05)
+    with StandInServer(Cassette(), fallback=recorded_upstream(api)) as upstream:
+        with StandInServer(Cassette(path), upstream=upstream.base_url) as recorder:
+            # Recorded one prompt at a time, so threads are created in prompt order
+            for prompt in PROMPTS:
+                asyncio.run(use_assistant(recorder.base_url, [prompt]))
+
+    with StandInServer(Cassette(path)) as replay:
+        texts, status, image = asyncio.run(
+            use_assistant(replay.base_url, PROMPTS[::-1])
+        )
+
+    assert texts == ["third!", "second!", "first!"]
+    assert status == "completed"
+    assert image == b"file-plot"
@@ -0,0 +1,122 @@
+import pytest
+from openai.types.beta.assistant_stream_event import (
+    ThreadMessageDelta,
+    ThreadRunCompleted,
+    ThreadRunFailed,
+    ThreadRunInProgress,
+    ThreadRunStepDelta,
+)
+
+from dynamic_sketchpad.streaming import (
+    CodeDelta,
+    ImageReady,
+    RunFinished,
+    TextDelta,
+    parse_stream_event,
+)
+
+RUN = {
+    "id": "run",
+    "object": "thread.run",
+    "created_at": 0,
+    "thread_id": "thread",
+    "assistant_id": "asst",
+    "status": "completed",
+    "model": "gpt-4o",
+    "instructions": "",
+    "tools": [],
+    "parallel_tool_calls": True,
+}
+
+
+def message_delta(*content: dict) -> ThreadMessageDelta:
+    return ThreadMessageDelta.model_validate(
+        {
+            "event": "thread.message.delta",
+            "data": {
+                "id": "msg",
+                "object": "thread.message.delta",
+                "delta": {"content": list(content)},
+            },
+        }
+    )
+
+
+def step_delta(step_details: dict | None) -> ThreadRunStepDelta:
+    return ThreadRunStepDelta.model_validate(
+        {
+            "event": "thread.run.step.delta",
+            "data": {
+                "id": "step",
+                "object": "thread.run.step.delta",
+                "delta": {"step_details": step_details},
+            },
+        }
+    )
+
+
+def code_interpreter_call(code: str | None) -> dict:
+    return {
+        "type": "tool_calls",
+        "tool_calls": [
+            {
+                "index": 0,
+                "type": "code_interpreter",
+                "code_interpreter": {"input": code},
+            }
+        ],
+    }
+
+
+def test_message_delta_yields_text_and_images_in_order():
+    event = message_delta(
+        {"index": 0, "type": "text", "text": {"value": "Here is a plot"}},
+        {"index": 1, "type": "image_file", "image_file": {"file_id": "file-1"}},
+        {"index": 2, "type": "text", "text": {"value": ""}},
+    )
+
+    assert list(parse_stream_event(event)) == [
+        TextDelta("Here is a plot"),
+        ImageReady("file-1"),
+    ]
+
+
+def test_step_delta_yields_code_interpreter_input():
+    assert list(parse_stream_event(step_delta(code_interpreter_call("plt.plot(")))) == [
+        CodeDelta("plt.plot(")
+    ]
+
+
+@pytest.mark.parametrize(
+    "step_details",
+    [
+        None,
+        code_interpreter_call(None),
+        {"type": "message_creation", "message_creation": {"message_id": "msg"}},
+    ],
+)
+def test_step_delta_without_code_yields_nothing(step_details):
+    assert list(parse_stream_event(step_delta(step_details))) == []
+
+
+@pytest.mark.parametrize(
+    "event_type, status",
+    [(ThreadRunCompleted, "completed"), (ThreadRunFailed, "failed")],
+)
+def test_terminal_run_events_yield_run_finished(event_type, status):
+    event = event_type.model_validate(
+        {"event": f"thread.run.{status}", "data": {**RUN, "status": status}}
+    )
+
+    (finished,) = parse_stream_event(event)
+
+    assert isinstance(finished, RunFinished)
+    assert finished.run.status == status
+
+
+def test_other_run_events_yield_nothing():
+    event = ThreadRunInProgress.model_validate(
+        {"event": "thread.run.in_progress", "data": {**RUN, "status": "in_progress"}}
+    )
+
+    assert list(parse_stream_event(event)) == []
@@ -0,0 +1,83 @@
+import logging
+
+import pytest
+
+from dynamic_sketchpad.llm import LLM
+from dynamic_sketchpad.scheduler import RateLimits, RequestScheduler
+from dynamic_sketchpad.tokens import (
+    DEFAULT_CONTEXT_WINDOW,
+    TRUNCATION_MARKER,
+    TruncationPolicy,
+    context_window,
+    count_tokens,
+    estimate_request_tokens,
+    truncate_messages,
+    truncate_text,
+)
+
+TEXT = " ".join(f"word{i}" for i in range(2_000))
+
+
+def test_truncate_text_respects_policy_and_budget():
+    head = truncate_text(TEXT, 100, policy=TruncationPolicy.KEEP_HEAD)
+    tail = truncate_text(TEXT, 100, policy=TruncationPolicy.KEEP_TAIL)
+    both = truncate_text(TEXT, 100, policy=TruncationPolicy.KEEP_BOTH_ENDS)
+
+    for truncated in (head, tail, both):
+        assert TRUNCATION_MARKER in truncated
+        assert count_tokens(truncated) <= 100
+    assert head.startswith("word0 ") and not head.rstrip().endswith("word1999")
+    assert tail.endswith("word1999") and not tail.lstrip().startswith("word0 ")
+    assert both.startswith("word0 ") and both.endswith("word1999")
+    assert truncate_text("short", 100) == "short"
+
+
+def test_truncate_messages_keeps_system_message_and_fits():
+    messages = [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": TEXT},
+    ]
+    truncated = truncate_messages(messages, 200)
+
+    assert truncated[0] == messages[0]
+    assert estimate_request_tokens(truncated) <= 200
+    assert messages[1]["content"] == TEXT
+
+
+@pytest.mark.parametrize(
+    "model, expected",
+    [
+        ("gpt-4o-2024-11-20", 128_000),
+        ("gpt-4o-mini-2024-07-18", 128_000),
+        ("gpt-4.1", 1_047_576),
+        ("gpt-4.1-mini-2025-04-14", 1_047_576),
+        ("gpt-4-32k", 32_768),
+        ("gpt-4-0613", 8_192),
+        ("some-new-model", DEFAULT_CONTEXT_WINDOW),
+    ],
+)
+def test_context_window_uses_known_models_only(model, expected):
+    assert context_window(model) == expected
+
+
+def test_max_request_tokens_ignores_tpm():
+    scheduler = RequestScheduler(RateLimits(tokens_per_minute=1_000))
+    assert scheduler.max_request_tokens("gpt-4-0613") == 8_192
+    assert scheduler.max_request_tokens("gpt-4o") == 128_000
+
+
+def test_truncate_text_logs_when_truncating(caplog):
+    with caplog.at_level(logging.WARNING, logger="dynamic_sketchpad.tokens"):
+        truncate_text("short", 100)
+        assert not caplog.records
+        truncate_text(TEXT, 100)
+    assert "Truncating text" in caplog.text
+
+
+def test_llm_does_not_truncate_by_default():
+    messages = [{"role": "user", "content": TEXT * 10}]
+    assert LLM(llm_str="gpt-4-0613")._fit_to_budget(messages, {}) == messages
+
+    llm = LLM(llm_str="gpt-4-0613", truncation=TruncationPolicy.KEEP_HEAD)
+    truncated = llm._fit_to_budget(messages, {"max_tokens": 1_000})
+    assert estimate_request_tokens(truncated, "gpt-4-0613") <= 8_192 - 1_000
@@ -0,0 +1,164 @@
+import logging
+import re
+from enum import Enum
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4
+MESSAGE_TOKEN_OVERHEAD = 4
+REPLY_TOKEN_OVERHEAD = 3
+TRUNCATION_MARKER = "\n...[truncated]...\n"
+
+# Known models only: a family prefix is not a safe guess (gpt-4.1 is not gpt-4).
+# Dated snapshots such as gpt-4o-2024-11-20 resolve to their undated name.
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "chatgpt-4o-latest": 128_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4.1-mini": 1_047_576,
+    "gpt-4.1-nano": 1_047_576,
+    "gpt-4-turbo": 128_000,
+    "gpt-4-turbo-preview": 128_000,
+    "gpt-4-1106-preview": 128_000,
+    "gpt-4-0125-preview": 128_000,
+    "gpt-4": 8_192,
+    "gpt-4-0613": 8_192,
+    "gpt-4-32k": 32_768,
+    "gpt-4-32k-0613": 32_768,
+    "gpt-3.5-turbo": 16_385,
+    "gpt-3.5-turbo-0125": 16_385,
+    "gpt-3.5-turbo-1106": 16_385,
+    "o1": 200_000,
+    "o1-mini": 128_000,
+    "o1-preview": 128_000,
+    "o3": 200_000,
+    "o3-mini": 200_000,
+    "o4-mini": 200_000,
+}
+# Unknown models get the smallest window still in use
+DEFAULT_CONTEXT_WINDOW = 8_192
+SNAPSHOT_SUFFIX = re.compile(r"-\d{4}-\d{2}-\d{2}$")
+
+
+logger = logging.getLogger(__name__)
+
+
+class TruncationPolicy(str, Enum):
+    KEEP_HEAD = "keep_head"
+    KEEP_TAIL = "keep_tail"
+    KEEP_BOTH_ENDS = "keep_both_ends"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """
+    Returns the tiktoken encoding for the model, or None when tiktoken or its
+    encoding files are unavailable, in which case counts fall back to a heuristic.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def estimate_request_tokens(
+    messages: list[dict], model: str = "gpt-4o", max_tokens: int | None = None
+) -> int:
+    """Prompt tokens of the messages plus the completion tokens the request may use."""
+    prompt_tokens = sum(
+        count_tokens(str(message.get("content") or ""), model) + MESSAGE_TOKEN_OVERHEAD
+        for message in messages
+    )
+    return prompt_tokens + REPLY_TOKEN_OVERHEAD + (max_tokens or 0)
+
+
+def context_window(model: str) -> int:
+    if model in CONTEXT_WINDOWS:
+        return CONTEXT_WINDOWS[model]
+    return CONTEXT_WINDOWS.get(SNAPSHOT_SUFFIX.sub("", model), DEFAULT_CONTEXT_WINDOW)
+
+
+def truncate_text(
+    text: str,
+    max_tokens: int,
+    model: str = "gpt-4o",
+    policy: TruncationPolicy = TruncationPolicy.KEEP_BOTH_ENDS,
+) -> str:
+    """Shortens the text to at most max_tokens, marking where text was dropped."""
+    tokens = count_tokens(text, model)
+    if tokens <= max_tokens:
+        return text
+    logger.warning(
+        f"Truncating text from {tokens} to {max_tokens} tokens ({policy.value})."
+    )
+
+    keep = max(max_tokens - count_tokens(TRUNCATION_MARKER, model), 0)
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Without an encoder, slice characters at the heuristic's rate
+        pieces, keep = text, keep * CHARS_PER_TOKEN
+    else:
+        pieces = encoding.encode(text, disallowed_special=())
+
+    match policy:
+        case TruncationPolicy.KEEP_HEAD:
+            head, tail = keep, 0
+        case TruncationPolicy.KEEP_TAIL:
+            head, tail = 0, keep
+        case TruncationPolicy.KEEP_BOTH_ENDS:
+            head = keep // 2
+            tail = keep - head
+    kept = [pieces[:head], pieces[len(pieces) - tail :]]
+    if encoding is not None:
+        kept = [encoding.decode(piece) for piece in kept]
+    return kept[0] + TRUNCATION_MARKER + kept[1]
+
+
+def truncate_messages(
+    messages: list[dict],
+    max_tokens: int,
+    model: str = "gpt-4o",
+    policy: TruncationPolicy = TruncationPolicy.KEEP_BOTH_ENDS,
+) -> list[dict]:
+    """
+    Truncates the longest non-system message until the request fits in
+    max_tokens. System messages are kept whole.
+    """
+    messages = list(messages)
+    while (excess := estimate_request_tokens(messages, model) - max_tokens) > 0:
+        candidates = [
+            (count_tokens(str(message["content"]), model), index)
+            for index, message in enumerate(messages)
+            if message["role"] != "system" and isinstance(message["content"], str)
+        ]
+        if not candidates:
+            break
+        tokens, index = max(candidates)
+        if tokens <= count_tokens(TRUNCATION_MARKER, model):
+            break
+        message = messages[index]
+        messages[index] = {
+            **message,
+            "content": truncate_text(
+                message["content"], max(tokens - excess, 0), model, policy
+            ),
+        }
+    return messages
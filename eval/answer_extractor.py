@@ -2,11 +2,17 @@ import asyncio
 import logging
 import re
 from ast import literal_eval
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
 
 from openai.types.chat.parsed_chat_completion import ParsedChatCompletion
 from pydantic import BaseModel
 
 from dynamic_sketchpad.llm import LLM, create_message
+from dynamic_sketchpad.response_cache import ResponseCache
+from dynamic_sketchpad.tokens import TruncationPolicy, truncate_text
 
 
 def setup_logging():
@@ -20,26 +26,25 @@ def setup_logging():
 logger = setup_logging()
 
 
-async def extract_answer(question: str, response: str) -> int | None:
-    answer = regex_extract_answer(response)
-    if answer is None:
-        logger.warning(
-            f"Unable to extract answer using regex in response\n{response}\nUsing LLM for extraction."
-        )
-        extractor_llm = ExtractorLLM()
-        answer = await extractor_llm.extract_answer(question, response)
-        if answer is None:
-            logger.warning(
-                f"Unable to extract answer using LLM in response\n{response}"
-            )
-        else:
-            logger.info(f"Extracted answer using LLM: {answer}")
-    return answer
+ANSWER_PATTERN = r"(?:[\*\_]*ANSWER[\*\_]*):\s*[\*\_]*(.+?)[\*\_]*[\s\.\!]*$"
+
+
+async def extract_answer(
+    question: str, response: str, task: str | None = None
+) -> str | float | int | bool | None:
+    return await get_answer_extractor(task).extract(question, response)
+
+
+def parse_literal(answer: str) -> str | float | int | bool | None:
+    try:
+        return literal_eval(answer)
+    except (ValueError, SyntaxError):
+        return answer
 
 
 def regex_extract_answer(
     output: str,
-    pattern: str = r"(?:[\*\_]*ANSWER[\*\_]*):\s*[\*\_]*(.+?)[\*\_]*[\s\.\!]*$",
+    pattern: str = ANSWER_PATTERN,
 ) -> str | float | int | None:
     """
     Extracts the answer from LLM-generated output using a regex pattern.
@@ -55,13 +60,176 @@ def regex_extract_answer(
     if re_match is None:
         return None
 
-    answer = re_match.group(1)
+    return parse_literal(re_match.group(1))
+
+
+@dataclass(frozen=True)
+class ExtractionStrategy:
+    name: str
+    pattern: re.Pattern
+    confidence: float
+
+    def search(self, output: str) -> str | None:
+        """Returns the last match, since final answers come at the end."""
+        matches = self.pattern.findall(output)
+        if not matches:
+            return None
+        return clean_answer(matches[-1])
+
+
+def clean_answer(answer: str) -> str:
+    answer = re.sub(r"\\text(?:bf)?\{([^{}]*)\}", r"\1", answer)
+    return answer.strip().strip("$*_`").strip().rstrip(".!")
+
+
+# Ordered by confidence, the first strategy whose answer survives normalisation wins
+EXTRACTION_STRATEGIES = (
+    ExtractionStrategy("answer_label", re.compile(ANSWER_PATTERN), 0.95),
+    ExtractionStrategy("boxed", re.compile(r"\\boxed\{((?:[^{}]|\{[^{}]*\})*)\}"), 0.9),
+    ExtractionStrategy(
+        "final_answer",
+        re.compile(
+            r"final answer(?: is)?[\*\_]*\s*[:：]?[ \t\*\_]*(\S[^\n]*?)[\s\.\!]*$",
+            re.IGNORECASE | re.MULTILINE,
+        ),
+        0.85,
+    ),
+    ExtractionStrategy(
+        "answer_next_line",
+        re.compile(
+            r"^[#\s]*[\*\_]*answer[\*\_]*:?[\*\_]*:?[ \t]*\n+\s*(\S[^\n]*?)[\s\.\!]*$",
+            re.IGNORECASE | re.MULTILINE,
+        ),
+        0.8,
+    ),
+    ExtractionStrategy(
+        "answer_label_inline",
+        re.compile(
+            r"[\*\_]*ANSWER[\*\_]*:[ \t]*[\*\_]*([^\n]+?)[\*\_]*[\s\.\!]*$",
+            re.MULTILINE,
+        ),
+        0.75,
+    ),
+    ExtractionStrategy(
+        "trailing_bool",
+        re.compile(r"\b(True|False)\b[\s\.\!\*\_]*\Z", re.IGNORECASE),
+        0.6,
+    ),
+)
+
+TRUE_WORDS = {"true", "yes", "connected", "isomorphic"}
+FALSE_WORDS = {"false", "no", "not connected", "disconnected", "not isomorphic"}
+
+
+def normalize_bool(answer) -> bool | None:
+    if isinstance(answer, bool):
+        return answer
+    answer = str(answer).strip().lower()
+    if answer in TRUE_WORDS:
+        return True
+    if answer in FALSE_WORDS:
+        return False
+    return None
 
-    try:
-        return literal_eval(answer)
-    except (ValueError, SyntaxError):
+
+def normalize_int(answer) -> int | None:
+    if isinstance(answer, bool):
+        return None
+    if isinstance(answer, (int, float)):
+        return int(answer) if float(answer).is_integer() else None
+    match = re.fullmatch(r"[^\d\-]*(-?\d+)(?:\.0+)?[^\d]*", str(answer))
+    return int(match.group(1)) if match else None
+
+
+def normalize_choice(*choices: str) -> Callable[[object], str | None]:
+    def normalize(answer) -> str | None:
+        words = re.findall(r"[a-z]+", str(answer).lower())
+        found = [choice for choice in choices if choice in words]
+        return found[0] if len(found) == 1 else None
+
+    return normalize
+
+
+# Keyed by IsoBench task name
+TASK_NORMALIZERS: dict[str, Callable[[object], object]] = {
+    "graph_connectivity": normalize_bool,
+    "graph_isomorphism": normalize_bool,
+    "graph_maxflow": normalize_int,
+    "math_breakpoint": normalize_int,
+    "math_convexity": normalize_choice("convex", "concave"),
+    "math_parity": normalize_choice("even", "odd", "neither"),
+    "winner_id": normalize_choice("white", "black", "draw"),
+}
+
+
+@dataclass
+class ExtractionResult:
+    answer: object
+    strategy: str
+    confidence: float
+
+
+class AnswerExtractor:
+    """
+    Tries the extraction strategies in order, normalising answers for the task,
+    and only asks the extractor LLM when none of them yields an answer. Counts
+    which strategy answered so the LLM fallback rate can be tracked per run.
+    """
+
+    def __init__(
+        self,
+        task: str | None = None,
+        strategies: tuple[ExtractionStrategy, ...] = EXTRACTION_STRATEGIES,
+    ):
+        self.normalize = TASK_NORMALIZERS.get(task, lambda answer: answer)
+        self.strategies = strategies
+        self.stats: Counter[str] = Counter()
+
+    def extract_with_regex(self, output: str) -> ExtractionResult | None:
+        for strategy in self.strategies:
+            raw_answer = strategy.search(output)
+            if raw_answer is None:
+                continue
+            answer = self.normalize(parse_literal(raw_answer))
+            if answer is not None:
+                return ExtractionResult(answer, strategy.name, strategy.confidence)
+        return None
+
+    async def extract(self, question: str, response: str):
+        result = self.extract_with_regex(response)
+        if result is not None:
+            self.stats[result.strategy] += 1
+            return result.answer
+
+        logger.warning(
+            f"Unable to extract answer using regex in response\n{response}\nUsing LLM for extraction."
+        )
+        answer = await get_extractor_llm().extract_answer(question, response)
+        if answer is not None:
+            answer = self.normalize(answer)
+        if answer is None:
+            self.stats["miss"] += 1
+            logger.warning(
+                f"Unable to extract answer using LLM in response\n{response}"
+            )
+        else:
+            self.stats["llm"] += 1
+            logger.info(f"Extracted answer using LLM: {answer}")
         return answer
 
+    def hit_rates(self) -> dict[str, float]:
+        total = sum(self.stats.values())
+        names = [strategy.name for strategy in self.strategies] + ["llm", "miss"]
+        return {name: self.stats[name] / total if total else 0.0 for name in names}
+
+    def reset_stats(self) -> None:
+        self.stats.clear()
+
+
+@lru_cache(maxsize=None)
+def get_answer_extractor(task: str | None = None) -> AnswerExtractor:
+    return AnswerExtractor(task)
+
 
 # TODO: Is there a way to make this generic?
 class ExtractedAnswer(BaseModel):
@@ -102,13 +270,23 @@ Extracted Answer: None
 
 
 class ExtractorLLM(LLM):
-    def __init__(self, llm_str: str = "gpt-4o-mini"):
-        super().__init__(llm_str=llm_str)
+    def __init__(
+        self,
+        llm_str: str = "gpt-4o-mini",
+        cache: ResponseCache | None = None,
+        max_response_tokens: int = 8_000,
+    ):
+        super().__init__(llm_str=llm_str, cache=cache)
+        self.max_response_tokens = max_response_tokens
 
     async def parse_answer_completion(
         self, question: str, response: str
     ) -> ParsedChatCompletion[ExtractedAnswer]:
         instructions = EXTRACTOR_INSTRUCTIONS
+        # Final answers come at the end, so long responses keep their tail
+        response = truncate_text(
+            response, self.max_response_tokens, self.llm_str, TruncationPolicy.KEEP_TAIL
+        )
         extractor_prompt = f"The question is {question} the response is {response}, extract the answer from the response."
         extractor_message = create_message("user", extractor_prompt)
 
@@ -118,13 +296,19 @@ class ExtractorLLM(LLM):
             instructions=instructions,
         )
 
-    async def extract_answer(self, question: str, response: str) -> int | None:
+    async def extract_answer(
+        self, question: str, response: str
+    ) -> str | float | int | bool | None:
         extraction_completion = await self.parse_answer_completion(question, response)
         answer = extraction_completion.choices[0].message.parsed.answer
-        try:
-            return literal_eval(answer)
-        except (ValueError, SyntaxError):
+        if not isinstance(answer, str):
             return answer
+        return parse_literal(answer)
+
+
+@lru_cache(maxsize=None)
+def get_extractor_llm() -> ExtractorLLM:
+    return ExtractorLLM()
 
 
 if __name__ == "__main__":
@@ -154,7 +338,7 @@ if __name__ == "__main__":
 
     What is the maximum flow from the red node to the blue node in the given graph?
 """
-    response = """
+    response = r"""
     To solve this max flow problem, we'll make use of the **Edmonds-Karp algorithm**, which is an implementation of the Ford-Fulkerson method using BFS to find augmenting paths. Here's the step-by-step computation:
 
 ### Adjacency Matrix:
@@ -0,0 +1,112 @@
+import json
+import sqlite3
+import threading
+import time
+from ast import literal_eval
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dynamic_sketchpad.paths import CACHE_DIR
+from dynamic_sketchpad.response_cache import canonical_key
+
+DEFAULT_CHECKPOINT_PATH = CACHE_DIR / "isobench_checkpoints.sqlite"
+
+
+def run_fingerprint(**config) -> str:
+    """Identifies runs that would produce the same outputs for the same test ids."""
+    return canonical_key(**config)
+
+
+def encode_answer(answer) -> str:
+    """
+    Encodes an extracted answer as its Python literal, so a resumed run scores the
+    same answer type, e.g. the int 3 rather than the string "3", or a tuple rather
+    than a list.
+    """
+    encoded = repr(answer)
+    try:
+        literal_eval(encoded)
+    except (ValueError, SyntaxError) as e:
+        raise TypeError(f"Cannot checkpoint non-literal answer {answer!r}") from e
+    return encoded
+
+
+@dataclass
+class CheckpointedItem:
+    output: str
+    answer: object
+    image_file_ids: list[str] = field(default_factory=list)
+
+
+class Checkpoint:
+    """
+    Per-item results of an evaluation run, stored in SQLite keyed by
+    (run fingerprint, test id) and written as each item completes so an
+    interrupted run can resume without regenerating finished items. Images are
+    stored as their OpenAI file IDs, which the file cache resolves on resume.
+    """
+
+    def __init__(self, fingerprint: str, path: Path = DEFAULT_CHECKPOINT_PATH):
+        self.fingerprint = fingerprint
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "fingerprint TEXT NOT NULL, test_id TEXT NOT NULL, "
+            "output TEXT NOT NULL, answer TEXT NOT NULL, completed_at REAL NOT NULL, "
+            "image_file_ids TEXT NOT NULL DEFAULT '[]', "
+            "PRIMARY KEY (fingerprint, test_id))"
+        )
+        columns = {
+            row[1] for row in self._connection.execute("PRAGMA table_info(items)")
+        }
+        # Checkpoints written before images were recorded
+        if "image_file_ids" not in columns:
+            self._connection.execute(
+                "ALTER TABLE items "
+                "ADD COLUMN image_file_ids TEXT NOT NULL DEFAULT '[]'"
+            )
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def save(
+        self, test_id, output: str, answer, image_file_ids: list[str] | None = None
+    ) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO items (fingerprint, test_id, output, answer, "
+                "completed_at, image_file_ids) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.fingerprint,
+                    str(test_id),
+                    output,
+                    encode_answer(answer),
+                    time.time(),
+                    json.dumps(image_file_ids or []),
+                ),
+            )
+            self._connection.commit()
+
+    def load(self) -> dict[str, CheckpointedItem]:
+        """Completed items keyed by test id (as a string)."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT test_id, output, answer, image_file_ids FROM items "
+                "WHERE fingerprint = ?",
+                (self.fingerprint,),
+            ).fetchall()
+        return {
+            test_id: CheckpointedItem(
+                output, literal_eval(answer), json.loads(image_file_ids)
+            )
+            for test_id, output, answer, image_file_ids in rows
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM items WHERE fingerprint = ?", (self.fingerprint,)
+            )
+            self._connection.commit()
@@ -1,19 +1,40 @@
 import asyncio
 import logging
 import sys
+from dataclasses import dataclass, field
 from functools import partial
-from typing import Callable
+from typing import AsyncIterator, Callable
 
 import mlflow
 import pandas as pd
+from mlflow import MlflowClient
+from openai.types.beta.threads import Message
 from tqdm.asyncio import tqdm
 
-from dynamic_sketchpad.dynamic_sketchpad import DynamicSketchpad
+from dynamic_sketchpad.clients import get_client
+from dynamic_sketchpad.dynamic_sketchpad import (
+    DEFAULT_ANSWER_PROMPT,
+    AsyncDynamicSketchpad,
+)
+from dynamic_sketchpad.lazy_image import LazyImage
 from dynamic_sketchpad.llm import LLM
-from eval.answer_extractor import extract_answer
-from eval.isobench.loader import IsobenchTask, load_isobench_dataset
-from eval.isobench.mlflow_utils import with_mlflow_server
-from eval.isobench.prompts import get_prompt, get_prompt_template
+from dynamic_sketchpad.openai_utils import fetch_file_contents
+from dynamic_sketchpad.response_cache import ResponseCache
+from eval.answer_extractor import AnswerExtractor, get_answer_extractor
+from eval.isobench.checkpoint import Checkpoint, CheckpointedItem, run_fingerprint
+from eval.isobench.loader import IsobenchTask, load_isobench_table
+from eval.isobench.mlflow_utils import (
+    get_or_create_experiment,
+    log_call_metrics,
+    log_lazy_image,
+    with_mlflow_server,
+)
+from eval.isobench.pipeline import Stage, run_pipeline
+from eval.isobench.prompts import (
+    get_prompt_template,
+    materialize_prompts,
+    template_hash,
+)
 
 
 def setup_logging():
@@ -27,109 +48,327 @@ def setup_logging():
 logger = setup_logging()
 
 
-def get_eval_data(task: IsobenchTask) -> pd.DataFrame:
-    ds = load_isobench_dataset(task)
-    eval_data = ds.to_pandas()
-    if "image" in eval_data.columns:
-        eval_data.drop(columns=["image"], inplace=True)
-
-    eval_data["prompt"] = eval_data.apply(lambda x: get_prompt(x, task), axis=1)
-    return eval_data
+def experiment_name(task: IsobenchTask) -> str:
+    return f"IsoBench: {task}"
 
 
-def llm_model_predict(llm_str: str):
-    llm = LLM(llm_str=llm_str)
-    return partial(
-        predict,
-        output_generator=lambda prompts, _: asyncio.run(
-            llm.generate_responses(prompts)
-        ),
-    )
-
+def get_eval_data(task: IsobenchTask, include_images: bool = False) -> pd.DataFrame:
+    # Images are only read from the cached table when asked for
+    eval_data = load_isobench_table(task, include_images=include_images).to_pandas()
+    eval_data["prompt"] = materialize_prompts(task)
+    return eval_data
 
-def dynamic_sketchpad_predict(llm_str: str):
-    sketchpad = DynamicSketchpad(llm_str=llm_str)
 
-    def generate_responses(prompts: list[str], df: pd.DataFrame) -> list[str]:
-        all_messages = sketchpad.invoke_all(*prompts)
-        responses = [
-            sketchpad.messages_to_string(messages) for messages in all_messages
-        ]
-
-        images = [sketchpad.messages_to_images(messages) for messages in all_messages]
-        for test_id, images in zip(df["id"], images):
-            for i, image in enumerate(images):
-                mlflow.log_image(image, artifact_file=f"{test_id}/images/{i}.png")
+@dataclass
+class EvalItem:
+    index: int
+    output: str
+    messages: list[Message] | None = None
+    images: list[LazyImage] = field(default_factory=list)
+    answer: object = None
+
+
+def log_images(images: list[LazyImage], test_id, run_id: str | None = None) -> None:
+    for i, image in enumerate(images):
+        log_lazy_image(image, artifact_file=f"{test_id}/images/{i}.png", run_id=run_id)
+
+
+def checkpointed_images(item: CheckpointedItem) -> list[LazyImage]:
+    """The images of a checkpointed item, read through the file cache."""
+    if not item.image_file_ids:
+        return []
+    contents = fetch_file_contents(get_client(), item.image_file_ids)
+    return [
+        LazyImage(data, file_id=file_id)
+        for file_id, data in zip(item.image_file_ids, contents)
+    ]
+
+
+def llm_model_predict(
+    llm_str: str,
+    cache: ResponseCache | None = None,
+    batch: bool = False,
+    task: IsobenchTask | None = None,
+):
+    llm = LLM(llm_str=llm_str, cache=cache)
+
+    async def outputs(prompts: list[str]) -> AsyncIterator[EvalItem]:
+        if batch:
+            responses = await llm.generate_responses(prompts, batch=batch)
+            for index, response in enumerate(responses):
+                yield EvalItem(index, response)
+            return
+        async for index, response in llm.iter_responses(prompts):
+            yield EvalItem(index, response)
+
+    return partial(predict, output_stream=outputs, task=task)
+
+
+def dynamic_sketchpad_predict(llm_str: str, task: IsobenchTask | None = None):
+    sketchpad = AsyncDynamicSketchpad(llm_str=llm_str)
+
+    async def outputs(prompts: list[str]) -> AsyncIterator[EvalItem]:
+        async for index, messages in sketchpad.invoke_as_completed(*prompts):
+            yield EvalItem(
+                index, sketchpad.messages_to_string(messages), messages=messages
+            )
+
+    async def load_images(item: EvalItem) -> EvalItem:
+        item.images = await sketchpad.messages_to_images(item.messages)
+        return item
+
+    def predict_with_sketchpad(
+        df: pd.DataFrame,
+        checkpoint: Checkpoint | None = None,
+        extractor: AnswerExtractor | None = None,
+    ) -> list:
         mlflow.set_tag("tool", "dynamic_sketchpad")
         mlflow.log_param("instruction_hash", hash(sketchpad.assistant.instructions))
         mlflow.log_text(
             sketchpad.assistant.instructions, artifact_file="instructions.txt"
         )
-        print(f"Generated responses: {responses}")
-        return responses
+        return predict(
+            df,
+            output_stream=outputs,
+            task=task,
+            checkpoint=checkpoint,
+            extractor=extractor,
+            prepare=(Stage("images", load_images, concurrency=8),),
+        )
 
-    return partial(
-        predict,
-        output_generator=lambda prompts, df: generate_responses(prompts, df),
-    )
+    return predict_with_sketchpad
 
 
 def predict(
-    df: pd.DataFrame, output_generator: Callable[[pd.DataFrame], list[str]]
-) -> list[str]:
+    df: pd.DataFrame,
+    output_stream: Callable[[list[str]], AsyncIterator[EvalItem]],
+    task: IsobenchTask | None = None,
+    checkpoint: Checkpoint | None = None,
+    extractor: AnswerExtractor | None = None,
+    prepare: tuple[Stage, ...] = (),
+    extract_concurrency: int = 16,
+    log_concurrency: int = 4,
+    queue_size: int = 32,
+) -> list:
+    """
+    Runs generation, any prepare stages, answer extraction and artifact logging
+    as one pipeline on a single event loop. Each output is extracted and logged
+    as soon as it is generated, so the run takes about as long as its slowest
+    stage rather than the sum of all of them.
+    """
     prompts = df["prompt"].tolist()
-    outputs = output_generator(prompts, df)
-    answers = asyncio.run(
-        tqdm.gather(
-            *[
-                extract_answer(question=prompt, response=output)
-                for prompt, output in zip(prompts, outputs)
-            ],
-            desc="Extracting answers",
-        )
-    )
-
+    test_ids = df["id"].tolist()
+    answers = [None] * len(prompts)
+    extractor = extractor or get_answer_extractor(task)
+    # The active run is thread-local in mlflow, so logging threads use the run id
+    run_id = mlflow.active_run().info.run_id
+    client = MlflowClient()
+    progress = tqdm(total=len(prompts), desc="Evaluating")
+
+    async def extract(item: EvalItem) -> EvalItem:
+        item.answer = await extractor.extract(prompts[item.index], item.output)
+        return item
+
+    def log_item(item: EvalItem) -> None:
+        test_id = test_ids[item.index]
+        client.log_text(run_id, item.output, artifact_file=f"{test_id}.txt")
+        log_images(item.images, test_id, run_id=run_id)
+        if checkpoint is not None:
+            checkpoint.save(
+                test_id,
+                item.output,
+                item.answer,
+                [image.file_id for image in item.images if image.file_id is not None],
+            )
+
+    async def log(item: EvalItem) -> EvalItem:
+        await asyncio.to_thread(log_item, item)
+        progress.update()
+        return item
+
+    async def run():
+        stages = [
+            *prepare,
+            Stage("extract", extract, concurrency=extract_concurrency),
+            Stage("log", log, concurrency=log_concurrency),
+        ]
+        for item in await run_pipeline(
+            output_stream(prompts), stages, queue_size=queue_size
+        ):
+            answers[item.index] = item.answer
+
+    try:
+        asyncio.run(run())
+    finally:
+        progress.close()
     logger.info(f"Extracted answers:\n{answers}")
+    return answers
 
-    for test_id, output in zip(df["id"], outputs):
-        mlflow.log_text(output, artifact_file=f"{test_id}.txt")
 
-    return answers
+def evaluate_llm_on_isobench(
+    llm_str: str,
+    task: IsobenchTask,
+    cache: ResponseCache | None = None,
+    batch: bool = False,
+    resume: bool = False,
+    eval_data: pd.DataFrame | None = None,
+    experiment_id: str | None = None,
+) -> str:
+    predict = llm_model_predict(llm_str, cache=cache, batch=batch, task=task)
+    return evaluate_model_on_isobench(
+        predict,
+        llm_str,
+        task,
+        resume=resume,
+        model_config={"model": "llm"},
+        eval_data=eval_data,
+        experiment_id=experiment_id,
+    )
 
 
-def evaluate_llm_on_isobench(llm_str: str, task: IsobenchTask):
-    predict = llm_model_predict(llm_str)
-    evaluate_model_on_isobench(predict, llm_str, task)
+def evaluate_dynamic_sketchpad_on_isobench(
+    llm_str: str,
+    task: IsobenchTask,
+    resume: bool = False,
+    eval_data: pd.DataFrame | None = None,
+    experiment_id: str | None = None,
+) -> str:
+    predict = dynamic_sketchpad_predict(llm_str, task=task)
+    return evaluate_model_on_isobench(
+        predict,
+        llm_str,
+        task,
+        resume=resume,
+        eval_data=eval_data,
+        experiment_id=experiment_id,
+        model_config={
+            "model": "dynamic_sketchpad",
+            "instructions": DEFAULT_ANSWER_PROMPT,
+        },
+    )
 
 
-def evaluate_dynamic_sketchpad_on_isobench(llm_str: str, task: IsobenchTask):
-    predict = dynamic_sketchpad_predict(llm_str)
-    evaluate_model_on_isobench(predict, llm_str, task)
+def resumable_predict(
+    model,
+    checkpoint: Checkpoint,
+    resume: bool = True,
+    extractor: AnswerExtractor | None = None,
+):
+    """
+    Wraps a predict function so every item is checkpointed as it completes. When
+    resuming, items already in the checkpoint are answered from it, with their
+    text and images logged to the new run, and only the remainder is sent to the
+    model; otherwise the checkpoint starts empty.
+    """
+
+    def predict(df: pd.DataFrame) -> list:
+        if not resume:
+            checkpoint.clear()
+        completed = checkpoint.load()
+        test_ids = df["id"].astype(str)
+        remaining = df[~test_ids.isin(completed)]
+        logger.info(
+            f"Resuming with {len(df) - len(remaining)} of {len(df)} items "
+            f"completed, {len(remaining)} remaining."
+        )
 
+        new_answers = {}
+        if len(remaining):
+            answers = model(remaining, checkpoint=checkpoint, extractor=extractor)
+            new_answers = dict(zip(remaining["id"].astype(str), answers))
+
+        for test_id in test_ids:
+            if test_id not in new_answers:
+                item = completed[test_id]
+                mlflow.log_text(item.output, artifact_file=f"{test_id}.txt")
+                log_images(checkpointed_images(item), test_id)
+        return [
+            (
+                new_answers[test_id]
+                if test_id in new_answers
+                else completed[test_id].answer
+            )
+            for test_id in test_ids
+        ]
 
-def evaluate_model_on_isobench(model, llm_str: str, task: IsobenchTask):
-    eval_data = get_eval_data(task)
-    run_evaluation(model, eval_data, llm_str, task)
+    return predict
+
+
+def evaluate_model_on_isobench(
+    model,
+    llm_str: str,
+    task: IsobenchTask,
+    resume: bool = False,
+    model_config: dict | None = None,
+    eval_data: pd.DataFrame | None = None,
+    experiment_id: str | None = None,
+) -> str:
+    """
+    Evaluates a predict function accepting checkpoint and extractor keywords and
+    returns the mlflow run id. Results are checkpointed per item under a
+    fingerprint of the model and prompt; with resume, items completed by an
+    earlier run with the same fingerprint are not regenerated.
+    """
+    if eval_data is None:
+        eval_data = get_eval_data(task)
+    fingerprint = run_fingerprint(
+        llm_str=llm_str,
+        task=task,
+        prompt_template=get_prompt_template(task),
+        **(model_config or {}),
+    )
+    checkpoint = Checkpoint(fingerprint)
+    # Each evaluation counts its own extraction hit rates, even when several
+    # evaluations of the same task run concurrently
+    extractor = AnswerExtractor(task)
+    return run_evaluation(
+        resumable_predict(model, checkpoint, resume=resume, extractor=extractor),
+        eval_data,
+        llm_str,
+        task,
+        extractor=extractor,
+        experiment_id=experiment_id,
+    )
 
 
-def run_evaluation(model, eval_data: pd.DataFrame, llm_str: str, task: IsobenchTask):
-    mlflow.set_experiment(f"IsoBench: {task}")
-    with mlflow.start_run() as run:
+def run_evaluation(
+    model,
+    eval_data: pd.DataFrame,
+    llm_str: str,
+    task: IsobenchTask,
+    extractor: AnswerExtractor | None = None,
+    experiment_id: str | None = None,
+) -> str:
+    # The active experiment is process-wide, so runs name theirs explicitly
+    if experiment_id is None:
+        experiment_id = get_or_create_experiment(experiment_name(task))
+    with mlflow.start_run(experiment_id=experiment_id) as run:
         mlflow.log_param("task", task)
         mlflow.log_param("llm_str", llm_str)
         prompt_template = get_prompt_template(task)
-        mlflow.log_param("prompt_template_hash", hash(prompt_template))
+        mlflow.log_param("prompt_template_hash", template_hash(prompt_template))
         mlflow.log_text(prompt_template, artifact_file="prompt_template.txt")
 
-        results = mlflow.evaluate(
-            model=model,
-            data=eval_data,
-            targets="label",
-            model_type="question-answering",
-            evaluators=["default"],
+        if extractor is None:
+            extractor = get_answer_extractor(task)
+            extractor.reset_stats()
+        with log_call_metrics():
+            results = mlflow.evaluate(
+                model=model,
+                data=eval_data,
+                targets="label",
+                model_type="question-answering",
+                evaluators=["default"],
+            )
+        mlflow.log_metrics(
+            {
+                f"extraction/{name}_rate": rate
+                for name, rate in extractor.hit_rates().items()
+            }
         )
 
         print(f"Evaluation results: {results.metrics}")
+    return run.info.run_id
 
 
 if __name__ == "__main__":
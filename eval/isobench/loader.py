@@ -1,7 +1,13 @@
+import os
+import threading
 from enum import StrEnum
+from pathlib import Path
 
+import pyarrow as pa
 from datasets import Dataset, load_dataset
 
+from dynamic_sketchpad.paths import CACHE_DIR
+
 
 class IsobenchTask(StrEnum):
     CHEMISTRY = "chemistry"
@@ -17,12 +23,64 @@ class IsobenchTask(StrEnum):
 
 
 ISOBENCH_PATH = "isobench/IsoBench"
+DATASET_CACHE_DIR = CACHE_DIR / "isobench"
+IMAGE_COLUMN = "image"
+
+
+def load_isobench_dataset(task: IsobenchTask, split: str = "validation") -> Dataset:
+    return load_dataset(ISOBENCH_PATH, task, split=split)
+
+
+def cached_table_path(task: IsobenchTask, split: str = "validation") -> Path:
+    return DATASET_CACHE_DIR / f"{task}-{split}.arrow"
+
+
+def cached_prompts_path(task: IsobenchTask, split: str, prompts_hash: str) -> Path:
+    """Prompts rendered from a template are stored beside the split they came from."""
+    return DATASET_CACHE_DIR / f"{task}-{split}.prompts-{prompts_hash}.arrow"
+
+
+def read_table_cache(path: Path) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+
+
+def write_table_cache(table: pa.Table, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written beside the target and renamed so readers never see a partial file.
+    # Threads of one process may write the same cache, so the name is per thread.
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    tmp_path.replace(path)
+
 
+def load_isobench_table(
+    task: IsobenchTask,
+    split: str = "validation",
+    columns: list[str] | None = None,
+    include_images: bool = False,
+) -> pa.Table:
+    """
+    Loads a task split from a local Arrow IPC cache, downloading it into the cache
+    on first use. The cache is memory-mapped, so only the projected columns are
+    read from disk: columns selects the columns to keep, and the image column is
+    left out unless include_images is set.
+    """
+    path = cached_table_path(task, split)
+    if not path.exists():
+        ds = load_isobench_dataset(task, split).flatten_indices()
+        write_table_cache(ds.data.table, path)
+        # Prompts rendered from an earlier copy of the split no longer line up
+        for prompts_path in path.parent.glob(f"{task}-{split}.prompts-*.arrow"):
+            prompts_path.unlink()
 
-def load_isobench_dataset(task: IsobenchTask) -> Dataset:
-    ds = load_dataset(ISOBENCH_PATH, task)
-    validation_data = ds["validation"]
-    return validation_data
+    table = read_table_cache(path)
+    if columns is None:
+        columns = table.column_names
+    if not include_images:
+        columns = [column for column in columns if column != IMAGE_COLUMN]
+    return table.select(columns)
 
 
 if __name__ == "__main__":
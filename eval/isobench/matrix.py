@@ -0,0 +1,157 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import mlflow
+import pandas as pd
+
+from dynamic_sketchpad.scheduler import RateLimits, configure_rate_limits
+from eval.isobench.eval_mlflow import (
+    evaluate_dynamic_sketchpad_on_isobench,
+    evaluate_llm_on_isobench,
+    experiment_name,
+    get_eval_data,
+    logger,
+)
+from eval.isobench.loader import IsobenchTask
+from eval.isobench.mlflow_utils import get_or_create_experiment, with_mlflow_server
+
+SUMMARY_METRICS = {
+    "exact_match/v1": "exact_match",
+    "extraction/llm_rate": "llm_extraction",
+    "extraction/miss_rate": "missed",
+}
+
+
+@dataclass
+class MatrixCell:
+    task: IsobenchTask
+    llm_str: str
+    run_id: str | None = None
+    metrics: dict[str, float] = field(default_factory=dict)
+    seconds: float = 0.0
+    error: str | None = None
+
+
+def run_matrix(
+    tasks: list[IsobenchTask],
+    llm_strs: list[str],
+    dynamic_sketchpad: bool = False,
+    max_concurrent_cells: int = 4,
+    rate_limits: RateLimits | None = None,
+    resume: bool = False,
+) -> list[MatrixCell]:
+    """
+    Evaluates every (task, model) pair, each in its own mlflow run, with up to
+    max_concurrent_cells pairs running at once. Every cell schedules its requests
+    through the process-wide rate limiter, so concurrent cells share one RPM, TPM
+    and in-flight budget per model; rate_limits overrides it for the models under
+    test. Each task's dataset is loaded once. A failing cell is reported in its
+    MatrixCell and does not stop the others.
+    """
+    if rate_limits is not None:
+        for llm_str in llm_strs:
+            configure_rate_limits(
+                llm_str,
+                requests_per_minute=rate_limits.requests_per_minute,
+                tokens_per_minute=rate_limits.tokens_per_minute,
+                max_in_flight=rate_limits.max_in_flight,
+            )
+
+    evaluate = (
+        evaluate_dynamic_sketchpad_on_isobench
+        if dynamic_sketchpad
+        else evaluate_llm_on_isobench
+    )
+    eval_data = {task: get_eval_data(task) for task in tasks}
+    # Resolved up front so cells of the same task never race to create it
+    experiment_ids = {
+        task: get_or_create_experiment(experiment_name(task)) for task in tasks
+    }
+    cells = [MatrixCell(task, llm_str) for task in tasks for llm_str in llm_strs]
+
+    def run_cell(cell: MatrixCell) -> None:
+        start = time.perf_counter()
+        try:
+            cell.run_id = evaluate(
+                cell.llm_str,
+                cell.task,
+                resume=resume,
+                eval_data=eval_data[cell.task].copy(),
+                experiment_id=experiment_ids[cell.task],
+            )
+            cell.metrics = mlflow.get_run(cell.run_id).data.metrics
+        except Exception as e:
+            logger.exception(f"Evaluating {cell.llm_str} on {cell.task} failed")
+            cell.error = repr(e)
+        cell.seconds = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_cells) as executor:
+        list(executor.map(run_cell, cells))
+    return cells
+
+
+def summary_table(cells: list[MatrixCell]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "task": str(cell.task),
+                "llm_str": cell.llm_str,
+                **{
+                    column: cell.metrics.get(metric)
+                    for metric, column in SUMMARY_METRICS.items()
+                },
+                "seconds": round(cell.seconds, 1),
+                "run_id": cell.run_id,
+                "error": cell.error,
+            }
+            for cell in cells
+        ]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate every task and model pair on IsoBench."
+    )
+    parser.add_argument(
+        "--tasks",
+        nargs="+",
+        type=IsobenchTask,
+        default=[
+            IsobenchTask.GRAPH_CONNECTIVITY,
+            IsobenchTask.GRAPH_ISOMORPHISM,
+            IsobenchTask.MATH_BREAKPOINT,
+            IsobenchTask.MATH_CONVEXITY,
+            IsobenchTask.WINNER_ID,
+        ],
+    )
+    parser.add_argument("--llm-strs", nargs="+", default=["gpt-4o-2024-11-20"])
+    parser.add_argument("--dynamic-sketchpad", action="store_true")
+    parser.add_argument("--max-concurrent-cells", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=int)
+    parser.add_argument("--tokens-per-minute", type=int)
+    parser.add_argument("--max-in-flight", type=int)
+    parser.add_argument("--resume", action="store_true")
+    args = parser.parse_args()
+
+    rate_limits = None
+    if args.requests_per_minute or args.tokens_per_minute or args.max_in_flight:
+        rate_limits = RateLimits(
+            requests_per_minute=args.requests_per_minute
+            or RateLimits.requests_per_minute,
+            tokens_per_minute=args.tokens_per_minute or RateLimits.tokens_per_minute,
+            max_in_flight=args.max_in_flight or RateLimits.max_in_flight,
+        )
+
+    with with_mlflow_server():
+        cells = run_matrix(
+            args.tasks,
+            args.llm_strs,
+            dynamic_sketchpad=args.dynamic_sketchpad,
+            max_concurrent_cells=args.max_concurrent_cells,
+            rate_limits=rate_limits,
+            resume=args.resume,
+        )
+    print(summary_table(cells).to_string(index=False))
@@ -1,8 +1,23 @@
 import logging
+import os
 import subprocess
+import tempfile
+import threading
 from contextlib import contextmanager
 from urllib.parse import urlparse
 
+import mlflow
+from mlflow import MlflowClient
+from mlflow.exceptions import MlflowException
+
+from dynamic_sketchpad.lazy_image import LazyImage
+from dynamic_sketchpad.metrics import (
+    CallRecord,
+    InMemoryMetrics,
+    add_sink,
+    remove_sink,
+)
+
 
 def setup_logging():
     logging.basicConfig(
@@ -43,3 +58,73 @@ def with_mlflow_server(mlflow_tracking_uri: str = "http://127.0.0.1:8081"):
         mlflow_server_process.terminate()
         mlflow_server_process.wait()
         logger.info("MLFlow server terminated.")
+
+
+def get_or_create_experiment(name: str) -> str:
+    """
+    Returns the id of the named experiment, creating it if needed. Unlike
+    mlflow.set_experiment it leaves the active experiment alone and tolerates
+    another caller creating the experiment at the same time.
+    """
+    experiment = mlflow.get_experiment_by_name(name)
+    if experiment is not None:
+        return experiment.experiment_id
+    try:
+        return mlflow.create_experiment(name)
+    except MlflowException as e:
+        if e.error_code != "RESOURCE_ALREADY_EXISTS":
+            raise
+        return mlflow.get_experiment_by_name(name).experiment_id
+
+
+def log_lazy_image(
+    image: LazyImage, artifact_file: str, run_id: str | None = None
+) -> None:
+    """
+    Logs the encoded image bytes as an artifact without decoding them. Pass run_id
+    when logging from another thread, where the active run is not visible.
+    """
+    artifact_dir, file_name = os.path.split(artifact_file)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_path = os.path.join(tmp_dir, file_name)
+        image.save(local_path)
+        if run_id is None:
+            mlflow.log_artifact(local_path, artifact_path=artifact_dir or None)
+        else:
+            MlflowClient().log_artifact(
+                run_id, local_path, artifact_path=artifact_dir or None
+            )
+
+
+class ThreadMetrics(InMemoryMetrics):
+    """Keeps only the calls finished on the thread that created it."""
+
+    def __init__(self):
+        super().__init__()
+        self.thread = threading.get_ident()
+
+    def record(self, record: CallRecord) -> None:
+        if threading.get_ident() == self.thread:
+            super().record(record)
+
+
+@contextmanager
+def log_call_metrics():
+    """
+    Collects per-call metrics while active and logs their summary to the run. Only
+    calls made from the current thread are counted, so evaluations running
+    concurrently in other threads do not leak into the run.
+    """
+    metrics = ThreadMetrics()
+    add_sink(metrics)
+    try:
+        yield metrics
+    finally:
+        remove_sink(metrics)
+        for (operation, model), stats in metrics.summary().items():
+            mlflow.log_metrics(
+                {
+                    f"calls/{operation}/{model}/{name}": value
+                    for name, value in stats.items()
+                }
+            )
@@ -0,0 +1,63 @@
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterable, Awaitable, Callable
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    One step of a pipeline. process receives an item and returns the item to hand
+    to the next stage; concurrency workers run it on the pipeline's loop.
+    """
+
+    name: str
+    process: Callable[[object], Awaitable[object]]
+    concurrency: int = 1
+
+
+async def run_pipeline(
+    source: AsyncIterable, stages: list[Stage], queue_size: int = 32
+) -> list:
+    """
+    Streams items from source through the stages on the running loop. Stages are
+    connected by bounded queues, so they overlap and a slow stage applies
+    backpressure to the ones before it instead of items piling up in memory.
+    Returns the items leaving the last stage in completion order. The first error
+    in any stage cancels the rest of the pipeline and is raised.
+    """
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+    results = []
+
+    async def produce():
+        async for item in source:
+            await queues[0].put(item)
+        for _ in range(stages[0].concurrency):
+            await queues[0].put(_DONE)
+
+    async def work(position: int, remaining: list[int]):
+        stage = stages[position]
+        while (item := await queues[position].get()) is not _DONE:
+            item = await stage.process(item)
+            if position + 1 < len(stages):
+                await queues[position + 1].put(item)
+            else:
+                results.append(item)
+
+        # The last worker of a stage to finish closes the next stage
+        remaining[0] -= 1
+        if remaining[0] == 0 and position + 1 < len(stages):
+            for _ in range(stages[position + 1].concurrency):
+                await queues[position + 1].put(_DONE)
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(produce())
+            for position, stage in enumerate(stages):
+                remaining = [stage.concurrency]
+                for _ in range(stage.concurrency):
+                    group.create_task(work(position, remaining))
+    except BaseExceptionGroup as group_error:
+        raise group_error.exceptions[0]
+    return results
@@ -1,4 +1,20 @@
-from eval.isobench.loader import IsobenchTask
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import repeat
+from string import Formatter
+from typing import Iterable, Mapping
+
+import pyarrow as pa
+
+from eval.isobench.loader import (
+    IsobenchTask,
+    cached_prompts_path,
+    load_isobench_table,
+    read_table_cache,
+    write_table_cache,
+)
 
 PROMPT_FOOTER = """
 First give an explanation of your answer:
@@ -118,36 +134,115 @@ PROMPT_MAP = {
 }
 
 
+# Template field names mapped to the dataset columns that fill them
+PROMPT_FIELDS = {
+    IsobenchTask.MATH_BREAKPOINT: {"function": "code"},
+    IsobenchTask.MATH_CONVEXITY: {"function": "code"},
+    IsobenchTask.MATH_PARITY: {"function": "code"},
+    IsobenchTask.GRAPH_MAXFLOW: {
+        "adjacency_matrix": "adjacency_matrix",
+        "source": "source_node",
+        "sink": "sink_node",
+    },
+    IsobenchTask.GRAPH_ISOMORPHISM: {
+        "adjacency_matrix_G": "adjacency_matrix_G",
+        "adjacency_matrix_H": "adjacency_matrix_H",
+    },
+    IsobenchTask.GRAPH_CONNECTIVITY: {
+        "adjacency_matrix": "adjacency_matrix",
+        "query_node_1": "query_node_1",
+        "query_node_2": "query_node_2",
+    },
+    IsobenchTask.WINNER_ID: {"fen": "fen"},
+}
+
+
+def get_prompt_fields(task: IsobenchTask) -> dict[str, str]:
+    if task in PROMPT_FIELDS:
+        return PROMPT_FIELDS[task]
+    else:
+        raise ValueError(f"Task {task} not supported.")
+
+
 def get_prompt(data: dict, task: IsobenchTask) -> str:
     prompt_template = get_prompt_template(task)
-    match task:
-        case IsobenchTask.MATH_BREAKPOINT:
-            return prompt_template.format(function=data["code"])
-        case IsobenchTask.MATH_CONVEXITY:
-            return prompt_template.format(function=data["code"])
-        case IsobenchTask.GRAPH_ISOMORPHISM:
-            return prompt_template.format(
-                adjacency_matrix_G=data["adjacency_matrix_G"],
-                adjacency_matrix_H=data["adjacency_matrix_H"],
-            )
-        case IsobenchTask.GRAPH_CONNECTIVITY:
-            return prompt_template.format(
-                adjacency_matrix=data["adjacency_matrix"],
-                query_node_1=data["query_node_1"],
-                query_node_2=data["query_node_2"],
-            )
-        case IsobenchTask.WINNER_ID:
-            return prompt_template.format(fen=data["fen"])
-        case IsobenchTask.MATH_PARITY:
-            return prompt_template.format(function=data["code"])
-        case IsobenchTask.GRAPH_MAXFLOW:
-            return prompt_template.format(
-                adjacency_matrix=data["adjacency_matrix"],
-                source=data["source_node"],
-                sink=data["sink_node"],
-            )
-        case _:
-            raise ValueError(f"Task {task} not supported.")
+    return prompt_template.format(
+        **{field: data[column] for field, column in get_prompt_fields(task).items()}
+    )
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """
+    A format string split once into its literal text and field names, so a whole
+    column of prompts is rendered by joining strings instead of formatting each
+    row. literals has one more entry than fields.
+    """
+
+    literals: tuple[str, ...]
+    fields: tuple[str, ...]
+
+    def render(self, columns: Mapping[str, Iterable]) -> list[str]:
+        parts = []
+        for literal, field in zip(self.literals, self.fields):
+            parts.append(repeat(literal))
+            parts.append(map(str, columns[field]))
+        parts.append(repeat(self.literals[-1]))
+        return ["".join(row) for row in zip(*parts)]
+
+
+def compile_template(template: str) -> CompiledTemplate:
+    literals, fields = [""], []
+    for literal, field, format_spec, conversion in Formatter().parse(template):
+        literals[-1] += literal
+        if field is None:
+            continue
+        if format_spec or conversion:
+            raise ValueError(f"Unsupported replacement field in template: {field}")
+        fields.append(field)
+        literals.append("")
+    if not fields:
+        raise ValueError("Template has no fields to render.")
+    return CompiledTemplate(tuple(literals), tuple(fields))
+
+
+@lru_cache(maxsize=None)
+def compile_prompt_template(task: IsobenchTask) -> CompiledTemplate:
+    return compile_template(get_prompt_template(task))
+
+
+def template_hash(template: str) -> str:
+    return hashlib.sha256(template.encode()).hexdigest()[:16]
+
+
+def prompts_hash(task: IsobenchTask) -> str:
+    """Identifies the prompts of a task by its template and the columns filling it."""
+    payload = json.dumps(
+        {"template": get_prompt_template(task), "fields": get_prompt_fields(task)},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def materialize_prompts(task: IsobenchTask, split: str = "validation") -> list[str]:
+    """
+    Prompts for every row of the split, in table order. They are rendered column
+    by column on first use and cached beside the split under the prompts hash,
+    so later runs with the same template and fields read them back from disk.
+    """
+    path = cached_prompts_path(task, split, prompts_hash(task))
+    if not path.exists():
+        fields = get_prompt_fields(task)
+        data = load_isobench_table(
+            task, split, columns=list(dict.fromkeys(fields.values()))
+        ).to_pandas()
+        prompts = compile_prompt_template(task).render(
+            {field: data[column] for field, column in fields.items()}
+        )
+        write_table_cache(pa.table({"prompt": prompts}), path)
+        return prompts
+
+    return read_table_cache(path).column("prompt").to_pylist()
 
 
 def get_prompt_template(task: IsobenchTask) -> str:
@@ -0,0 +1,136 @@
+import sqlite3
+
+import pytest
+
+from eval.isobench.checkpoint import Checkpoint, run_fingerprint
+
+
+def test_checkpoint_round_trips_items(tmp_path):
+    checkpoint = Checkpoint("run", path=tmp_path / "checkpoints.sqlite")
+    checkpoint.save(1, "ANSWER: True", True)
+    checkpoint.save("2", "ANSWER: convex", "convex")
+    checkpoint.save(3, "no answer", None)
+
+    completed = Checkpoint("run", path=tmp_path / "checkpoints.sqlite").load()
+
+    assert set(completed) == {"1", "2", "3"}
+    assert completed["1"].answer is True
+    assert completed["2"].output == "ANSWER: convex"
+    assert completed["3"].answer is None
+
+
+def test_checkpoint_round_trips_image_file_ids(tmp_path):
+    checkpoint = Checkpoint("run", path=tmp_path / "checkpoints.sqlite")
+    checkpoint.save(1, "output", True, ["file-a", "file-b"])
+    checkpoint.save(2, "output", False)
+
+    completed = checkpoint.load()
+
+    assert completed["1"].image_file_ids == ["file-a", "file-b"]
+    assert completed["2"].image_file_ids == []
+
+
+def test_checkpoint_opens_tables_without_image_file_ids(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE items (fingerprint TEXT NOT NULL, test_id TEXT NOT NULL, "
+            "output TEXT NOT NULL, answer TEXT NOT NULL, completed_at REAL NOT NULL, "
+            "PRIMARY KEY (fingerprint, test_id))"
+        )
+        connection.execute("INSERT INTO items VALUES ('run', '1', 'old', 'True', 0)")
+    connection.close()
+
+    checkpoint = Checkpoint("run", path=path)
+    checkpoint.save(2, "new", False, ["file-a"])
+
+    completed = checkpoint.load()
+    assert completed["1"].image_file_ids == []
+    assert completed["2"].image_file_ids == ["file-a"]
+
+
+def test_checkpoints_are_separated_by_fingerprint(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    first = Checkpoint(run_fingerprint(llm_str="gpt-4o", task="winner_id"), path)
+    second = Checkpoint(run_fingerprint(llm_str="gpt-4o-mini", task="winner_id"), path)
+    first.save(1, "ANSWER: white", "white")
+    second.save(1, "ANSWER: black", "black")
+
+    first.clear()
+
+    assert first.load() == {}
+    assert second.load()["1"].answer == "black"
+
+
+def test_run_fingerprint_ignores_argument_order():
+    assert run_fingerprint(a=1, b="x") == run_fingerprint(b="x", a=1)
+    assert run_fingerprint(a=1) != run_fingerprint(a=2)
+
+
+@pytest.mark.parametrize(
+    "answer", [3, "3", 3.5, True, "True", None, (1, 2), [1, 2], {"a": 1}]
+)
+def test_checkpoint_preserves_answer_types(tmp_path, answer):
+    checkpoint = Checkpoint("run", path=tmp_path / "checkpoints.sqlite")
+    checkpoint.save(1, "output", answer)
+
+    loaded = checkpoint.load()["1"].answer
+
+    assert loaded == answer
+    assert type(loaded) is type(answer)
+
+
+def test_checkpoint_rejects_answers_that_do_not_round_trip(tmp_path):
+    checkpoint = Checkpoint("run", path=tmp_path / "checkpoints.sqlite")
+    with pytest.raises(TypeError):
+        checkpoint.save(1, "output", object())
+
+
+def test_resumed_run_returns_checkpointed_answers_unchanged(tmp_path, monkeypatch):
+    pd = pytest.importorskip("pandas")
+    eval_mlflow = pytest.importorskip("eval.isobench.eval_mlflow")
+    monkeypatch.setattr(eval_mlflow.mlflow, "log_text", lambda *args, **kwargs: None)
+    df = pd.DataFrame({"id": [1, 2, 3], "prompt": ["a", "b", "c"]})
+    answers = {1: 3, 2: "3", 3: (1, 2)}
+    called = []
+
+    def model(remaining, checkpoint, extractor):
+        called.append(list(remaining["id"]))
+        for test_id in remaining["id"]:
+            checkpoint.save(test_id, f"ANSWER: {answers[test_id]}", answers[test_id])
+        return [answers[test_id] for test_id in remaining["id"]]
+
+    checkpoint = Checkpoint("run", path=tmp_path / "checkpoints.sqlite")
+    first = eval_mlflow.resumable_predict(model, checkpoint, resume=False)(df)
+    resumed = eval_mlflow.resumable_predict(model, checkpoint, resume=True)(df)
+
+    assert called == [[1, 2, 3]]
+    assert resumed == first == [3, "3", (1, 2)]
+    assert [type(answer) for answer in resumed] == [int, str, tuple]
+
+
+def test_resumed_run_relogs_checkpointed_images(tmp_path, monkeypatch):
+    pd = pytest.importorskip("pandas")
+    eval_mlflow = pytest.importorskip("eval.isobench.eval_mlflow")
+    logged = []
+    monkeypatch.setattr(eval_mlflow.mlflow, "log_text", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        eval_mlflow,
+        "log_lazy_image",
+        lambda image, artifact_file, run_id=None: logged.append(
+            (artifact_file, image.data)
+        ),
+    )
+    monkeypatch.setattr(eval_mlflow, "get_client", lambda: None)
+    monkeypatch.setattr(
+        eval_mlflow,
+        "fetch_file_contents",
+        lambda client, file_ids: [file_id.encode() for file_id in file_ids],
+    )
+    checkpoint = Checkpoint("run", path=tmp_path / "checkpoints.sqlite")
+    checkpoint.save(1, "ANSWER: True", True, ["file-a", "file-b"])
+    df = pd.DataFrame({"id": [1], "prompt": ["a"]})
+
+    eval_mlflow.resumable_predict(None, checkpoint, resume=True)(df)
+
+    assert logged == [("1/images/0.png", b"file-a"), ("1/images/1.png", b"file-b")]
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+datasets = pytest.importorskip("datasets")
+
+from eval.isobench import loader  # noqa: E402
+from eval.isobench.loader import IsobenchTask, load_isobench_table  # noqa: E402
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(loader, "DATASET_CACHE_DIR", tmp_path)
+    loads = []
+
+    def load_isobench_dataset(task, split="validation"):
+        loads.append((task, split))
+        return datasets.Dataset.from_dict(
+            {
+                "id": [1, 2],
+                "function": ["x ** 2", "-x ** 2"],
+                "label": ["convex", "concave"],
+                "image": [b"png-1", b"png-2"],
+            }
+        )
+
+    monkeypatch.setattr(loader, "load_isobench_dataset", load_isobench_dataset)
+    return loads
+
+
+def test_load_isobench_table_downloads_once(source):
+    first = load_isobench_table(IsobenchTask.MATH_CONVEXITY)
+    second = load_isobench_table(IsobenchTask.MATH_CONVEXITY)
+
+    assert source == [(IsobenchTask.MATH_CONVEXITY, "validation")]
+    assert first.equals(second)
+    assert first.column("label").to_pylist() == ["convex", "concave"]
+
+
+def test_load_isobench_table_projects_columns(source):
+    table = load_isobench_table(IsobenchTask.MATH_CONVEXITY)
+    assert table.column_names == ["id", "function", "label"]
+
+    table = load_isobench_table(IsobenchTask.MATH_CONVEXITY, include_images=True)
+    assert table.column("image").to_pylist() == [b"png-1", b"png-2"]
+
+    table = load_isobench_table(IsobenchTask.MATH_CONVEXITY, columns=["id", "image"])
+    assert table.column_names == ["id"]
+
+
+def test_concurrent_cache_writes_from_threads_do_not_collide(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / "table.arrow"
+    tables = [pa.table({"value": list(range(i, i + 1000))}) for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda table: loader.write_table_cache(table, path), tables))
+
+    assert loader.read_table_cache(path) in tables
+    assert list(tmp_path.glob("*.tmp")) == []
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("mlflow")
+
+import pandas as pd  # noqa: E402
+
+from eval.isobench import matrix  # noqa: E402
+from eval.isobench.loader import IsobenchTask  # noqa: E402
+from eval.isobench.matrix import MatrixCell, run_matrix, summary_table  # noqa: E402
+
+TASKS = [IsobenchTask.MATH_CONVEXITY, IsobenchTask.WINNER_ID]
+
+
+@pytest.fixture
+def evaluations(monkeypatch):
+    calls = []
+    loads = []
+    experiments = []
+
+    def get_eval_data(task):
+        loads.append(task)
+        return pd.DataFrame({"id": [1], "prompt": ["question"], "label": ["x"]})
+
+    def get_or_create_experiment(name):
+        experiments.append(name)
+        return f"experiment {name}"
+
+    def evaluate(llm_str, task, resume, eval_data, experiment_id):
+        calls.append((llm_str, task, experiment_id))
+        if llm_str == "broken":
+            raise RuntimeError("no quota")
+        return f"{task}/{llm_str}"
+
+    monkeypatch.setattr(matrix, "get_eval_data", get_eval_data)
+    monkeypatch.setattr(matrix, "get_or_create_experiment", get_or_create_experiment)
+    monkeypatch.setattr(matrix, "evaluate_llm_on_isobench", evaluate)
+    monkeypatch.setattr(
+        matrix.mlflow,
+        "get_run",
+        lambda run_id: SimpleNamespace(
+            data=SimpleNamespace(metrics={"exact_match/v1": 0.5})
+        ),
+    )
+    return SimpleNamespace(calls=calls, loads=loads, experiments=experiments)
+
+
+def test_run_matrix_runs_every_cell_once(evaluations):
+    cells = run_matrix(TASKS, ["gpt-4o", "gpt-4o-mini"], max_concurrent_cells=3)
+
+    assert sorted(evaluations.loads) == sorted(TASKS)
+    assert sorted(evaluations.experiments) == [
+        "IsoBench: math_convexity",
+        "IsoBench: winner_id",
+    ]
+    assert len(evaluations.calls) == 4
+    for llm_str, task, experiment_id in evaluations.calls:
+        assert experiment_id == f"experiment IsoBench: {task}"
+    assert [(cell.task, cell.llm_str) for cell in cells] == [
+        (task, llm_str) for task in TASKS for llm_str in ["gpt-4o", "gpt-4o-mini"]
+    ]
+    assert all(cell.metrics == {"exact_match/v1": 0.5} for cell in cells)
+
+
+def test_run_matrix_reports_failing_cells(evaluations):
+    cells = run_matrix(TASKS[:1], ["gpt-4o", "broken"])
+
+    assert cells[0].error is None and cells[0].run_id == "math_convexity/gpt-4o"
+    assert "no quota" in cells[1].error and cells[1].run_id is None
+
+
+def test_summary_table_has_one_row_per_cell():
+    cells = [
+        MatrixCell(
+            IsobenchTask.WINNER_ID,
+            "gpt-4o",
+            run_id="run",
+            metrics={"exact_match/v1": 0.75, "extraction/llm_rate": 0.1},
+            seconds=12.34,
+        ),
+        MatrixCell(IsobenchTask.WINNER_ID, "broken", error="RuntimeError()"),
+    ]
+
+    table = summary_table(cells)
+
+    assert list(table["llm_str"]) == ["gpt-4o", "broken"]
+    assert table.loc[0, "exact_match"] == 0.75
+    assert table.loc[0, "seconds"] == 12.3
+    assert pd.isna(table.loc[1, "exact_match"])
+    assert table.loc[1, "error"] == "RuntimeError()"
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import pytest
+
+from eval.isobench.pipeline import Stage, run_pipeline
+
+
+async def numbers(n: int, delay: float = 0.0):
+    for i in range(n):
+        await asyncio.sleep(delay)
+        yield i
+
+
+def test_run_pipeline_passes_every_item_through_each_stage():
+    async def double(item):
+        await asyncio.sleep(0.001 * (item % 3))
+        return item * 2
+
+    async def increment(item):
+        return item + 1
+
+    results = asyncio.run(
+        run_pipeline(
+            numbers(50),
+            [Stage("double", double, concurrency=4), Stage("increment", increment)],
+            queue_size=2,
+        )
+    )
+
+    assert sorted(results) == [i * 2 + 1 for i in range(50)]
+
+
+def test_run_pipeline_overlaps_stages():
+    async def slow(item):
+        await asyncio.sleep(0.02)
+        return item
+
+    start = time.perf_counter()
+    asyncio.run(
+        run_pipeline(
+            numbers(20, delay=0.02),
+            [Stage("first", slow, concurrency=1), Stage("second", slow)],
+        )
+    )
+    seconds = time.perf_counter() - start
+
+    # Sequential stages would take about 3 * 20 * 0.02 = 1.2s
+    assert seconds < 0.9
+
+
+def test_run_pipeline_raises_the_first_stage_error():
+    async def fail(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    with pytest.raises(ValueError, match="bad item"):
+        asyncio.run(run_pipeline(numbers(10), [Stage("fail", fail)]))
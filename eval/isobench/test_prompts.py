@@ -0,0 +1,70 @@
+import pytest
+
+datasets = pytest.importorskip("datasets")
+
+from eval.isobench import loader, prompts  # noqa: E402
+from eval.isobench.loader import IsobenchTask  # noqa: E402
+from eval.isobench.prompts import (  # noqa: E402
+    PROMPT_FIELDS,
+    compile_prompt_template,
+    compile_template,
+    get_prompt,
+    materialize_prompts,
+    prompts_hash,
+)
+
+ROWS = {
+    "code": ["x ** 2", "abs(x)"],
+    "adjacency_matrix": ["[[0, 1], [1, 0]]", "[[0]]"],
+    "adjacency_matrix_G": ["[[0]]", "[[1]]"],
+    "adjacency_matrix_H": ["[[1]]", "[[0]]"],
+    "query_node_1": [0, 1],
+    "query_node_2": [1, 0],
+    "source_node": [0, 2],
+    "sink_node": [3, 1],
+    "fen": ["8/8/8/8/8/8/8/K6k w - - 0 1", "8/8/8/8/8/8/8/k6K b - - 0 1"],
+}
+
+
+@pytest.mark.parametrize("task", list(PROMPT_FIELDS))
+def test_compiled_template_matches_get_prompt(task):
+    columns = {field: ROWS[column] for field, column in PROMPT_FIELDS[task].items()}
+    rows = [{column: values[i] for column, values in ROWS.items()} for i in range(2)]
+
+    assert compile_prompt_template(task).render(columns) == [
+        get_prompt(row, task) for row in rows
+    ]
+
+
+def test_compile_template_rejects_format_specs():
+    with pytest.raises(ValueError):
+        compile_template("{value:>10}")
+
+
+def test_materialize_prompts_is_cached_per_template(tmp_path, monkeypatch):
+    monkeypatch.setattr(loader, "DATASET_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(
+        loader,
+        "load_isobench_dataset",
+        lambda task, split="validation": datasets.Dataset.from_dict(
+            {"id": [1, 2], "code": ROWS["code"], "label": ["convex", "convex"]}
+        ),
+    )
+    task = IsobenchTask.MATH_CONVEXITY
+
+    rendered = materialize_prompts(task)
+    monkeypatch.setattr(prompts, "compile_prompt_template", None)
+    cached = materialize_prompts(task)
+
+    assert rendered == cached
+    assert rendered[1] == get_prompt({"code": "abs(x)"}, task)
+    assert len(list(tmp_path.glob(f"{task}-validation.prompts-*.arrow"))) == 1
+
+
+def test_prompts_hash_changes_with_the_field_mapping(monkeypatch):
+    task = IsobenchTask.MATH_CONVEXITY
+    before = prompts_hash(task)
+
+    monkeypatch.setitem(PROMPT_FIELDS, task, {"function": "latex"})
+
+    assert prompts_hash(task) != before
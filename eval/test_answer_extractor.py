@@ -1,6 +1,11 @@
+import asyncio
+import warnings
+from pathlib import Path
+
 import pytest
 
-from eval.answer_extractor import regex_extract_answer
+from eval import answer_extractor
+from eval.answer_extractor import AnswerExtractor, regex_extract_answer
 
 
 @pytest.mark.parametrize(
@@ -23,3 +28,64 @@ from eval.answer_extractor import regex_extract_answer
 )
 def test_regex_extract_answer(output, expected_answer):
     assert regex_extract_answer(output) == expected_answer
+
+
+@pytest.mark.parametrize(
+    "output, task, expected_answer, expected_strategy",
+    [
+        ("The answer is $\\boxed{7}$.", "math_breakpoint", 7, "boxed"),
+        ("So $\\boxed{\\text{convex}}$", "math_convexity", "convex", "boxed"),
+        ("Final Answer: concave", "math_convexity", "concave", "final_answer"),
+        ("The final answer is 12.", "graph_maxflow", 12, "final_answer"),
+        ("**Answer:**\n\nFalse", "graph_isomorphism", False, "answer_next_line"),
+        ("ANSWER: True\n\nLet me know!", None, True, "answer_label_inline"),
+        ("Hence they are connected: True", "graph_connectivity", True, "trailing_bool"),
+        ("ANSWER: The function is convex.", "math_convexity", "convex", "answer_label"),
+        ("ANSWER: **white**", "winner_id", "white", "answer_label"),
+    ],
+)
+def test_extraction_strategies(output, task, expected_answer, expected_strategy):
+    result = AnswerExtractor(task).extract_with_regex(output)
+    assert result.answer == expected_answer
+    assert result.strategy == expected_strategy
+
+
+def test_normaliser_rejects_answers_of_the_wrong_kind():
+    extractor = AnswerExtractor("math_breakpoint")
+    assert extractor.extract_with_regex("ANSWER: several") is None
+    assert extractor.extract_with_regex("ANSWER: convex or concave") is None
+    assert (
+        AnswerExtractor("math_convexity").extract_with_regex(
+            "ANSWER: convex or concave"
+        )
+        is None
+    )
+
+
+def test_hit_rates_count_llm_fallbacks(monkeypatch):
+    class StubExtractorLLM:
+        async def extract_answer(self, question, response):
+            return "3"
+
+    monkeypatch.setattr(
+        answer_extractor, "get_extractor_llm", lambda: StubExtractorLLM()
+    )
+    extractor = AnswerExtractor("math_breakpoint")
+
+    async def extract_all():
+        return [
+            await extractor.extract("q", response)
+            for response in ["ANSWER: 1", "\\boxed{2}", "three breakpoints"]
+        ]
+
+    assert asyncio.run(extract_all()) == [1, 2, 3]
+    rates = extractor.hit_rates()
+    assert rates["answer_label"] == rates["boxed"] == rates["llm"] == 1 / 3
+    assert rates["miss"] == 0
+
+
+def test_module_compiles_without_invalid_escapes():
+    source = Path(answer_extractor.__file__).read_text()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        compile(source, answer_extractor.__file__, "exec")
@@ -1,5 +1,4 @@
 import json
-import os
 import subprocess
 from io import BytesIO
 from pathlib import Path
@@ -12,15 +11,17 @@ from chainlit.config import config
 from chainlit.element import Element
 from dotenv import load_dotenv
 from literalai.helper import utc_now
-from openai import AsyncAssistantEventHandler, AsyncOpenAI, OpenAI
+from openai import AsyncAssistantEventHandler
 
+from dynamic_sketchpad.clients import get_async_client, get_client
+from dynamic_sketchpad.metrics import CallRecord, finish_call
+from dynamic_sketchpad.openai_utils import async_get_file_content
+from dynamic_sketchpad.registry import get_registry
 from dynamic_sketchpad.tools import Tool
 from interactive_sketchpad.prompt import GeoPrompt
 
 load_dotenv()
 
-async_openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-sync_openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 instructions = """
 You are a tutor, your goal is to help the student solve a problem, giving short, subtle hints to help the student solve the problem.
@@ -88,7 +89,8 @@ You should only give the solution if the student explicitly asks for it.
 ALWAYS write math in $ dollar signs for latex rendering, for example $\sinx$
 """
 
-assistant = sync_openai_client.beta.assistants.create(
+assistant = get_registry().get_or_create(
+    get_client(),
     instructions=instructions,
     model="gpt-4o",
     tools=[Tool.CODE_INTERPRETER.to_dict()],
@@ -118,12 +120,22 @@ async def send_image_to_canvas(image_bytes: bytes):
 
 class EventHandler(AsyncAssistantEventHandler):
 
-    def __init__(self, assistant_name: str) -> None:
+    def __init__(self, assistant_name: str, model: str) -> None:
         super().__init__()
         self.current_message: cl.Message = None
         self.current_step: cl.Step = None
         self.current_tool_call = None
         self.assistant_name = assistant_name
+        self.call = CallRecord("chatbot.stream", model, attempts=1)
+
+    async def on_end(self):
+        if self.current_run is not None:
+            self.call.add_usage(self.current_run.usage)
+        finish_call(self.call)
+
+    async def on_exception(self, exception: Exception) -> None:
+        # on_end still fires afterwards and publishes the record
+        self.call.error = type(exception).__name__
 
     async def on_text_created(self, text) -> None:
         self.current_message = await cl.Message(
@@ -131,6 +143,7 @@ class EventHandler(AsyncAssistantEventHandler):
         ).send()
 
     async def on_text_delta(self, delta, snapshot):
+        self.call.mark_first_token()
         await self.current_message.stream_token(delta.value)
 
     async def on_text_done(self, text):
@@ -164,6 +177,7 @@ class EventHandler(AsyncAssistantEventHandler):
                         await error_step.send()
             else:
                 if delta.code_interpreter.input:
+                    self.call.mark_first_token()
                     await self.current_step.stream_token(delta.code_interpreter.input)
 
     async def on_tool_call_done(self, tool_call):
@@ -172,12 +186,12 @@ class EventHandler(AsyncAssistantEventHandler):
 
     async def on_image_file_done(self, image_file, show_image: bool = False):
         image_id = image_file.file_id
-        response = await async_openai_client.files.with_raw_response.content(image_id)
+        image_bytes = await async_get_file_content(get_async_client(), image_id)
 
         if show_image:
             # Show image in chatbot interface
             image_element = cl.Image(
-                name=image_id, content=response.content, display="inline", size="large"
+                name=image_id, content=image_bytes, display="inline", size="large"
             )
             if not self.current_message.elements:
                 self.current_message.elements = []
@@ -185,13 +199,13 @@ class EventHandler(AsyncAssistantEventHandler):
             await self.current_message.update()
         
         # Send image to whiteboard
-        await send_image_to_canvas(response.content)
+        await send_image_to_canvas(image_bytes)
 
 
 async def upload_files(files: List[Element], purpose: str = "assistants"):
     file_ids = []
     for file in files:
-        uploaded_file = await async_openai_client.files.create(
+        uploaded_file = await get_async_client().files.create(
             file=Path(file.path), purpose=purpose
         )
         file_ids.append(uploaded_file.id)
@@ -231,7 +245,7 @@ async def append_images_to_message(message: cl.Message) -> None:
 
 @cl.on_chat_start
 async def start_chat():
-    thread = await async_openai_client.beta.threads.create()
+    thread = await get_async_client().beta.threads.create()
     cl.user_session.set("thread_id", thread.id)
     print("Session id:", cl.user_session.get("id"))
     await cl.Message(
@@ -271,17 +285,19 @@ async def main(message: cl.Message):
         "type": "text",
         "text": "Visualize using Code Interpreter if you think it would be helpful, write math in $ dollar signs $",
     }
-    oai_message = await async_openai_client.beta.threads.messages.create(
+    oai_message = await get_async_client().beta.threads.messages.create(
         thread_id=thread_id,
         role="user",
         content=message.content + [visualize_message],
         attachments=attachments,
     )
 
-    async with async_openai_client.beta.threads.runs.stream(
+    async with get_async_client().beta.threads.runs.stream(
         thread_id=thread_id,
         assistant_id=assistant.id,
-        event_handler=EventHandler(assistant_name=assistant.name),
+        event_handler=EventHandler(
+            assistant_name=assistant.name, model=assistant.model
+        ),
     ) as stream:
         await stream.until_done()
 